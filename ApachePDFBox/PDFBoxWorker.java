@@ -0,0 +1,323 @@
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.DataInputStream;
+import java.io.DataOutputStream;
+import java.io.EOFException;
+import java.io.File;
+import java.io.IOException;
+import java.io.InputStream;
+import java.io.PrintStream;
+import java.nio.charset.StandardCharsets;
+import java.security.MessageDigest;
+import java.security.NoSuchAlgorithmException;
+import java.util.ArrayList;
+import java.util.Arrays;
+import java.util.Collections;
+import java.util.IdentityHashMap;
+import java.util.List;
+import java.util.Map;
+
+import org.apache.pdfbox.cos.COSArray;
+import org.apache.pdfbox.cos.COSBase;
+import org.apache.pdfbox.cos.COSDictionary;
+import org.apache.pdfbox.cos.COSName;
+import org.apache.pdfbox.cos.COSObject;
+import org.apache.pdfbox.cos.COSStream;
+import org.apache.pdfbox.cos.COSString;
+import org.apache.pdfbox.io.MemoryUsageSetting;
+import org.apache.pdfbox.multipdf.PDFMergerUtility;
+import org.apache.pdfbox.multipdf.Splitter;
+import org.apache.pdfbox.pdmodel.PDDocument;
+import org.apache.pdfbox.pdmodel.PDPage;
+import org.apache.pdfbox.text.PDFTextStripper;
+
+/**
+ * Long-lived PDFBox process driven by film_payroll_pdf_processor.pdfbox_wrapper.PDFBoxWorker
+ *
+ * Messages in both directions are a 4 byte big-endian field count followed by that many
+ * fields, each a 4 byte big-endian length and UTF-8 bytes.
+ *
+ * Requests:  [command, arguments...]
+ * Responses: ["OK", results...] or ["ERROR", message]
+ *
+ * Commands mirror the PDFBox command line tools used by the wrapper and produce the same files:
+ *   PDFSplit filepath                        writes filepath-1.pdf, filepath-2.pdf, ...
+ *   PDFMerger filepath_1 filepath_2 target
+ *   PDFMergerBatch filepath_1 filepath_2 target ...  runs every merge in the batch, returns "OK" or
+ *                                            "ERROR message" for each merge, a failed merge doesn't stop the rest
+ *   ExtractText filepath                     returns the text of the document
+ *   ExtractPageTexts filepath [start [end]]  returns the text of every page in the range, in page order
+ *   PageCount filepath                       returns the number of pages
+ *   PageFingerprints filepath                returns a sha256 hex digest of each page's content stream and
+ *                                            resources, with every object and stream they reference
+ *   WritePages filepath page target ...      writes each listed 1-based page to its own target file
+ */
+public class PDFBoxWorker {
+
+    public static void main(String[] args) throws IOException {
+        DataInputStream in = new DataInputStream(new BufferedInputStream(System.in));
+        DataOutputStream out = new DataOutputStream(new BufferedOutputStream(System.out));
+        // stdout carries the protocol, keep anything PDFBox prints off of it
+        System.setOut(new PrintStream(System.err, true));
+
+        while (true) {
+            List<String> request;
+            try {
+                request = readMessage(in);
+            } catch (EOFException e) {
+                break;
+            }
+            List<String> response = new ArrayList<>();
+            try {
+                List<String> results = handle(request);
+                response.add("OK");
+                response.addAll(results);
+            } catch (Exception e) {
+                response.clear();
+                response.add("ERROR");
+                response.add(e.toString());
+            }
+            writeMessage(out, response);
+        }
+    }
+
+    private static List<String> handle(List<String> request) throws IOException {
+        if (request.isEmpty()) {
+            throw new IllegalArgumentException("Empty request");
+        }
+        String command = request.get(0);
+        List<String> arguments = request.subList(1, request.size());
+        switch (command) {
+            case "PDFSplit":
+                return split(arguments.get(0));
+            case "PDFMerger":
+                return merge(arguments.get(0), arguments.get(1), arguments.get(2));
+            case "PDFMergerBatch":
+                return mergeBatch(arguments);
+            case "ExtractText":
+                return extractText(arguments.get(0));
+            case "ExtractPageTexts":
+                return extractPageTexts(arguments.get(0), arguments.subList(1, arguments.size()));
+            case "PageCount":
+                return pageCount(arguments.get(0));
+            case "PageFingerprints":
+                return pageFingerprints(arguments.get(0));
+            case "WritePages":
+                return writePages(arguments.get(0), arguments.subList(1, arguments.size()));
+            default:
+                throw new IllegalArgumentException("Unknown command: " + command);
+        }
+    }
+
+    private static List<String> split(String filepath) throws IOException {
+        // Same naming convention as the PDFSplit command line tool
+        String outputPrefix = filepath.substring(0, filepath.lastIndexOf('.'));
+        List<String> written = new ArrayList<>();
+        try (PDDocument document = PDDocument.load(new File(filepath))) {
+            List<PDDocument> pages = new Splitter().split(document);
+            for (int i = 0; i < pages.size(); i++) {
+                String pagePath = outputPrefix + "-" + (i + 1) + ".pdf";
+                try (PDDocument page = pages.get(i)) {
+                    page.save(pagePath);
+                }
+                written.add(pagePath);
+            }
+        }
+        return written;
+    }
+
+    private static List<String> merge(String filepath1, String filepath2, String target) throws IOException {
+        PDFMergerUtility merger = new PDFMergerUtility();
+        merger.addSource(filepath1);
+        merger.addSource(filepath2);
+        merger.setDestinationFileName(target);
+        merger.mergeDocuments(MemoryUsageSetting.setupMainMemoryOnly());
+        return Arrays.asList(target);
+    }
+
+    private static List<String> mergeBatch(List<String> merges) {
+        List<String> statuses = new ArrayList<>();
+        for (int i = 0; i + 2 < merges.size(); i += 3) {
+            try {
+                merge(merges.get(i), merges.get(i + 1), merges.get(i + 2));
+                statuses.add("OK");
+            } catch (Exception e) {
+                statuses.add("ERROR " + e);
+            }
+        }
+        return statuses;
+    }
+
+    private static List<String> extractText(String filepath) throws IOException {
+        try (PDDocument document = PDDocument.load(new File(filepath))) {
+            return Arrays.asList(new PDFTextStripper().getText(document));
+        }
+    }
+
+    private static List<String> extractPageTexts(String filepath, List<String> pageRange) throws IOException {
+        List<String> texts = new ArrayList<>();
+        try (PDDocument document = PDDocument.load(new File(filepath))) {
+            int startPage = pageRange.size() > 0 ? Integer.parseInt(pageRange.get(0)) : 1;
+            int endPage = pageRange.size() > 1 ? Integer.parseInt(pageRange.get(1)) : document.getNumberOfPages();
+            endPage = Math.min(endPage, document.getNumberOfPages());
+            PDFTextStripper stripper = new PDFTextStripper();
+            for (int page = startPage; page <= endPage; page++) {
+                stripper.setStartPage(page);
+                stripper.setEndPage(page);
+                texts.add(stripper.getText(document));
+            }
+        }
+        return texts;
+    }
+
+    private static List<String> pageCount(String filepath) throws IOException {
+        try (PDDocument document = PDDocument.load(new File(filepath))) {
+            return Arrays.asList(Integer.toString(document.getNumberOfPages()));
+        }
+    }
+
+    private static List<String> pageFingerprints(String filepath) throws IOException {
+        List<String> fingerprints = new ArrayList<>();
+        try (PDDocument document = PDDocument.load(new File(filepath))) {
+            // objects shared by many pages, like fonts, are hashed once per file
+            Map<COSBase, byte[]> objectDigests = new IdentityHashMap<>();
+            for (PDPage page : document.getPages()) {
+                MessageDigest digest;
+                try {
+                    digest = MessageDigest.getInstance("SHA-256");
+                } catch (NoSuchAlgorithmException e) {
+                    throw new IOException(e);
+                }
+                digest.update(bytes("contents"));
+                try (InputStream contents = page.getContents()) {
+                    digestData(digest, contents);
+                }
+                // text drawn through form XObjects or subset fonts only differs in the resources
+                digest.update(bytes("resources"));
+                COSDictionary resources = page.getResources() != null ? page.getResources().getCOSObject() : null;
+                digestObject(digest, resources, objectDigests);
+                StringBuilder hex = new StringBuilder();
+                for (byte b : digest.digest()) {
+                    hex.append(String.format("%02x", b));
+                }
+                fingerprints.add(hex.toString());
+            }
+        }
+        return fingerprints;
+    }
+
+    private static void digestObject(MessageDigest digest, COSBase object, Map<COSBase, byte[]> objectDigests)
+            throws IOException {
+        if (object instanceof COSObject) {
+            // an indirect object is hashed once, an empty digest marks one being hashed, for reference cycles
+            COSBase referenced = ((COSObject) object).getObject();
+            if (referenced != null && !objectDigests.containsKey(referenced)) {
+                objectDigests.put(referenced, new byte[0]);
+                MessageDigest objectDigest;
+                try {
+                    objectDigest = MessageDigest.getInstance("SHA-256");
+                } catch (NoSuchAlgorithmException e) {
+                    throw new IOException(e);
+                }
+                digestObject(objectDigest, referenced, objectDigests);
+                objectDigests.put(referenced, objectDigest.digest());
+            }
+            byte[] referencedDigest = referenced != null ? objectDigests.get(referenced) : bytes("null");
+            digest.update(referencedDigest.length > 0 ? referencedDigest : bytes("cycle"));
+            return;
+        }
+        if (object == null) {
+            digest.update(bytes("null"));
+        } else if (object instanceof COSDictionary) {
+            COSDictionary dictionary = (COSDictionary) object;
+            List<String> keys = new ArrayList<>();
+            for (COSName key : dictionary.keySet()) {
+                // a resource's /Parent leads back up the page tree, not to what the page draws
+                if (!COSName.PARENT.equals(key)) {
+                    keys.add(key.getName());
+                }
+            }
+            Collections.sort(keys);
+            digest.update(bytes("<<"));
+            for (String key : keys) {
+                digest.update(bytes("/" + key));
+                digestObject(digest, dictionary.getItem(COSName.getPDFName(key)), objectDigests);
+            }
+            digest.update(bytes(">>"));
+            if (object instanceof COSStream) {
+                try (InputStream data = ((COSStream) object).createInputStream()) {
+                    digestData(digest, data);
+                }
+            }
+        } else if (object instanceof COSArray) {
+            COSArray array = (COSArray) object;
+            digest.update(bytes("["));
+            for (int i = 0; i < array.size(); i++) {
+                digestObject(digest, array.get(i), objectDigests);
+            }
+            digest.update(bytes("]"));
+        } else if (object instanceof COSString) {
+            byte[] value = ((COSString) object).getBytes();
+            digest.update(bytes("s" + value.length + ":"));
+            digest.update(value);
+        } else {
+            String value = object.toString();
+            digest.update(bytes("v" + value.length() + ":" + value));
+        }
+    }
+
+    private static void digestData(MessageDigest digest, InputStream data) throws IOException {
+        byte[] buffer = new byte[8192];
+        long length = 0;
+        int read;
+        while ((read = data.read(buffer)) != -1) {
+            digest.update(buffer, 0, read);
+            length += read;
+        }
+        digest.update(bytes("b" + length));
+    }
+
+    private static byte[] bytes(String value) {
+        return value.getBytes(StandardCharsets.UTF_8);
+    }
+
+    private static List<String> writePages(String filepath, List<String> pageTargets) throws IOException {
+        List<String> written = new ArrayList<>();
+        try (PDDocument document = PDDocument.load(new File(filepath))) {
+            for (int i = 0; i + 1 < pageTargets.size(); i += 2) {
+                int page = Integer.parseInt(pageTargets.get(i));
+                String target = pageTargets.get(i + 1);
+                // only the listed page is copied, as PDFSplit -startPage page -endPage page does
+                Splitter splitter = new Splitter();
+                splitter.setStartPage(page);
+                splitter.setEndPage(page);
+                try (PDDocument pageDocument = splitter.split(document).get(0)) {
+                    pageDocument.save(target);
+                }
+                written.add(target);
+            }
+        }
+        return written;
+    }
+
+    private static List<String> readMessage(DataInputStream in) throws IOException {
+        int count = in.readInt();
+        List<String> fields = new ArrayList<>(count);
+        for (int i = 0; i < count; i++) {
+            byte[] field = new byte[in.readInt()];
+            in.readFully(field);
+            fields.add(new String(field, StandardCharsets.UTF_8));
+        }
+        return fields;
+    }
+
+    private static void writeMessage(DataOutputStream out, List<String> fields) throws IOException {
+        out.writeInt(fields.size());
+        for (String field : fields) {
+            byte[] bytes = field.getBytes(StandardCharsets.UTF_8);
+            out.writeInt(bytes.length);
+            out.write(bytes);
+        }
+        out.flush();
+    }
+}
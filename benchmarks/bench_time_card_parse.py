@@ -0,0 +1,97 @@
+"""
+Microbenchmark of TimeCardPDFPage parsing, the previous line by line parse against the precompiled one
+
+Usage:
+    python benchmarks/bench_time_card_parse.py [--pages 20000] [--repeat 5]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from film_payroll_pdf_processor.pdf_pages import TimeCardPDFPage  # noqa: E402
+
+SAMPLE_TEXT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples',
+                                'sample_extracted_pdf_text.txt')
+SAMPLE_FILEPATH = 'pdfs/inbox/WE_031321_EYY896_CONSTRUCTION.pdf'
+
+
+class LineByLineTimeCardPage:
+    """ The parse TimeCardPDFPage used before the precompiled patterns, kept here as the baseline """
+
+    def __init__(self, raw_page_text: str, original_filepath: str):
+        self.raw_page_text = raw_page_text
+        self.original_filepath = original_filepath
+        self.extract_invoice_number()
+        self.extract_name()
+        self.extract_pay_period_date()
+        self.is_2nd_page = "Grand Total:" not in self.raw_page_text
+        self.is_end_of_batch = "END of BATCH" in self.raw_page_text
+
+    def extract_invoice_number(self):
+        match = re.search(r"_[A-Z]{3}[0-9]{3}_", self.original_filepath)
+        if match:
+            self.invoice_number = match.group().replace("_", "")
+
+    def extract_name(self):
+        for line in self.raw_page_text.splitlines():
+            if "," in line:
+                name_list = line.split(", ")
+                self.last_name = name_list[0]
+                self.first_name = name_list[1]
+                if " " in self.first_name:
+                    self.first_name = self.first_name.split(" ").pop(0)
+                break
+
+    def extract_pay_period_date(self):
+        for line in self.raw_page_text.splitlines():
+            if "Pay Period Ending" in line:
+                date_list = line.split("Pay").pop(0).split("/")
+                self.pay_period_month_string = date_list[0]
+                self.pay_period_day_string = date_list[1]
+                self.pay_period_year_string = date_list[2]
+                break
+
+
+def sample_page_texts(page_count: int) -> list:
+    """ The example time card, with every 4th page a 2nd page and the last page ending the batch """
+    with open(SAMPLE_TEXT_PATH, encoding='utf-8') as sample_file:
+        sample_text = sample_file.read()
+    second_page_text = sample_text.replace("Grand Total:", "Sub Total:")
+    page_texts = [second_page_text if n % 4 == 3 else sample_text for n in range(page_count)]
+    page_texts[-1] = page_texts[-1] + "\nEND of BATCH\n"
+    return page_texts
+
+
+def time_parse(page_class, page_texts: list, repeat: int) -> float:
+    """ :return: best seconds per page over `repeat` runs """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for page_text in page_texts:
+            page_class(page_text, SAMPLE_FILEPATH)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(page_texts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=20000, help="Pages parsed per run")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per parser, the best one is reported")
+    args = parser.parse_args()
+
+    page_texts = sample_page_texts(max(1, args.pages))
+    line_by_line = time_parse(LineByLineTimeCardPage, page_texts, args.repeat)
+    precompiled = time_parse(TimeCardPDFPage, page_texts, args.repeat)
+    print(f"{len(page_texts)} pages, best of {args.repeat} runs")
+    print(f"line by line parse: {line_by_line * 1e6:8.2f} us/page")
+    print(f"precompiled parse:  {precompiled * 1e6:8.2f} us/page")
+    print(f"speedup:            {line_by_line / precompiled:8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
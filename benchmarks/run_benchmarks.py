@@ -0,0 +1,234 @@
+"""
+End-to-end benchmark of run.main on synthetic inboxes, with timings for each processing stage
+
+Each size gets a fresh synthetic inbox and outbox in a temporary directory, the extraction cache is turned
+off, and results are saved as JSON so runs can be compared across changes.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--pages 10 1000 10000] [--backend stub|pypdf|pdfbox] [--output results.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCHMARKS_PATH = os.path.dirname(os.path.abspath(__file__))
+REPOSITORY_PATH = os.path.dirname(BENCHMARKS_PATH)
+sys.path.insert(0, REPOSITORY_PATH)
+sys.path.insert(0, BENCHMARKS_PATH)
+
+import run  # noqa: E402
+from film_payroll_pdf_processor.output_name_registry import get_output_name_registry  # noqa: E402
+from film_payroll_pdf_processor.pdf_backends import set_pdf_backend  # noqa: E402
+from film_payroll_pdf_processor.payroll_process import (  # noqa: E402
+    PayrollProcess,
+    OUTBOX_CHECK_COPY_FOLDER,
+    OUTBOX_TIME_CARD_FOLDER,
+    OUTBOX_MERGE_FOLDER,
+)
+from stub_backend import StubPDFBackend  # noqa: E402
+from synthetic_corpus import generate_corpus  # noqa: E402
+
+RESULTS_FOLDER_PATH = os.path.join(BENCHMARKS_PATH, 'results')
+DEFAULT_PAGE_COUNTS = (10, 1000, 10000)
+
+# PayrollProcess classmethods timed as stages, run.main is timed as a whole
+TIMED_STAGES = (
+    "process_multi_page_time_card",
+    "process_multi_page_check_copies_package",
+    "match_time_cards_to_check_copies",
+)
+
+
+class StageTimer:
+    """
+    Times every call of the TIMED_STAGES classmethods while active
+
+    Only calls in this process are seen, with --jobs the first pass runs in worker processes.
+    """
+
+    def __init__(self):
+        self.stages = {stage: {"calls": 0, "seconds": 0.0} for stage in TIMED_STAGES}
+        self._originals = {}
+
+    def __enter__(self):
+        for stage in TIMED_STAGES:
+            original = PayrollProcess.__dict__[stage]
+            self._originals[stage] = original
+            setattr(PayrollProcess, stage, classmethod(self._timed(stage, original.__func__)))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for stage, original in self._originals.items():
+            setattr(PayrollProcess, stage, original)
+        return False
+
+    def _timed(self, stage: str, function):
+        def timed_function(cls, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(cls, *args, **kwargs)
+            finally:
+                self.stages[stage]["calls"] += 1
+                self.stages[stage]["seconds"] += time.perf_counter() - start
+        return timed_function
+
+
+@contextlib.contextmanager
+def payroll_folders(inbox_folder_path: str, outbox_folder_path: str, processing_folder_path: str):
+    """ Points processing at the benchmark's folders instead of /home/pdfs """
+    saved = PayrollProcess.production_settings()
+    PayrollProcess.configure_production(
+        inbox_folder_path=inbox_folder_path,
+        outbox_folder_path=outbox_folder_path,
+        processing_folder_path=processing_folder_path,
+    )
+    try:
+        yield
+    finally:
+        PayrollProcess.configure_production(*saved)
+
+
+def count_files(folder_path: str) -> int:
+    return len([filename for filename in os.listdir(folder_path) if filename.endswith(".pdf")])
+
+
+def benchmark_size(page_count: int, backend, jobs: int, page_threads: int, seed: int, verbose: bool) -> dict:
+    """
+    Generates an inbox of about page_count pages and processes it with run.main
+
+    :return: the corpus summary, wall time, stage and operation timings and output counts
+    """
+    with tempfile.TemporaryDirectory(prefix="payroll-benchmark-") as benchmark_path:
+        inbox_folder_path = os.path.join(benchmark_path, "inbox")
+        outbox_folder_path = os.path.join(benchmark_path, "outbox")
+        processing_folder_path = os.path.join(benchmark_path, "processing")
+        report_path = os.path.join(benchmark_path, "run_report.json")
+        journal_path = os.path.join(benchmark_path, "run_journal.jsonl")
+        for folder in (OUTBOX_CHECK_COPY_FOLDER, OUTBOX_TIME_CARD_FOLDER, OUTBOX_MERGE_FOLDER):
+            os.makedirs(os.path.join(outbox_folder_path, folder))
+        os.makedirs(processing_folder_path)
+
+        start = time.perf_counter()
+        corpus = generate_corpus(inbox_folder_path, page_count, seed)
+        generate_seconds = time.perf_counter() - start
+
+        set_pdf_backend(backend)
+        output = sys.stdout if verbose else open(os.devnull, "w")
+        try:
+            with payroll_folders(inbox_folder_path + os.sep, outbox_folder_path + os.sep, processing_folder_path), \
+                    StageTimer() as stage_timer, contextlib.redirect_stdout(output):
+                start = time.perf_counter()
+                run.main(
+                    jobs=jobs,
+                    page_threads=page_threads,
+                    use_cache=False,
+                    report_path=report_path,
+                    journal_path=journal_path,
+                )
+                main_seconds = time.perf_counter() - start
+        finally:
+            # output names of the temporary outbox are kept in its processing folder
+            get_output_name_registry(processing_folder_path).close()
+            if output is not sys.stdout:
+                output.close()
+
+        outputs = {
+            "time_cards": count_files(os.path.join(outbox_folder_path, OUTBOX_TIME_CARD_FOLDER)),
+            "check_copies": count_files(os.path.join(outbox_folder_path, OUTBOX_CHECK_COPY_FOLDER)),
+            "merged": count_files(os.path.join(outbox_folder_path, OUTBOX_MERGE_FOLDER)),
+        }
+        with open(report_path) as report_file:
+            run_report = json.load(report_file)
+
+    stages = {"main": {"calls": 1, "seconds": main_seconds}}
+    stages.update(stage_timer.stages)
+    for stage in stages.values():
+        stage["seconds"] = round(stage["seconds"], 6)
+    return {
+        "requested_pages": page_count,
+        "corpus": corpus,
+        "generate_seconds": round(generate_seconds, 6),
+        "stages": stages,
+        # backend calls, copies and matching from the run report
+        "operations": run_report["operations"],
+        "failures": len(run_report["failures"]),
+        "pages_per_second": round(corpus["pages"] / main_seconds, 2) if main_seconds else None,
+        "outputs": outputs,
+        # every synthetic time card has a check copy, so all of them should be merged
+        "outputs_complete": outputs == {
+            "time_cards": corpus["time_cards"],
+            "check_copies": corpus["check_copies"],
+            "merged": corpus["time_cards"],
+        },
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPOSITORY_PATH, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark run.main on synthetic payroll inboxes")
+    parser.add_argument(
+        "--pages",
+        type=int,
+        nargs="+",
+        default=list(DEFAULT_PAGE_COUNTS),
+        help="approximate inbox sizes in pages, from 10 up to 50000 "
+             f"(default: {' '.join(str(page_count) for page_count in DEFAULT_PAGE_COUNTS)})"
+    )
+    parser.add_argument(
+        "--backend",
+        default="stub",
+        help="stub, which needs no Java, or a PDF backend name such as pypdf or pdfbox (default: stub)"
+    )
+    parser.add_argument("--jobs", type=int, default=1, help="run.main --jobs (default: 1)")
+    parser.add_argument("--page-threads", type=int, default=1, help="run.main --page-threads (default: 1)")
+    parser.add_argument("--seed", type=int, default=1, help="synthetic corpus random seed (default: 1)")
+    parser.add_argument("--output", help="results JSON path (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--verbose", action="store_true", help="show the processing output")
+    args = parser.parse_args()
+
+    backend = StubPDFBackend if args.backend == "stub" else args.backend
+    started = datetime.now()
+    results = {
+        "started": started.isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": args.backend,
+        "jobs": args.jobs,
+        "page_threads": args.page_threads,
+        "seed": args.seed,
+        "runs": [],
+    }
+    for page_count in args.pages:
+        result = benchmark_size(page_count, backend, args.jobs, args.page_threads, args.seed, args.verbose)
+        results["runs"].append(result)
+        stage_summary = ", ".join(f"{stage} {timing['seconds']:.3f}s" for stage, timing in result["stages"].items())
+        print(
+            f"{result['corpus']['pages']} pages: {result['pages_per_second']} pages/s, {stage_summary}"
+            + ("" if result["outputs_complete"] else f", INCOMPLETE OUTPUT {result['outputs']}")
+        )
+
+    output_path = args.output or os.path.join(RESULTS_FOLDER_PATH, f"{started:%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "w") as output_file:
+        json.dump(results, output_file, indent=2)
+    print(f"Results saved to {output_path}")
+
+
+if __name__ == '__main__':
+    main()
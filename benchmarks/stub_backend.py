@@ -0,0 +1,69 @@
+import hashlib
+from pathlib import Path
+
+from synthetic_corpus import build_pdf, read_pdf_page_texts, CONTENT_STREAM_PATTERN
+
+
+class StubPDFBackend:
+    """
+    PDF backend for benchmarking without Java or a PDF library, with the same surface as PDFBox
+
+    Only reads pdfs written by `synthetic_corpus.build_pdf`, and writes its split and merged files the same
+    way, so it measures the processing around the backend rather than PDF parsing.
+    """
+
+    IN_MEMORY_PAGES = False
+
+    @classmethod
+    def _read_page_texts(cls, filepath: str) -> list:
+        with open(filepath, 'rb') as pdf_file:
+            return read_pdf_page_texts(pdf_file.read())
+
+    @classmethod
+    def _write(cls, target_filepath: str, page_texts: list):
+        with open(target_filepath, 'wb') as target_file:
+            target_file.write(build_pdf(page_texts))
+
+    @classmethod
+    def split_pages(cls, filepath: str):
+        output_prefix = str(Path(filepath).with_suffix(""))
+        for page_number, page_text in enumerate(cls._read_page_texts(filepath), start=1):
+            cls._write(f"{output_prefix}-{page_number}.pdf", [page_text])
+
+    @classmethod
+    def merge_pages(cls, filepath_1: str, filepath_2: str, target_filepath: str):
+        cls._write(target_filepath, cls._read_page_texts(filepath_1) + cls._read_page_texts(filepath_2))
+
+    @classmethod
+    def merge_pages_batch(cls, merges: list) -> list:
+        errors = []
+        for filepath_1, filepath_2, target_filepath in merges:
+            try:
+                cls.merge_pages(filepath_1, filepath_2, target_filepath)
+                errors.append(None)
+            except (OSError, ValueError) as error:
+                errors.append(f"{type(error).__name__}: {error}")
+        return errors
+
+    @classmethod
+    def get_pdf_text(cls, filepath: str) -> str:
+        return "\n".join(cls._read_page_texts(filepath))
+
+    @classmethod
+    def get_page_count(cls, filepath: str) -> int:
+        return len(cls._read_page_texts(filepath))
+
+    @classmethod
+    def get_page_fingerprints(cls, filepath: str) -> list:
+        with open(filepath, 'rb') as pdf_file:
+            return [hashlib.sha256(content).hexdigest() for content in CONTENT_STREAM_PATTERN.findall(pdf_file.read())]
+
+    @classmethod
+    def get_page_texts(cls, filepath: str, start_page: int = 1, end_page: int = None) -> list:
+        return cls._read_page_texts(filepath)[start_page - 1:end_page]
+
+    @classmethod
+    def write_pages(cls, filepath: str, page_targets: list):
+        page_texts = cls._read_page_texts(filepath)
+        for page_number, target_filepath in page_targets:
+            cls._write(target_filepath, [page_texts[page_number - 1]])
@@ -0,0 +1,265 @@
+"""
+Generates a synthetic PDF Inbox of time card batches, REVISED files and check copies packages
+
+Usage:
+    python benchmarks/synthetic_corpus.py /tmp/inbox --pages 1000 [--seed 1]
+"""
+import argparse
+import json
+import os
+import random
+import re
+from datetime import date, timedelta
+
+SAMPLE_TEXT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples',
+                                'sample_extracted_pdf_text.txt')
+
+# The example time card page with its name and date replaced for every generated card
+SAMPLE_NAME = "LIDDIARD, JOAQUIN"
+SAMPLE_PAY_PERIOD = "03/13/2021Pay Period Ending"
+FIRST_WEEK_ENDING = date(2021, 3, 13)
+
+LAST_NAMES = ("PINCKLEY", "LIDDIARD", "SMITH", "O'BRIEN", "DE LA CRUZ", "NGUYEN", "MCALLISTER", "HALE-JONES")
+FIRST_NAMES = ("DENISE", "JOAQUIN", "JOHN", "MARY-KATE", "SAM", "PRIYA", "ROBERT", "ANA")
+DEPARTMENTS = ("CONSTRUCTION", "TEAMSTERS", "CAMERA", "GRIP", "ELECTRIC", "WARDROBE")
+
+# Pages per time card batch before the END of BATCH page
+BATCH_PAGES = 200
+# Pages per check copies package
+CHECK_PACKAGE_PAGES = 250
+SECOND_PAGE_RATE = 0.2
+REVISED_BATCH_RATE = 0.1
+REVISED_CARD_RATE = 0.05
+
+CONTENT_STREAM_PATTERN = re.compile(rb"stream\n(.*?)\nendstream", re.DOTALL)
+SHOWN_STRING_PATTERN = re.compile(rb"\(((?:[^\\)]|\\.)*)\) Tj")
+UNESCAPE_PATTERN = re.compile(rb"\\(.)", re.DOTALL)
+
+
+def build_pdf(page_texts: list) -> bytes:
+    """
+    Writes a minimal uncompressed pdf with one line of Helvetica text per line of each page text
+
+    :param page_texts: text of each page, latin-1 only
+    :return: the pdf bytes
+    """
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    }
+    page_object_numbers = []
+    object_number = 4
+    for page_text in page_texts:
+        shown_lines = []
+        for line in page_text.split("\n"):
+            escaped = line.encode("latin-1").replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+            shown_lines.append(b"(" + escaped + b") Tj T*")
+        content = b"BT /F1 8 Tf 9 TL 20 780 Td " + b" ".join(shown_lines) + b" ET"
+        objects[object_number] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content)
+        objects[object_number + 1] = (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % object_number
+        )
+        page_object_numbers.append(object_number + 1)
+        object_number += 2
+    objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % number for number in page_object_numbers),
+        len(page_object_numbers),
+    )
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(pdf)
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, objects[number])
+    xref_offset = len(pdf)
+    size = max(objects) + 1
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % size
+    for number in range(1, size):
+        pdf += b"%010d 00000 n \n" % offsets[number]
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref_offset)
+    return bytes(pdf)
+
+
+def read_pdf_page_texts(pdf_bytes: bytes) -> list:
+    """
+    Reads the page texts back from a pdf written by `build_pdf`, other pdfs aren't supported
+
+    :param pdf_bytes:
+    :return: text of each page in page order
+    """
+    page_texts = []
+    for content in CONTENT_STREAM_PATTERN.findall(pdf_bytes):
+        lines = [UNESCAPE_PATTERN.sub(rb"\1", shown).decode("latin-1") for shown in SHOWN_STRING_PATTERN.findall(content)]
+        page_texts.append("\n".join(lines))
+    return page_texts
+
+
+def write_pdf(filepath: str, page_texts: list):
+    with open(filepath, 'wb') as pdf_file:
+        pdf_file.write(build_pdf(page_texts))
+
+
+class SyntheticCorpus:
+    """
+    Builds an inbox like a production payroll week, scaled to a total page count
+
+    Each week has a time card batch per department, a 2nd page after some time cards and an END of BATCH
+    page closing each batch.  Some batches get a REVISED file re-issuing the batch with a few of its time cards changed.  Every
+    time card has a check copy page in a check copies package with a `.txt` list, so every time card is
+    matched and merged.
+    """
+
+    def __init__(self, page_count: int, seed: int = 1):
+        self.page_count = max(1, page_count)
+        self.random = random.Random(seed)
+        with open(SAMPLE_TEXT_PATH, encoding='utf-8') as sample_file:
+            self.sample_text = sample_file.read()
+        self.summary = {
+            "pages": 0,
+            "files": 0,
+            "time_card_files": 0,
+            "revised_files": 0,
+            "check_copies_files": 0,
+            "time_cards": 0,
+            "second_pages": 0,
+            "end_of_batch_pages": 0,
+            "revised_time_cards": 0,
+            "check_copies": 0,
+        }
+
+    def time_card_text(self, last_name: str, first_name: str, week_ending: date, first_page: bool = True) -> str:
+        text = self.sample_text.replace(SAMPLE_NAME, f"{last_name}, {first_name}")
+        text = text.replace(SAMPLE_PAY_PERIOD, f"{week_ending:%m/%d/%Y}Pay Period Ending")
+        if not first_page:
+            text = text.replace("Grand Total:", "Continued:")
+        return text
+
+    @staticmethod
+    def end_of_batch_text(invoice_number: str) -> str:
+        return f"Batch {invoice_number}\nEND of BATCH\n"
+
+    @staticmethod
+    def check_copy_text(last_name: str, first_name: str, week_ending: date) -> str:
+        return f"PAY TO THE ORDER OF\n{first_name} {last_name}\nCHECK DATE {week_ending:%m/%d/%Y}\n"
+
+    @staticmethod
+    def payee_name(payee_number: int) -> tuple:
+        """ A unique name for every payee number, letters only so it parses like a real name """
+        suffix = ""
+        number = payee_number // len(LAST_NAMES)
+        while number:
+            number, letter = divmod(number - 1, 26)
+            suffix = chr(ord("A") + letter) + suffix
+        last_name = LAST_NAMES[payee_number % len(LAST_NAMES)] + suffix
+        first_name = FIRST_NAMES[payee_number % len(FIRST_NAMES)]
+        return last_name, first_name
+
+    def generate(self, inbox_folder_path: str) -> dict:
+        """
+        Writes the inbox files
+
+        :param inbox_folder_path: an existing, preferably empty, directory
+        :return: counts of the generated files and pages
+        """
+        # roughly a time card page, a check copy page and a share of the 2nd, END of BATCH and REVISED pages
+        pages_per_card = 2 + SECOND_PAGE_RATE + REVISED_BATCH_RATE * (1 + SECOND_PAGE_RATE) + 1 / BATCH_PAGES
+        card_count = max(1, round(self.page_count / pages_per_card))
+
+        week_number = 0
+        payee_number = 0
+        while card_count > 0:
+            week_ending = FIRST_WEEK_ENDING + timedelta(weeks=week_number)
+            week_cards = min(card_count, BATCH_PAGES * len(DEPARTMENTS))
+            card_count -= week_cards
+            checks = []
+            department_number = 0
+            while week_cards > 0:
+                batch_cards = min(week_cards, BATCH_PAGES)
+                week_cards -= batch_cards
+                invoice_number = "E%s%03d" % (chr(ord("A") + week_number % 26) * 2, department_number)
+                department = DEPARTMENTS[department_number % len(DEPARTMENTS)]
+                filename = f"WE_{week_ending:%m%d%y}_{invoice_number}_{department}"
+                cards = []
+                for _ in range(batch_cards):
+                    cards.append(self.payee_name(payee_number))
+                    payee_number += 1
+                self.write_time_card_batch(inbox_folder_path, filename, invoice_number, week_ending, cards)
+                checks.extend((last_name, first_name, invoice_number) for last_name, first_name in cards)
+                department_number += 1
+            self.write_check_copies_packages(inbox_folder_path, week_ending, checks)
+            week_number += 1
+        return dict(self.summary)
+
+    def write_time_card_batch(self, inbox_folder_path: str, filename: str, invoice_number: str,
+                              week_ending: date, cards: list):
+        page_texts = []
+        # the card of each time card page, None for 2nd and END of BATCH pages
+        page_cards = []
+        for card in cards:
+            last_name, first_name = card
+            page_texts.append(self.time_card_text(last_name, first_name, week_ending))
+            page_cards.append(card)
+            if self.random.random() < SECOND_PAGE_RATE:
+                page_texts.append(self.time_card_text(last_name, first_name, week_ending, first_page=False))
+                page_cards.append(None)
+                self.summary["second_pages"] += 1
+        page_texts.append(self.end_of_batch_text(invoice_number))
+        page_cards.append(None)
+        self.summary["end_of_batch_pages"] += 1
+        self.summary["time_cards"] += len(cards)
+        self.summary["time_card_files"] += 1
+        self.add_file(os.path.join(inbox_folder_path, f"{filename}.pdf"), page_texts)
+
+        if self.random.random() < REVISED_BATCH_RATE:
+            revised_cards = {card for card in cards if self.random.random() < REVISED_CARD_RATE} or {cards[0]}
+            revised_page_texts = [
+                page_text + "\nREVISED\n" if page_card in revised_cards else page_text
+                for page_text, page_card in zip(page_texts, page_cards)
+            ]
+            self.summary["revised_time_cards"] += len(revised_cards)
+            self.summary["revised_files"] += 1
+            self.add_file(os.path.join(inbox_folder_path, f"{filename} REVISED.pdf"), revised_page_texts)
+
+    def write_check_copies_packages(self, inbox_folder_path: str, week_ending: date, checks: list):
+        # check copies come back in a different order than the time cards went out
+        self.random.shuffle(checks)
+        for package_number, start in enumerate(range(0, len(checks), CHECK_PACKAGE_PAGES), start=1):
+            package_checks = checks[start:start + CHECK_PACKAGE_PAGES]
+            filename = f"checks_{week_ending:%m%d%y}_{package_number}"
+            list_lines = [f"Date:{week_ending:%m/%d/%Y}", "PAGE,LAST,FIRST,INVOICE"]
+            for page_number, (last_name, first_name, invoice_number) in enumerate(package_checks, start=1):
+                list_lines.append(f"{page_number},{last_name},{first_name},{invoice_number}")
+            with open(os.path.join(inbox_folder_path, f"{filename}.txt"), 'w') as list_file:
+                list_file.write("\n".join(list_lines) + "\n")
+            self.add_file(
+                os.path.join(inbox_folder_path, f"{filename}.pdf"),
+                [self.check_copy_text(last_name, first_name, week_ending) for last_name, first_name, _ in package_checks]
+            )
+            self.summary["check_copies"] += len(package_checks)
+            self.summary["check_copies_files"] += 1
+
+    def add_file(self, filepath: str, page_texts: list):
+        write_pdf(filepath, page_texts)
+        self.summary["pages"] += len(page_texts)
+        self.summary["files"] += 1
+
+
+def generate_corpus(inbox_folder_path: str, page_count: int, seed: int = 1) -> dict:
+    """
+    :param inbox_folder_path: directory to write the inbox files to, created if missing
+    :param page_count: approximate total number of pages over all generated pdfs
+    :param seed: the same seed and page count always produce the same files
+    :return: counts of the generated files and pages
+    """
+    os.makedirs(inbox_folder_path, exist_ok=True)
+    return SyntheticCorpus(page_count, seed).generate(inbox_folder_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a synthetic PDF Inbox for benchmarking")
+    parser.add_argument("inbox", help="directory to write the inbox files to")
+    parser.add_argument("--pages", type=int, default=1000, help="approximate total page count (default: 1000)")
+    parser.add_argument("--seed", type=int, default=1, help="random seed (default: 1)")
+    args = parser.parse_args()
+    print(json.dumps(generate_corpus(args.inbox, args.pages, args.seed), indent=2))
@@ -0,0 +1,193 @@
+import asyncio
+import os
+import threading
+
+from film_payroll_pdf_processor.run_metrics import get_run_metrics
+
+
+class ProcessCallError(Exception):
+    """ Raised when a command fails, times out or can't be started, after any retries """
+
+    def __init__(
+            self,
+            message: str,
+            returncode: int = None,
+            stderr: str = "",
+            timed_out: bool = False,
+            transient: bool = False,
+    ):
+        """
+        :param message:
+        :param returncode: exit code, None if the process didn't exit by itself
+        :param stderr: what the process wrote to stderr
+        :param timed_out: the process was killed after running too long
+        :param transient: running the command again might work
+        """
+        super().__init__(message)
+        self.returncode = returncode
+        self.stderr = stderr
+        self.timed_out = timed_out
+        self.transient = transient
+
+
+class ProcessResult:
+    """ Output of a command that exited successfully """
+
+    def __init__(self, stdout: bytes, stderr: str, attempts: int):
+        self.stdout = stdout
+        self.stderr = stderr
+        self.attempts = attempts
+
+
+class AsyncProcessClient:
+    """
+    Runs commands as asyncio subprocesses with a concurrency limit, per-call timeouts and retries
+
+    At most max_concurrency commands run at once, however many threads submit them.  A command that
+    times out is killed.  Timeouts, processes killed by a signal and processes that couldn't be started,
+    other than for a missing program, are retried up to `retries` times, waiting backoff_seconds, then
+    twice as long, between attempts.
+    A command that exits with an error code isn't retried, running it again would fail the same way.
+    Every failed attempt is recorded in the run metrics with the command's stderr.
+
+    The `_sync` methods run on a private event loop thread, so synchronous code can call them from
+    any thread.
+
+    Usage:
+        client = AsyncProcessClient(max_concurrency=4, timeout=120)
+        result = client.run_sync(["java", "-jar", jar, "ExtractText", filepath, "-console"])
+        results = client.run_many_sync([command_1, command_2])
+    """
+
+    def __init__(
+            self,
+            max_concurrency: int = os.cpu_count() or 1,
+            timeout: float = 120,
+            retries: int = 2,
+            backoff_seconds: float = 1,
+    ):
+        """
+        :param max_concurrency: most commands running at the same time
+        :param timeout: seconds before a command is killed, None to wait forever
+        :param retries: times a command is run again after a transient failure
+        :param backoff_seconds: wait before the first retry, doubled for each one after
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self._loop = None
+        self._loop_pid = None
+        self._semaphore = None
+        self._loop_lock = threading.Lock()
+
+    async def run(self, command: list, operation: str = None) -> ProcessResult:
+        """
+        Runs a command, retrying transient failures
+
+        :param command: program and arguments
+        :param operation: run metrics operation failures and retries are recorded under, the program name
+            by default
+        :return: the ProcessResult of the successful attempt
+        """
+        operation = operation or os.path.basename(command[0])
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                stdout, stderr = await self._run_once(command)
+                return ProcessResult(stdout, stderr, attempt)
+            except ProcessCallError as error:
+                get_run_metrics().record_failure(
+                    operation, str(error), returncode=error.returncode, stderr=error.stderr
+                )
+                if not error.transient or attempt > self.retries:
+                    raise
+            get_run_metrics().record_retry(operation)
+            await asyncio.sleep(self.backoff_seconds * 2 ** (attempt - 1))
+
+    async def run_many(self, commands: list, operation: str = None, return_errors: bool = False) -> list:
+        """
+        Runs commands concurrently, within the concurrency limit
+
+        :param commands: a list of commands
+        :param operation:
+        :param return_errors: return the ProcessCallError of a failed command in its place instead of raising
+        :return: a ProcessResult for each command, in the same order, the first failure is raised
+        """
+        results = await asyncio.gather(
+            *(self.run(command, operation) for command in commands),
+            return_exceptions=return_errors,
+        )
+        for result in results:
+            # anything other than a failed command is still raised
+            if isinstance(result, BaseException) and not isinstance(result, ProcessCallError):
+                raise result
+        return results
+
+    async def _run_once(self, command: list) -> tuple:
+        async with self._semaphore:
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *command,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+            except OSError as error:
+                # a missing program won't appear on a retry, running out of processes might clear up
+                raise ProcessCallError(
+                    f"{command[0]} couldn't be started: {error}",
+                    transient=not isinstance(error, (FileNotFoundError, PermissionError)),
+                )
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), self.timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                _, stderr = await process.communicate()
+                raise ProcessCallError(
+                    f"{' '.join(command)} timed out after {self.timeout:g} seconds",
+                    returncode=process.returncode,
+                    stderr=stderr.decode('utf-8', errors='replace'),
+                    timed_out=True,
+                    transient=True,
+                )
+        stderr = stderr.decode('utf-8', errors='replace')
+        if process.returncode != 0:
+            raise ProcessCallError(
+                f"{' '.join(command)} exited with {process.returncode}",
+                returncode=process.returncode,
+                stderr=stderr,
+                # killed by a signal, e.g. by the OOM killer
+                transient=process.returncode < 0,
+            )
+        return stdout, stderr
+
+    def run_sync(self, command: list, operation: str = None) -> ProcessResult:
+        """ `run` for synchronous callers """
+        return self._submit(self.run(command, operation))
+
+    def run_many_sync(self, commands: list, operation: str = None, return_errors: bool = False) -> list:
+        """ `run_many` for synchronous callers """
+        return self._submit(self.run_many(commands, operation, return_errors))
+
+    def _submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._get_loop()).result()
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            # A forked child process doesn't have the parent's loop thread, it starts its own
+            if self._loop is None or self._loop_pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                self._loop_pid = os.getpid()
+                threading.Thread(target=self._loop.run_forever, name="async-process-client", daemon=True).start()
+                self._semaphore = self._submit_on(self._loop, self._create_semaphore())
+            return self._loop
+
+    @staticmethod
+    def _submit_on(loop: asyncio.AbstractEventLoop, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+    async def _create_semaphore(self) -> asyncio.Semaphore:
+        # created on the loop thread, older Pythons bind a semaphore to the loop it's created on
+        return asyncio.Semaphore(self.max_concurrency)
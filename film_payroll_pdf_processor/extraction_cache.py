@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+# kept in the processing folder
+EXTRACTION_CACHE_FILENAME = 'extraction_cache.sqlite3'
+EXTRACTION_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Entry kinds
+PDF_PAGE_TEXTS = "pdf_page_texts"
+PAGE = "page"
+CHECK_COPY_LIST = "check_copy_list"
+
+
+def hash_file(filepath: str) -> str:
+    """
+    :param filepath:
+    :return: sha256 hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as hashed_file:
+        for block in iter(lambda: hashed_file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Persistent SQLite cache of extraction results keyed by content hashes
+
+    Entries are JSON values stored by (kind, content hash):
+        pdf_page_texts  - sha256 of a whole pdf -> list of page entries
+        page            - fingerprint of a single page's content and resources -> page entry, its text and
+                          parsed fields
+        check_copy_list - sha256 of a check copy .txt list -> parsed check copy fields
+
+    Parsed values are stored with the PARSER_VERSION that parsed them, see `is_current_parse`, a value of an
+    earlier parser is parsed again.  Once the stored values grow past max_bytes the least recently used
+    entries are evicted.
+    """
+
+    def __init__(self, database_path: str, max_bytes: int = EXTRACTION_CACHE_MAX_BYTES):
+        self.database_path = database_path
+        self.max_bytes = max_bytes
+        self._connection = None
+        self._connection_pid = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # --jobs worker processes each open their own connection
+        if self._connection is None or self._connection_pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.database_path)), exist_ok=True)
+            self._connection = sqlite3.connect(self.database_path, timeout=30)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " kind TEXT NOT NULL,"
+                " content_hash TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " last_used REAL NOT NULL,"
+                " PRIMARY KEY (kind, content_hash))"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+            self._connection.commit()
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def get(self, kind: str, content_hash: str):
+        """
+        :param kind:
+        :param content_hash:
+        :return: the cached value, or None if it isn't cached
+        """
+        return self.get_many(kind, [content_hash]).get(content_hash)
+
+    def get_many(self, kind: str, content_hashes: list) -> dict:
+        """
+        :param kind:
+        :param content_hashes:
+        :return: a dict of content hash to value for every hash that is cached
+        """
+        found = {}
+        unique_hashes = list(set(content_hashes))
+        # stay well under SQLite's limit on query parameters
+        for start in range(0, len(unique_hashes), 500):
+            batch = unique_hashes[start:start + 500]
+            placeholders = ", ".join("?" * len(batch))
+            for content_hash, value in self.connection.execute(
+                f"SELECT content_hash, value FROM entries WHERE kind = ? AND content_hash IN ({placeholders})",
+                [kind] + batch
+            ):
+                found[content_hash] = json.loads(value)
+        if found:
+            now = time.time()
+            with self.connection:
+                self.connection.executemany(
+                    "UPDATE entries SET last_used = ? WHERE kind = ? AND content_hash = ?",
+                    [(now, kind, content_hash) for content_hash in found]
+                )
+        return found
+
+    def put(self, kind: str, content_hash: str, value):
+        self.put_many(kind, {content_hash: value})
+
+    def put_many(self, kind: str, values: dict):
+        """
+        Stores values and evicts least recently used entries if the cache is over its size limit
+
+        :param kind:
+        :param values: a dict of content hash to JSON serializable value
+        :return:
+        """
+        now = time.time()
+        rows = []
+        for content_hash, value in values.items():
+            encoded = json.dumps(value)
+            rows.append((kind, content_hash, encoded, len(encoded), now))
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO entries (kind, content_hash, value, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+        self.evict()
+
+    def evict(self):
+        """ Removes least recently used entries until the cache is within max_bytes """
+        total_size, = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if total_size <= self.max_bytes:
+            return
+        evicted = []
+        for kind, content_hash, size in self.connection.execute(
+            "SELECT kind, content_hash, size FROM entries ORDER BY last_used"
+        ):
+            if total_size <= self.max_bytes:
+                break
+            evicted.append((kind, content_hash))
+            total_size -= size
+        with self.connection:
+            self.connection.executemany("DELETE FROM entries WHERE kind = ? AND content_hash = ?", evicted)
+
+
+def is_current_parse(value, parser_version: int) -> bool:
+    """
+    :param value: a cached dict of parsed values, or None
+    :param parser_version: the current PARSER_VERSION
+    :return: True if the value was parsed by the current parser
+    """
+    return isinstance(value, dict) and value.get("parser_version") == parser_version
+
+
+_extraction_cache = None
+_extraction_cache_enabled = True
+_extraction_cache_max_bytes = EXTRACTION_CACHE_MAX_BYTES
+
+
+def configure_extraction_cache(enabled: bool = True, max_bytes: int = EXTRACTION_CACHE_MAX_BYTES):
+    """
+    Turns the extraction cache on or off, `run.py --no-cache` turns it off
+
+    :param enabled:
+    :param max_bytes:
+    :return:
+    """
+    global _extraction_cache, _extraction_cache_enabled, _extraction_cache_max_bytes
+    _extraction_cache_enabled = enabled
+    _extraction_cache_max_bytes = max_bytes
+    _extraction_cache = None
+
+
+def get_extraction_cache(processing_folder_path: str):
+    """
+    :param processing_folder_path: the configured processing folder, see PayrollProcess.configure_production
+    :return: the shared ExtractionCache, kept in the processing folder, or None when caching is turned off
+    """
+    global _extraction_cache
+    if not _extraction_cache_enabled:
+        return None
+    database_path = os.path.join(processing_folder_path, EXTRACTION_CACHE_FILENAME)
+    if _extraction_cache is None or _extraction_cache.database_path != database_path:
+        _extraction_cache = ExtractionCache(database_path, _extraction_cache_max_bytes)
+    return _extraction_cache
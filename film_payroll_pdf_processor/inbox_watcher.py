@@ -0,0 +1,302 @@
+import json
+import os
+import time
+
+from film_payroll_pdf_processor.extraction_cache import hash_file
+from film_payroll_pdf_processor.matching import MatchingEngine
+from film_payroll_pdf_processor.output_name_registry import get_output_name_registry
+from film_payroll_pdf_processor.payroll_process import (
+    OUTBOX_CHECK_COPY_FOLDER,
+    OUTBOX_TIME_CARD_FOLDER,
+    PayrollProcess,
+    TIME_CARD_FILE,
+    REVISED_TIME_CARD_FILE,
+    CHECK_COPIES_FILE,
+    classify_inbox_file,
+)
+from film_payroll_pdf_processor.pdf_pages import TimeCardPDFPage, CheckCopyPDFPage
+
+# kept in the processing folder
+WATCH_MANIFEST_FILENAME = 'watch_manifest.json'
+WATCH_POLL_INTERVAL_SECONDS = 5.0
+
+
+class InboxWatcher:
+    """
+    Polls the PDF Inbox and processes each PDF as soon as it is complete
+
+    A file is complete once its size and modification time are the same on two polls in a row, and,
+    for a check copies package, its companion .txt list exists.  After each file the time cards and
+    check copies are matched again and only new or affected pairs are merged.
+
+    The manifest records the content hash of every processed file, the records it produced and the
+    merged files, so a restarted watcher only processes files that are new or changed.  The outbox files
+    of a file removed from the inbox, and the merged files made from them, are removed.
+    """
+
+    def __init__(
+            self,
+            inbox_folder_path: str = None,
+            manifest_path: str = None,
+            poll_interval: float = WATCH_POLL_INTERVAL_SECONDS,
+    ):
+        # the configured production's inbox by default
+        self.inbox_folder_path = inbox_folder_path or PayrollProcess.INBOX_FOLDER_PATH
+        # the configured processing folder's manifest by default
+        self.manifest_path = manifest_path or os.path.join(
+            PayrollProcess.PROCESSING_FOLDER_PATH, WATCH_MANIFEST_FILENAME
+        )
+        self.poll_interval = poll_interval
+        # filename -> sizes and modification times seen on the previous poll
+        self._last_seen = {}
+        self._waiting_for_list = set()
+        self.manifest = self._load_manifest()
+
+    def run(self):
+        """ Polls until interrupted """
+        print(f"\nWatching {self.inbox_folder_path} for new files, press Ctrl+C to stop")
+        try:
+            while True:
+                self.poll()
+                time.sleep(self.poll_interval)
+        except KeyboardInterrupt:
+            print("\nStopped watching.")
+
+    def poll(self) -> bool:
+        """
+        Processes every complete file that is new or changed since it was last processed
+
+        :return: True if anything was processed
+        """
+        processed_files = self.manifest["files"]
+        ready = []
+        seen = {}
+        for filename in sorted(os.listdir(self.inbox_folder_path)):
+            file_type = classify_inbox_file(filename)
+            if file_type not in (TIME_CARD_FILE, REVISED_TIME_CARD_FILE, CHECK_COPIES_FILE):
+                continue
+            filepath = os.path.join(self.inbox_folder_path, filename)
+            seen[filename] = self._file_state(file_type, filepath)
+            if self._last_seen.get(filename) != seen[filename]:
+                # still being written, or new since the last poll
+                continue
+            if file_type == CHECK_COPIES_FILE and not os.path.exists(self._check_copy_list_path(filepath)):
+                if filename not in self._waiting_for_list:
+                    print(f"\nWaiting for check list {self._check_copy_list_path(filepath)}")
+                    self._waiting_for_list.add(filename)
+                continue
+            self._waiting_for_list.discard(filename)
+            file_hashes = self._file_hashes(file_type, filepath)
+            if processed_files.get(filename, {}).get("hashes") != file_hashes:
+                ready.append((file_type, filename, file_hashes))
+        self._last_seen = seen
+
+        removed = {filename: processed for filename, processed in processed_files.items() if filename not in seen}
+        for filename in removed:
+            print(f"\n{filename} was removed from the inbox, removing its outbox files")
+            self._forget(filename)
+
+        if not ready and not removed:
+            return False
+
+        # each poll is a run of the output name registry, a changed file may keep the names it had
+        get_output_name_registry(PayrollProcess.PROCESSING_FOLDER_PATH).start_run()
+        # Originals first so revisions always overwrite them, as in a batch run
+        ready.sort(key=lambda item: item[0] == REVISED_TIME_CARD_FILE)
+        rewritten_time_cards = set()
+        rewritten_check_copies = set()
+        for file_type, filename, file_hashes in ready:
+            records = self._process(file_type, filename)
+            processed_files[filename] = {"type": file_type, "hashes": file_hashes, "records": records}
+            if file_type == CHECK_COPIES_FILE:
+                rewritten_check_copies.update(self._output_names(processed_files[filename]))
+            else:
+                rewritten_time_cards.update(self._output_names(processed_files[filename]))
+            self._save_manifest()
+
+        originals = [filename for file_type, filename, _ in ready if file_type == TIME_CARD_FILE]
+        if originals:
+            rewritten_time_cards.update(self._reapply_revisions(originals, [filename for _, filename, _ in ready]))
+
+        removed_time_cards, removed_check_copies = self._remove_outbox_files(removed)
+        self._merge_changes(rewritten_time_cards, rewritten_check_copies, removed_time_cards, removed_check_copies)
+        self._save_manifest()
+        return True
+
+    def _process(self, file_type: str, filename: str) -> list:
+        filepath = os.path.join(self.inbox_folder_path, filename)
+        if file_type == CHECK_COPIES_FILE:
+            print(f"\nDetected PDF file for processing, processing as Check Copies package: {filename}")
+            pages = PayrollProcess.process_multi_page_check_copies_package(filepath)
+        elif file_type == REVISED_TIME_CARD_FILE:
+            print(f"\nDetected *Revised* TimeCards file for processing: {filename}")
+            pages = PayrollProcess.process_multi_page_time_card(filepath, is_revision=True)
+        else:
+            print(f"\nDetected TimeCards file for processing: {filename}")
+            pages = PayrollProcess.process_multi_page_time_card(filepath)
+        return [page.record for page in pages]
+
+    def _reapply_revisions(self, originals: list, just_processed: list) -> set:
+        """
+        Writes already processed REVISED files again after their original arrived late and overwrote them,
+        only revisions with time cards of an invoice the originals have
+
+        :param originals: time card files processed in this poll
+        :param just_processed: filenames processed in this poll, revisions among them are already current
+        :return: output names of the rewritten time cards
+        """
+        files = self.manifest["files"]
+        invoice_numbers = {
+            TimeCardPDFPage.from_record(record).invoice_number
+            for filename in originals
+            for record in files[filename]["records"]
+        }
+        rewritten = set()
+        for filename, processed in sorted(files.items()):
+            if (
+                processed["type"] == REVISED_TIME_CARD_FILE and
+                filename not in just_processed and
+                any(TimeCardPDFPage.from_record(r).invoice_number in invoice_numbers for r in processed["records"])
+            ):
+                processed["records"] = self._process(REVISED_TIME_CARD_FILE, filename)
+                rewritten.update(self._output_names(processed))
+        return rewritten
+
+    def _remove_outbox_files(self, removed: dict) -> tuple:
+        """
+        Removes the outbox time cards and check copies of files removed from the inbox, except those a
+        current file writes too, e.g. time cards of a removed REVISED file that its original still has
+
+        :param removed: filename -> manifest entry of each file removed from the inbox
+        :return: output names of the removed time cards and of the removed check copies
+        """
+        current_time_cards = set()
+        current_check_copies = set()
+        for processed in self.manifest["files"].values():
+            if processed["type"] == CHECK_COPIES_FILE:
+                current_check_copies.update(self._output_names(processed))
+            else:
+                current_time_cards.update(self._output_names(processed))
+        removed_time_cards = set()
+        removed_check_copies = set()
+        for processed in removed.values():
+            if processed["type"] == CHECK_COPIES_FILE:
+                removed_check_copies.update(self._output_names(processed) - current_check_copies)
+            else:
+                removed_time_cards.update(self._output_names(processed) - current_time_cards)
+        for folder, output_names in (
+            (OUTBOX_TIME_CARD_FOLDER, removed_time_cards),
+            (OUTBOX_CHECK_COPY_FOLDER, removed_check_copies),
+        ):
+            for output_name in sorted(output_names):
+                PayrollProcess.remove_outbox_file(PayrollProcess.outbox_filepath(folder, output_name))
+        if removed_time_cards or removed_check_copies:
+            print(
+                f"\nRemoved {len(removed_time_cards)} time cards and {len(removed_check_copies)} check copies "
+                f"of files removed from the inbox"
+            )
+        return removed_time_cards, removed_check_copies
+
+    @staticmethod
+    def _output_names(processed: dict) -> set:
+        """ Output names of the records of a processed file """
+        if processed["type"] == CHECK_COPIES_FILE:
+            return {CheckCopyPDFPage.from_record(record).output_file_name for record in processed["records"]}
+        return {TimeCardPDFPage.from_record(record).output_file_name for record in processed["records"]}
+
+    def _merge_changes(
+            self,
+            rewritten_time_cards: set,
+            rewritten_check_copies: set,
+            removed_time_cards: set = frozenset(),
+            removed_check_copies: set = frozenset(),
+    ):
+        """
+        Matches all current records and merges pairs that are new, re-paired or have a rewritten input, and
+        removes merged files that lost their pair or an input
+
+        :param rewritten_time_cards: output names of time cards written since the last merge
+        :param rewritten_check_copies: output names of check copies written since the last merge
+        :param removed_time_cards: output names of time cards removed since the last merge
+        :param removed_check_copies: output names of check copies removed since the last merge
+        """
+        time_cards = []
+        check_copies = []
+        for filename, processed in sorted(self.manifest["files"].items()):
+            if processed["type"] == TIME_CARD_FILE:
+                time_cards.extend(TimeCardPDFPage.from_record(r) for r in processed["records"])
+            elif processed["type"] == CHECK_COPIES_FILE:
+                check_copies.extend(CheckCopyPDFPage.from_record(r) for r in processed["records"])
+
+        match_result = MatchingEngine.match(
+            time_cards, check_copies, near_matches=True, merge_near_matches=PayrollProcess.MERGE_NEAR_MATCHES
+        )
+        merged = self.manifest["merged"]
+        to_merge = []
+        current = {}
+        for pair in match_result.matched_pairs:
+            inputs = [pair.time_card.output_file_name, pair.check_copy.output_file_name]
+            current[pair.merged_output_name] = inputs
+            if (
+                merged.get(pair.merged_output_name) != inputs or
+                inputs[0] in rewritten_time_cards or
+                inputs[1] in rewritten_check_copies
+            ):
+                print(f"- {inputs[0]} <matched> {inputs[1]}")
+                to_merge.append(pair)
+        PayrollProcess.merge_matched_pairs(to_merge)
+        PayrollProcess.remove_stale_merges(
+            match_result.matched_pairs,
+            [time_card.output_file_name for time_card in time_cards] + sorted(removed_time_cards),
+            [check_copy.output_file_name for check_copy in check_copies] + sorted(removed_check_copies),
+        )
+        self.manifest["merged"] = current
+
+        print(
+            f"\nMerged {len(to_merge)} new or changed pairs, {len(current)} merged in total, "
+            f"{len(match_result.unmatched_time_cards)} time cards and "
+            f"{len(match_result.unmatched_check_copies)} check copies waiting for a match"
+        )
+        PayrollProcess.print_near_match_report(match_result.near_matches)
+
+    def _forget(self, filename: str):
+        del self.manifest["files"][filename]
+        self._save_manifest()
+
+    def _file_state(self, file_type: str, filepath: str) -> list:
+        """ Size and modification time of a file and, for check copies packages, of its list """
+        state = []
+        paths = [filepath]
+        if file_type == CHECK_COPIES_FILE:
+            paths.append(self._check_copy_list_path(filepath))
+        for path in paths:
+            if os.path.exists(path):
+                stat = os.stat(path)
+                state.append((stat.st_size, stat.st_mtime_ns))
+            else:
+                state.append(None)
+        return state
+
+    @staticmethod
+    def _check_copy_list_path(filepath: str) -> str:
+        return filepath.replace(".pdf", ".txt")
+
+    def _file_hashes(self, file_type: str, filepath: str) -> list:
+        hashes = [hash_file(filepath)]
+        if file_type == CHECK_COPIES_FILE:
+            hashes.append(hash_file(self._check_copy_list_path(filepath)))
+        return hashes
+
+    def _load_manifest(self) -> dict:
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as manifest_file:
+                return json.load(manifest_file)
+        return {"files": {}, "merged": {}}
+
+    def _save_manifest(self):
+        # write then rename so a crash never leaves a half written manifest
+        os.makedirs(os.path.dirname(os.path.abspath(self.manifest_path)), exist_ok=True)
+        partial_path = self.manifest_path + ".partial"
+        with open(partial_path, "w") as manifest_file:
+            json.dump(self.manifest, manifest_file)
+        os.replace(partial_path, self.manifest_path)
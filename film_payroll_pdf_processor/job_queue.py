@@ -0,0 +1,221 @@
+import os
+import sqlite3
+import time
+
+JOB_QUEUE_PATH = '/home/pdfs/job_queue.sqlite3'
+# Each job's processing output, run report and processing folder, in the jobs folder of the processing folder
+JOB_FOLDER_NAME = 'jobs'
+JOB_LOG_FOLDER_PATH = '/home/pdfs/processing/jobs/'
+
+# Job statuses
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+JOB_COLUMNS = (
+    "id",
+    "inbox_folder_path",
+    "outbox_folder_path",
+    "production_code",
+    "status",
+    "queued_at",
+    "started_at",
+    "finished_at",
+    "worker_pid",
+    "log_path",
+    "report_path",
+    "journal_path",
+    "processing_folder_path",
+    "error",
+)
+
+
+def job_log_folder_path(processing_folder_path: str = None) -> str:
+    """
+    :param processing_folder_path: e.g. --processing, the default processing folder if None
+    :return: the jobs folder of the processing folder
+    """
+    if processing_folder_path is None:
+        return JOB_LOG_FOLDER_PATH
+    return os.path.join(processing_folder_path, JOB_FOLDER_NAME)
+
+
+class JobQueue:
+    """
+    Persistent SQLite queue of jobs, each an inbox to process into an outbox for one production
+
+    Jobs are claimed oldest first, claiming is atomic so several processes can drain the same queue.  Each
+    job has its own processing folder, `job-<id>` in the log folder by default, so jobs processed at the
+    same time don't share scratch workspaces or state kept between runs.
+
+    Usage:
+        job_queue = JobQueue()
+        job_queue.add_job('/home/pdfs/lls2/inbox/', '/home/pdfs/lls2/outbox/', 'LLS2')
+        job = job_queue.claim_job()
+        ...
+        job_queue.finish_job(job["id"])
+    """
+
+    def __init__(self, database_path: str = JOB_QUEUE_PATH, log_folder_path: str = JOB_LOG_FOLDER_PATH):
+        self.database_path = database_path
+        self.log_folder_path = log_folder_path
+        self._connection = None
+        self._connection_pid = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # each worker process opens its own connection
+        if self._connection is None or self._connection_pid != os.getpid():
+            self._connection = sqlite3.connect(self.database_path, timeout=30, isolation_level=None)
+            self._connection.row_factory = sqlite3.Row
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " inbox_folder_path TEXT NOT NULL,"
+                " outbox_folder_path TEXT NOT NULL,"
+                " production_code TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " queued_at REAL NOT NULL,"
+                " started_at REAL,"
+                " finished_at REAL,"
+                " worker_pid INTEGER,"
+                " log_path TEXT,"
+                " report_path TEXT,"
+                " journal_path TEXT,"
+                " processing_folder_path TEXT,"
+                " error TEXT)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+            self._add_processing_folders(self._connection)
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def _add_processing_folders(self, connection: sqlite3.Connection):
+        # queues made before jobs had a processing folder give their jobs the default one
+        columns = [row["name"] for row in connection.execute("PRAGMA table_info(jobs)")]
+        if "processing_folder_path" not in columns:
+            connection.execute("ALTER TABLE jobs ADD COLUMN processing_folder_path TEXT")
+        for row in connection.execute("SELECT id FROM jobs WHERE processing_folder_path IS NULL").fetchall():
+            connection.execute(
+                "UPDATE jobs SET processing_folder_path = ? WHERE id = ?",
+                (self._default_processing_folder_path(row["id"]), row["id"])
+            )
+
+    def _default_processing_folder_path(self, job_id: int) -> str:
+        return os.path.join(self.log_folder_path, f"job-{job_id}")
+
+    def add_job(
+            self,
+            inbox_folder_path: str,
+            outbox_folder_path: str,
+            production_code: str,
+            processing_folder_path: str = None,
+    ) -> int:
+        """
+        :param inbox_folder_path: the production's PDF Inbox for the week
+        :param outbox_folder_path: where the production's check_copies, time_cards and final folders are
+        :param production_code: prefix of merged file names, e.g. LLS2
+        :param processing_folder_path: the job's processing folder, `job-<id>` in the log folder by default
+        :return: the job id
+        """
+        cursor = self.connection.execute(
+            "INSERT INTO jobs (inbox_folder_path, outbox_folder_path, production_code, status, queued_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (inbox_folder_path, outbox_folder_path, production_code, QUEUED, time.time())
+        )
+        job_id = cursor.lastrowid
+        self.connection.execute(
+            "UPDATE jobs SET log_path = ?, report_path = ?, journal_path = ?, processing_folder_path = ? WHERE id = ?",
+            (
+                os.path.join(self.log_folder_path, f"job-{job_id}.log"),
+                os.path.join(self.log_folder_path, f"job-{job_id}-report.json"),
+                # an interrupted job resumes from its journal when it is queued again
+                os.path.join(self.log_folder_path, f"job-{job_id}-journal.jsonl"),
+                processing_folder_path or self._default_processing_folder_path(job_id),
+                job_id,
+            )
+        )
+        return job_id
+
+    def claim_job(self, worker_pid: int = None):
+        """
+        Marks the oldest queued job as running
+
+        :param worker_pid: process running the job, so an interrupted job can be told from a running one
+        :return: the job as a dict of JOB_COLUMNS, or None if no job is queued
+        """
+        connection = self.connection
+        # IMMEDIATE takes the write lock up front, so two processes can't claim the same job
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY id LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is not None:
+                connection.execute(
+                    "UPDATE jobs SET status = ?, started_at = ?, finished_at = NULL, worker_pid = ?, error = NULL"
+                    " WHERE id = ?",
+                    (RUNNING, time.time(), worker_pid, row["id"])
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return self.get_job(row["id"]) if row is not None else None
+
+    def set_worker_pid(self, job_id: int, worker_pid: int):
+        self.connection.execute("UPDATE jobs SET worker_pid = ? WHERE id = ?", (worker_pid, job_id))
+
+    def finish_job(self, job_id: int):
+        self.connection.execute(
+            "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?", (DONE, time.time(), job_id)
+        )
+
+    def fail_job(self, job_id: int, error: str):
+        self.connection.execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE id = ?",
+            (FAILED, time.time(), error, job_id)
+        )
+
+    def requeue_interrupted_jobs(self) -> list:
+        """
+        Queues running jobs again when their worker process is gone, e.g. after the container restarted
+
+        :return: ids of the requeued jobs
+        """
+        requeued = []
+        for row in self.connection.execute("SELECT id, worker_pid FROM jobs WHERE status = ?", (RUNNING,)).fetchall():
+            if row["worker_pid"] is None or not self._process_exists(row["worker_pid"]):
+                self.connection.execute(
+                    "UPDATE jobs SET status = ?, worker_pid = NULL WHERE id = ? AND status = ?",
+                    (QUEUED, row["id"], RUNNING)
+                )
+                requeued.append(row["id"])
+        return requeued
+
+    @staticmethod
+    def _process_exists(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def get_job(self, job_id: int):
+        row = self.connection.execute(
+            f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    def jobs(self) -> list:
+        """
+        :return: every job, oldest first
+        """
+        return [
+            dict(row)
+            for row in self.connection.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs ORDER BY id")
+        ]
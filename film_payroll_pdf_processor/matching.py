@@ -0,0 +1,322 @@
+from collections import deque
+
+from film_payroll_pdf_processor.pdf_pages import TimeCardPDFPage, CheckCopyPDFPage
+
+# Near matches of leftover records, scored by name similarity from 0 to 1
+NEAR_MATCH_MIN_SCORE = 0.6
+# Near matches at least this similar, and clearly better than any other candidate, can be merged automatically
+NEAR_MATCH_AUTO_MERGE_SCORE = 0.9
+NEAR_MATCH_MARGIN = 0.05
+
+
+def _date_part(value: str):
+    # "03" and "3" are the same month
+    return int(value) if value.isdigit() else value
+
+
+def time_card_block_key(time_card: TimeCardPDFPage) -> tuple:
+    """ (invoice, month, day, year), near matches are only looked for within a block """
+    return (
+        time_card.invoice_number,
+        _date_part(time_card.pay_period_month_string),
+        _date_part(time_card.pay_period_day_string),
+        _date_part(time_card.pay_period_year_string),
+    )
+
+
+def check_copy_block_key(check_copy: CheckCopyPDFPage) -> tuple:
+    return (
+        check_copy.invoice_number,
+        _date_part(check_copy.month),
+        _date_part(check_copy.day),
+        _date_part(check_copy.year),
+    )
+
+
+def edit_distance(a: str, b: str) -> int:
+    """ Levenshtein distance, the insertions, deletions and substitutions turning a into b """
+    if len(a) < len(b):
+        a, b = b, a
+    previous_row = list(range(len(b) + 1))
+    for i, a_character in enumerate(a, start=1):
+        row = [i]
+        for j, b_character in enumerate(b, start=1):
+            row.append(min(
+                previous_row[j] + 1,
+                row[j - 1] + 1,
+                previous_row[j - 1] + (a_character != b_character),
+            ))
+        previous_row = row
+    return previous_row[-1]
+
+
+def name_similarity(last_name_1: str, first_name_1: str, last_name_2: str, first_name_2: str) -> float:
+    """
+    1 - edit distance / length of the longer "LAST,FIRST", also comparing only the first word of the first
+    names so a middle name or initial on one side doesn't count against a match
+
+    :return: 0 to 1, 1 being the same name
+    """
+    def similarity(name_1: str, name_2: str) -> float:
+        longest = max(len(name_1), len(name_2))
+        return 1 - edit_distance(name_1, name_2) / longest if longest else 1.0
+
+    first_word_1 = first_name_1.split(" ")[0]
+    first_word_2 = first_name_2.split(" ")[0]
+    return max(
+        similarity(f"{last_name_1},{first_name_1}", f"{last_name_2},{first_name_2}"),
+        similarity(f"{last_name_1},{first_word_1}", f"{last_name_2},{first_word_2}"),
+    )
+
+
+class NearMatch:
+    """ A leftover time card and check copy with the same invoice and date and similar names """
+
+    __slots__ = ("time_card", "check_copy", "score", "confident", "pair")
+
+    def __init__(self, time_card: TimeCardPDFPage, check_copy: CheckCopyPDFPage, score: float, confident: bool):
+        self.time_card = time_card
+        self.check_copy = check_copy
+        self.score = score
+        # similar enough, and clearly the best candidate on both sides, to merge without a person checking
+        self.confident = confident
+        # the MatchedPair once merged automatically
+        self.pair = None
+
+
+def find_near_matches(
+        time_cards: list,
+        check_copies: list,
+        min_score: float = NEAR_MATCH_MIN_SCORE,
+        auto_merge_score: float = NEAR_MATCH_AUTO_MERGE_SCORE,
+) -> list:
+    """
+    Pairs leftover records that differ only by a typo or a middle name
+
+    Candidates are blocked by (invoice, pay period date), so names are only compared within a block, then
+    paired best score first, each record at most once.
+
+    :param time_cards: unmatched TimeCardPDFPage list
+    :param check_copies: unmatched CheckCopyPDFPage list
+    :param min_score: least similarity worth suggesting
+    :param auto_merge_score: least similarity of a confident near match
+    :return: NearMatch list, best score first
+    """
+    check_copies_by_block = {}
+    for check_copy_index, check_copy in enumerate(check_copies):
+        check_copies_by_block.setdefault(check_copy_block_key(check_copy), []).append(check_copy_index)
+
+    # (score, time card index, check copy index)
+    candidates = []
+    for time_card_index, time_card in enumerate(time_cards):
+        for check_copy_index in check_copies_by_block.get(time_card_block_key(time_card), ()):
+            check_copy = check_copies[check_copy_index]
+            score = name_similarity(
+                time_card.last_name, time_card.first_name, check_copy.payee_last_name, check_copy.payee_first_name
+            )
+            if score >= min_score:
+                candidates.append((score, time_card_index, check_copy_index))
+    # best first, ties in the order the records were given
+    candidates.sort(key=lambda candidate: (-candidate[0], candidate[1], candidate[2]))
+
+    # the two best scores of every record, to tell a clear best candidate from a close call
+    time_card_scores = {}
+    check_copy_scores = {}
+    for score, time_card_index, check_copy_index in candidates:
+        for scores, index in ((time_card_scores, time_card_index), (check_copy_scores, check_copy_index)):
+            if len(scores.setdefault(index, [])) < 2:
+                scores[index].append(score)
+
+    near_matches = []
+    paired_time_cards = set()
+    paired_check_copies = set()
+    for score, time_card_index, check_copy_index in candidates:
+        if time_card_index in paired_time_cards or check_copy_index in paired_check_copies:
+            continue
+        paired_time_cards.add(time_card_index)
+        paired_check_copies.add(check_copy_index)
+        runner_up_score = max(
+            time_card_scores[time_card_index][1:] + check_copy_scores[check_copy_index][1:], default=0
+        )
+        near_matches.append(NearMatch(
+            time_cards[time_card_index],
+            check_copies[check_copy_index],
+            round(score, 3),
+            confident=score >= auto_merge_score and score - runner_up_score >= NEAR_MATCH_MARGIN,
+        ))
+    return near_matches
+
+
+class MatchedPair:
+    """ A time card matched to a check copy, numbered when the same payee has several checks """
+
+    __slots__ = ("time_card", "check_copy", "nth_check")
+
+    def __init__(self, time_card: TimeCardPDFPage, check_copy: CheckCopyPDFPage, nth_check: int):
+        self.time_card = time_card
+        self.check_copy = check_copy
+        self.nth_check = nth_check
+
+    @property
+    def merged_output_name(self) -> str:
+        return self.check_copy.merged_output_name(nth_check=self.nth_check)
+
+
+class MatchResult:
+    """ Structured result of matching, the input lists are left untouched """
+
+    def __init__(
+            self,
+            matched_pairs: list,
+            unmatched_time_cards: list,
+            unmatched_check_copies: list,
+            near_matches: list = None,
+    ):
+        self.matched_pairs = matched_pairs
+        self.unmatched_time_cards = unmatched_time_cards
+        self.unmatched_check_copies = unmatched_check_copies
+        # NearMatch list of the leftovers, merged ones are in matched_pairs too
+        self.near_matches = near_matches or []
+
+
+class MatchingEngine:
+    """
+    Matches time cards to check copies on (last, first, month, day, year, invoice) using hash indexes
+
+    Records can be added in any order.  Each time card matches at most one check copy, and each check copy
+    at most one time card, in the order they were added.  Several checks for the same payee are numbered
+    1, 2, 3... in match order for `merged_output_name(nth_check=...)`.
+    """
+
+    def __init__(self, keep_matched_pairs: bool = True):
+        """
+        :param keep_matched_pairs: keep every MatchedPair for `result`, streaming callers that handle each
+            pair as it is returned can turn this off to hold only unmatched records
+        """
+        self.keep_matched_pairs = keep_matched_pairs
+        self.matched_pairs = []
+        self._unmatched_time_cards = {}
+        self._unmatched_check_copies = {}
+        self._payee_name_counter = {}
+        self._added_count = 0
+        self.near_matches = []
+
+    @classmethod
+    def match(
+            cls,
+            time_cards: list,
+            check_copies: list,
+            near_matches: bool = False,
+            merge_near_matches: bool = False,
+    ) -> MatchResult:
+        """
+        Matches complete lists, time cards are matched in list order to the first equal check copy
+
+        :param time_cards: TimeCardPDFPage list
+        :param check_copies: CheckCopyPDFPage list
+        :param near_matches: look for near matches among the leftovers, see `match_near_misses`
+        :param merge_near_matches: pair confident near matches
+        :return:
+        """
+        engine = cls()
+        for check_copy in check_copies:
+            engine.add_check_copy(check_copy)
+        for time_card in time_cards:
+            engine.add_time_card(time_card)
+        if near_matches:
+            engine.match_near_misses(merge_near_matches)
+        return engine.result()
+
+    def add_time_card(self, time_card: TimeCardPDFPage):
+        """
+        :param time_card:
+        :return: the new MatchedPair, or None if no check copy is waiting for this time card
+        """
+        key = time_card.match_key
+        check_copy = self._take(self._unmatched_check_copies, key)
+        if check_copy is None:
+            self._put(self._unmatched_time_cards, key, time_card)
+            return None
+        return self._pair(time_card, check_copy)
+
+    def add_check_copy(self, check_copy: CheckCopyPDFPage):
+        """
+        :param check_copy:
+        :return: the new MatchedPair, or None if no time card is waiting for this check copy
+        """
+        key = check_copy.match_key
+        time_card = self._take(self._unmatched_time_cards, key)
+        if time_card is None:
+            self._put(self._unmatched_check_copies, key, check_copy)
+            return None
+        return self._pair(time_card, check_copy)
+
+    def match_near_misses(self, merge: bool = False) -> list:
+        """
+        Second phase for the records left unmatched, see `find_near_matches`
+
+        :param merge: pair the confident near matches, they are then no longer unmatched
+        :return: NearMatch list, merged ones have their MatchedPair as `pair`
+        """
+        self.near_matches = find_near_matches(
+            self._remaining(self._unmatched_time_cards), self._remaining(self._unmatched_check_copies)
+        )
+        if merge:
+            for near_match in self.near_matches:
+                if near_match.confident:
+                    self._remove(self._unmatched_time_cards, near_match.time_card.match_key, near_match.time_card)
+                    self._remove(self._unmatched_check_copies, near_match.check_copy.match_key, near_match.check_copy)
+                    # numbered by the check's name, which the merged file is named after
+                    near_match.pair = self._pair(
+                        near_match.time_card,
+                        near_match.check_copy,
+                        f"{near_match.check_copy.payee_last_name},{near_match.check_copy.payee_first_name}",
+                    )
+        return self.near_matches
+
+    def result(self) -> MatchResult:
+        return MatchResult(
+            matched_pairs=list(self.matched_pairs),
+            unmatched_time_cards=self._remaining(self._unmatched_time_cards),
+            unmatched_check_copies=self._remaining(self._unmatched_check_copies),
+            near_matches=list(self.near_matches),
+        )
+
+    def _pair(self, time_card: TimeCardPDFPage, check_copy: CheckCopyPDFPage, name_key: str = None) -> MatchedPair:
+        # increment name counter so we can number multiple checks by the same person
+        name_key = name_key or f"{time_card.last_name},{time_card.first_name}"
+        self._payee_name_counter[name_key] = self._payee_name_counter.get(name_key, 0) + 1
+        pair = MatchedPair(time_card, check_copy, nth_check=self._payee_name_counter[name_key])
+        if self.keep_matched_pairs:
+            self.matched_pairs.append(pair)
+        return pair
+
+    def _put(self, index: dict, key: tuple, record):
+        # records keep their arrival number so unmatched lists come back in the order they were added
+        index.setdefault(key, deque()).append((self._added_count, record))
+        self._added_count += 1
+
+    @staticmethod
+    def _take(index: dict, key: tuple):
+        waiting = index.get(key)
+        if not waiting:
+            return None
+        _, record = waiting.popleft()
+        if not waiting:
+            del index[key]
+        return record
+
+    @staticmethod
+    def _remove(index: dict, key: tuple, record):
+        waiting = index[key]
+        for entry in waiting:
+            if entry[1] is record:
+                waiting.remove(entry)
+                break
+        if not waiting:
+            del index[key]
+
+    @staticmethod
+    def _remaining(index: dict) -> list:
+        remaining = [entry for waiting in index.values() for entry in waiting]
+        return [record for _, record in sorted(remaining, key=lambda entry: entry[0])]
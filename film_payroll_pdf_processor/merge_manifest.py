@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import re
+
+# Kept in the production's outbox, next to the final folder it describes
+MERGE_MANIFEST_FILENAME = '.merge_manifest.json'
+
+# PDFBox gives every file it saves a new document /ID, which isn't part of a page's content
+DOCUMENT_ID_PATTERN = re.compile(rb"/ID\s*\[\s*<[0-9A-Fa-f\s]*>\s*<[0-9A-Fa-f\s]*>\s*\]")
+
+
+def hash_pdf_content(pdf_bytes: bytes) -> str:
+    """
+    :param pdf_bytes:
+    :return: sha256 hex digest of a pdf without its document /ID, so the same page written again hashes the same
+    """
+    return hashlib.sha256(DOCUMENT_ID_PATTERN.sub(b"/ID []", pdf_bytes)).hexdigest()
+
+
+def read_file_if_exists(filepath: str):
+    """
+    :param filepath:
+    :return: the bytes of the file, None if it doesn't exist
+    """
+    if not os.path.exists(filepath):
+        return None
+    with open(filepath, 'rb') as pdf_file:
+        return pdf_file.read()
+
+
+def remove_file_if_exists(filepath: str):
+    if os.path.exists(filepath):
+        os.remove(filepath)
+
+
+class MergeManifest:
+    """
+    Persistent record of the merged files in a final folder and the inputs each was merged from
+
+    Each merged output name maps to the output names and content hashes of its time card and check copy
+    and its nth check number.  A pair whose entry matches is already merged and is skipped, and merged
+    files whose time card or check copy was processed again and is now in another pair, or none, are
+    removed with `remove_stale`.  Merges of other weeks in the same outbox are kept.
+
+    Usage:
+        manifest = MergeManifest(os.path.join(outbox_folder_path, MERGE_MANIFEST_FILENAME))
+        entry = manifest.entry(time_card_path, check_copy_path, nth_check)
+        if not manifest.is_current(merged_output_name, entry, merged_filepath):
+            ...
+            manifest.record(merged_output_name, entry)
+        manifest.save()
+    """
+
+    def __init__(self, manifest_path: str):
+        self.manifest_path = manifest_path
+        # merged output name -> entry
+        self.merged = self._load()
+
+    def _load(self) -> dict:
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path) as manifest_file:
+                    return json.load(manifest_file)["merged"]
+            except (ValueError, KeyError):
+                # unreadable, every pair is merged again
+                pass
+        return {}
+
+    @staticmethod
+    def entry(time_card_path: str, check_copy_path: str, nth_check: int, read_file=read_file_if_exists) -> dict:
+        """
+        :param time_card_path: the outbox time card
+        :param check_copy_path: the outbox check copy
+        :param nth_check:
+        :param read_file: function returning the bytes of an outbox file, None if it doesn't exist
+        :return: what a merged file is made from, hashes are None for inputs that don't exist
+        """
+        time_card_bytes = read_file(time_card_path)
+        check_copy_bytes = read_file(check_copy_path)
+        return {
+            "time_card": os.path.basename(time_card_path),
+            "time_card_hash": hash_pdf_content(time_card_bytes) if time_card_bytes is not None else None,
+            "check_copy": os.path.basename(check_copy_path),
+            "check_copy_hash": hash_pdf_content(check_copy_bytes) if check_copy_bytes is not None else None,
+            "nth_check": nth_check,
+        }
+
+    def is_current(
+            self,
+            merged_output_name: str,
+            entry: dict,
+            merged_filepath: str,
+            file_exists=os.path.exists,
+    ) -> bool:
+        """
+        :param file_exists: function telling whether an outbox file exists
+        :return: True if the merged file exists and was merged from the same inputs
+        """
+        return (
+            entry["time_card_hash"] is not None and
+            entry["check_copy_hash"] is not None and
+            self.merged.get(merged_output_name) == entry and
+            file_exists(merged_filepath)
+        )
+
+    def record(self, merged_output_name: str, entry: dict):
+        self.merged[merged_output_name] = entry
+
+    def remove_stale(
+            self,
+            merged_output_names,
+            time_card_names,
+            check_copy_names,
+            merge_folder_path: str,
+            remove_file=remove_file_if_exists,
+    ) -> list:
+        """
+        Removes the merged files, and their entries, that aren't among the current pairs although their time
+        card or check copy was processed, so only pairings the current records changed are removed
+
+        :param merged_output_names: merged output names of every current pair
+        :param time_card_names: output names of the time cards that were processed
+        :param check_copy_names: output names of the check copies that were processed
+        :param merge_folder_path: the final folder
+        :param remove_file: function removing an outbox file
+        :return: the removed output names
+        """
+        current = set(merged_output_names)
+        time_card_names = set(time_card_names)
+        check_copy_names = set(check_copy_names)
+        stale = sorted(
+            merged_output_name
+            for merged_output_name, entry in self.merged.items()
+            if merged_output_name not in current and (
+                entry["time_card"] in time_card_names or entry["check_copy"] in check_copy_names
+            )
+        )
+        for merged_output_name in stale:
+            remove_file(os.path.join(merge_folder_path, merged_output_name))
+            del self.merged[merged_output_name]
+        return stale
+
+    def save(self):
+        # write then rename so a crash never leaves a half written manifest
+        os.makedirs(os.path.dirname(os.path.abspath(self.manifest_path)), exist_ok=True)
+        partial_path = self.manifest_path + ".partial"
+        with open(partial_path, "w") as manifest_file:
+            json.dump({"merged": self.merged}, manifest_file, indent=1, sort_keys=True)
+        os.replace(partial_path, self.manifest_path)
@@ -0,0 +1,368 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import warnings
+import zipfile
+
+# Archive modes
+ARCHIVE_PER_WEEK = "week"
+ARCHIVE_PER_FOLDER = "folder"
+ARCHIVE_MODES = (ARCHIVE_PER_WEEK, ARCHIVE_PER_FOLDER)
+
+# Last entry of every archive, each entry's name, size and CRC
+ARCHIVE_INDEX_NAME = "index.json"
+# Example: WE_031321_EYM788_TEAMSTERS.pdf -> WE_031321
+WEEK_PATTERN = re.compile(r"^(WE_\d+)_")
+
+
+def week_name(inbox_folder_path: str) -> str:
+    """
+    :param inbox_folder_path:
+    :return: the week ending of the inbox's time card files, e.g. WE_031321, "outbox" if there are none
+    """
+    weeks = sorted({
+        match.group(1)
+        for match in (WEEK_PATTERN.match(filename) for filename in os.listdir(inbox_folder_path))
+        if match
+    })
+    return "-".join(weeks) if weeks else "outbox"
+
+
+class OutboxArchive:
+    """
+    Streams the outbox pdfs of a run into ZIP archives as they are written, one for the week or one per
+    outbox folder, instead of leaving thousands of loose files in the outbox
+
+    Outbox paths in the staging folder on the processing disk name archive entries, e.g. the staged
+    final/X.pdf is the entry final/X.pdf.  Pages of a backend with IN_MEMORY_PAGES are written straight
+    into the archive with `write`.  Files written by PDFBox, or by --jobs worker processes, are staged and
+    added with `add_files` or `sync`, and kept for PDFBox to merge until the archives are finished.
+
+    Entries of the previous archive that the run doesn't write again are carried into the new one, as loose
+    outbox files are kept between runs, so pairs merged before from the same inputs are skipped, see
+    MergeManifest.  A file written again replaces the earlier entry.  Archives are written under a
+    temporary name and renamed into the outbox once complete, with ARCHIVE_INDEX_NAME as the last entry.
+    The archive of an interrupted run is kept under the temporary name and carried into the resumed run's.
+
+    Usage:
+        archive = OutboxArchive(outbox_folder_path, processing_folder_path, "WE_031321", folders)
+        archive.open()
+        ...
+        archive.write(staged_filepath, pdf_bytes)
+        archive.add_files([staged_filepath])
+        ...
+        archive.close()
+    """
+
+    def __init__(
+            self,
+            outbox_folder_path: str,
+            processing_folder_path: str,
+            archive_name: str,
+            folders: tuple,
+            per_folder: bool = False,
+    ):
+        """
+        :param outbox_folder_path: where the archives are written
+        :param processing_folder_path: where the staging folder is made
+        :param archive_name: name of the week's archive, the prefix of each folder's archive
+        :param folders: outbox folders that are archived
+        :param per_folder: one archive per folder instead of one for the week
+        """
+        self.outbox_folder_path = outbox_folder_path
+        self.archive_name = archive_name
+        self.folders = tuple(folders)
+        self.per_folder = per_folder
+        # the same outbox always stages in the same folder, so a resumed run finds what it staged
+        outbox_key = hashlib.sha256(os.path.abspath(outbox_folder_path).encode("utf-8")).hexdigest()[:12]
+        self.staging_folder_path = os.path.join(processing_folder_path, f"outbox-staging-{outbox_key}")
+        self._owner_pid = None
+        # archive path -> ZipFile being written
+        self._zip_files = {}
+        # archive path -> ZipFile of the previous archive
+        self._previous_zip_files = {}
+        # entry name -> (size, modification time) of the staged file when it was added, None if written
+        self._added = {}
+        # entry names added more than once
+        self._replaced = set()
+        # entry names removed, e.g. merged files whose pairing changed
+        self._removed = set()
+
+    def __getstate__(self):
+        # worker processes get the paths, not the open archives
+        state = dict(self.__dict__)
+        state["_zip_files"] = {}
+        state["_previous_zip_files"] = {}
+        return state
+
+    def archive_path(self, folder: str) -> str:
+        """
+        :param folder:
+        :return: the archive the folder's files go in
+        """
+        if self.per_folder:
+            return os.path.join(self.outbox_folder_path, f"{self.archive_name}_{folder}.zip")
+        return os.path.join(self.outbox_folder_path, f"{self.archive_name}.zip")
+
+    @property
+    def archive_paths(self) -> list:
+        return sorted({self.archive_path(folder) for folder in self.folders})
+
+    def entry_name(self, filepath: str):
+        """
+        :param filepath: an outbox path in the staging folder
+        :return: the archive entry of the path, None for paths the archive doesn't hold, e.g. pending names
+        """
+        entry_name = os.path.relpath(filepath, self.staging_folder_path).replace(os.sep, "/")
+        parts = entry_name.split("/")
+        if len(parts) == 2 and parts[0] in self.folders:
+            return entry_name
+        return None
+
+    def archives(self, filepath: str) -> bool:
+        """
+        :param filepath:
+        :return: True if the file can be written straight into the archive, only in the process that opened it
+        """
+        return os.getpid() == self._owner_pid and self.entry_name(filepath) is not None
+
+    def open(self):
+        self._owner_pid = os.getpid()
+        for folder in self.folders:
+            os.makedirs(os.path.join(self.staging_folder_path, folder), exist_ok=True)
+        os.makedirs(self.outbox_folder_path, exist_ok=True)
+        for archive_path in self.archive_paths:
+            previous_zip_file = self._open_previous_archive(archive_path)
+            if previous_zip_file is not None:
+                self._previous_zip_files[archive_path] = previous_zip_file
+            self._zip_files[archive_path] = zipfile.ZipFile(archive_path + ".partial", "w", zipfile.ZIP_DEFLATED)
+
+    @staticmethod
+    def _open_previous_archive(archive_path: str):
+        """
+        :param archive_path:
+        :return: ZipFile of the interrupted run's archive, which has the entries it carried, else of the last
+            finished archive, None if there is neither
+        """
+        partial_path = archive_path + ".partial"
+        resumed_path = archive_path + ".resumed"
+        if os.path.exists(partial_path):
+            try:
+                zipfile.ZipFile(partial_path).close()
+                os.replace(partial_path, resumed_path)
+            except zipfile.BadZipFile:
+                # killed before the archive was closed
+                os.remove(partial_path)
+        for previous_path in (resumed_path, archive_path):
+            if os.path.exists(previous_path):
+                try:
+                    return zipfile.ZipFile(previous_path)
+                except zipfile.BadZipFile:
+                    pass
+        return None
+
+    def _previous_entry(self, entry_name: str):
+        previous_zip_file = self._previous_zip_files.get(self.archive_path(entry_name.split("/")[0]))
+        if previous_zip_file is None:
+            return None
+        try:
+            return previous_zip_file.getinfo(entry_name)
+        except KeyError:
+            return None
+
+    def exists(self, filepath: str) -> bool:
+        """
+        :param filepath: an outbox path in the staging folder
+        :return: True if the file is staged, in the archive or carried from the previous archive
+        """
+        if os.path.exists(filepath):
+            return True
+        entry_name = self.entry_name(filepath)
+        if os.getpid() != self._owner_pid or entry_name is None or entry_name in self._removed:
+            return False
+        return entry_name in self._added or self._previous_entry(entry_name) is not None
+
+    def read(self, filepath: str):
+        """
+        :param filepath: an outbox path in the staging folder
+        :return: the bytes of the staged file or archive entry, None if it doesn't exist
+        """
+        if not self.exists(filepath):
+            return None
+        if os.path.exists(filepath):
+            with open(filepath, "rb") as staged_file:
+                return staged_file.read()
+        entry_name = self.entry_name(filepath)
+        archive_path = self.archive_path(entry_name.split("/")[0])
+        if entry_name in self._added:
+            return self._zip_files[archive_path].read(entry_name)
+        return self._previous_zip_files[archive_path].read(entry_name)
+
+    def size(self, filepath: str) -> int:
+        """
+        :param filepath:
+        :return: the size of the staged file or archive entry, 0 if it doesn't exist
+        """
+        if os.path.exists(filepath):
+            return os.path.getsize(filepath)
+        entry_name = self.entry_name(filepath)
+        if not self.exists(filepath):
+            return 0
+        if entry_name in self._added:
+            return self._zip_files[self.archive_path(entry_name.split("/")[0])].getinfo(entry_name).file_size
+        return self._previous_entry(entry_name).file_size
+
+    def extract(self, filepath: str):
+        """
+        Stages an archive entry that isn't staged, for a backend that only reads files
+
+        :param filepath:
+        :return:
+        """
+        if not os.path.exists(filepath) and self.exists(filepath):
+            pdf_bytes = self.read(filepath)
+            with open(filepath, "wb") as staged_file:
+                staged_file.write(pdf_bytes)
+
+    def write(self, filepath: str, pdf_bytes: bytes):
+        """
+        Writes a file straight into its archive, without staging it
+
+        :param filepath: an outbox path in the staging folder
+        :param pdf_bytes:
+        :return:
+        """
+        entry_name = self.entry_name(filepath)
+        # a file staged before, e.g. by a worker process, is replaced
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        self._mark_added(entry_name, None)
+        with warnings.catch_warnings():
+            # replaced entries are dropped when the archive is finished
+            warnings.simplefilter("ignore", UserWarning)
+            with self._zip_files[self.archive_path(entry_name.split("/")[0])].open(entry_name, "w") as entry_file:
+                entry_file.write(pdf_bytes)
+
+    def remove(self, filepath: str):
+        """
+        Removes a staged file and its archive entry
+
+        :param filepath: an outbox path in the staging folder
+        :return:
+        """
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        entry_name = self.entry_name(filepath)
+        if entry_name is not None:
+            self._removed.add(entry_name)
+
+    def add_files(self, staged_filepaths):
+        """
+        Adds staged files to their archive, files outside the staging folder are left alone
+
+        :param staged_filepaths:
+        :return:
+        """
+        if os.getpid() != self._owner_pid:
+            return
+        for staged_filepath in staged_filepaths:
+            entry_name = self.entry_name(staged_filepath)
+            if entry_name is not None and os.path.exists(staged_filepath):
+                self._add(entry_name, staged_filepath)
+
+    def sync(self):
+        """ Adds staged files that are new or changed since they were added, e.g. ones written by worker processes """
+        for folder in self.folders:
+            for staged_file in sorted(os.scandir(os.path.join(self.staging_folder_path, folder)), key=lambda f: f.name):
+                if staged_file.is_file() and not staged_file.name.endswith(".partial"):
+                    stat = staged_file.stat()
+                    entry_name = f"{folder}/{staged_file.name}"
+                    if self._added.get(entry_name) != (stat.st_size, stat.st_mtime_ns):
+                        self._add(entry_name, staged_file.path)
+
+    def _add(self, entry_name: str, staged_filepath: str):
+        stat = os.stat(staged_filepath)
+        self._mark_added(entry_name, (stat.st_size, stat.st_mtime_ns))
+        with warnings.catch_warnings():
+            # replaced entries are dropped when the archive is finished
+            warnings.simplefilter("ignore", UserWarning)
+            self._zip_files[self.archive_path(entry_name.split("/")[0])].write(staged_filepath, entry_name)
+
+    def _mark_added(self, entry_name: str, staged_stat):
+        if entry_name in self._added:
+            self._replaced.add(entry_name)
+        self._added[entry_name] = staged_stat
+        self._removed.discard(entry_name)
+
+    def _carry_previous_entries(self, archive_path: str, zip_file: zipfile.ZipFile):
+        # entries of the previous archive that weren't written again or removed
+        previous_zip_file = self._previous_zip_files.get(archive_path)
+        if previous_zip_file is None:
+            return
+        last_entries = {info.filename: info for info in previous_zip_file.infolist()}
+        last_entries.pop(ARCHIVE_INDEX_NAME, None)
+        for entry_name, info in last_entries.items():
+            if entry_name not in self._added and entry_name not in self._removed:
+                zip_file.writestr(info, previous_zip_file.read(info), compress_type=info.compress_type)
+                self._added[entry_name] = None
+
+    def _close_previous_archives(self):
+        for previous_zip_file in self._previous_zip_files.values():
+            previous_zip_file.close()
+        self._previous_zip_files = {}
+
+    def close(self) -> list:
+        """
+        Adds what is left in the staging folder and the previous archives' entries, writes each archive's
+        index, moves the archives into the outbox and removes the staging folder
+
+        :return: the archive paths
+        """
+        self.sync()
+        for archive_path, zip_file in sorted(self._zip_files.items()):
+            self._carry_previous_entries(archive_path, zip_file)
+            zip_file.close()
+            partial_path = archive_path + ".partial"
+            if self._replaced or self._removed:
+                self._drop_replaced_entries(partial_path, self._removed)
+            with zipfile.ZipFile(partial_path, "a") as zip_file:
+                index = [
+                    {"name": info.filename, "size": info.file_size, "crc32": info.CRC}
+                    for info in zip_file.infolist()
+                ]
+                zip_file.writestr(ARCHIVE_INDEX_NAME, json.dumps({"entries": index}, indent=1))
+            os.replace(partial_path, archive_path)
+        self._zip_files = {}
+        self._close_previous_archives()
+        for archive_path in self.archive_paths:
+            if os.path.exists(archive_path + ".resumed"):
+                os.remove(archive_path + ".resumed")
+        shutil.rmtree(self.staging_folder_path, ignore_errors=True)
+        return self.archive_paths
+
+    @staticmethod
+    def _drop_replaced_entries(partial_path: str, removed_entry_names: set):
+        # the last entry added for a name is the current file
+        compacted_path = partial_path + ".compacted"
+        with zipfile.ZipFile(partial_path) as source, \
+                zipfile.ZipFile(compacted_path, "w", zipfile.ZIP_DEFLATED) as target:
+            last_entries = {info.filename: info for info in source.infolist()}
+            for info in source.infolist():
+                if last_entries[info.filename] is info and info.filename not in removed_entry_names:
+                    target.writestr(info, source.read(info), compress_type=info.compress_type)
+        os.replace(compacted_path, partial_path)
+
+    def abandon(self):
+        """
+        Closes the unfinished archives of a failed run, with the previous archives' entries, for the resumed
+        run to carry, staged files are kept too
+        """
+        for archive_path, zip_file in self._zip_files.items():
+            self._carry_previous_entries(archive_path, zip_file)
+            zip_file.close()
+            if self._removed:
+                self._drop_replaced_entries(archive_path + ".partial", self._removed)
+        self._zip_files = {}
+        self._close_previous_archives()
@@ -0,0 +1,175 @@
+import os
+import sqlite3
+import time
+
+# kept in the processing folder
+OUTPUT_NAME_REGISTRY_FILENAME = 'output_names.sqlite3'
+
+
+class OutputNameRegistry:
+    """
+    Persistent SQLite registry of the outbox files written by every run and the inbox file and page each
+    came from, so two files producing the same output name can't overwrite each other
+
+    A name belongs to the first source that claims it.  Another source claiming it is a duplicate and is
+    marked until its name is free, whichever inbox file it comes from.  A name claimed before the current
+    run is free again once its outbox file is gone, and to any page of the same inbox file, so a corrected
+    file whose pages moved doesn't collide with itself.  Claims are made a write batch at a time in one
+    short transaction.  --jobs worker processes don't claim, the run's process claims the names of their
+    pages in inbox file order, see PayrollProcess.name_pending_pages, so which file keeps a name doesn't
+    depend on which worker finishes first.
+
+    Usage:
+        registry = get_output_name_registry(processing_folder_path)
+        registry.start_run()
+        ...
+        registry.claim(outbox_folder_path, "time_cards", filepath, numbered_pages, mark_duplicate, output_exists)
+    """
+
+    def __init__(self, database_path: str):
+        self.database_path = database_path
+        self.run_started = time.time()
+        self._connection = None
+        self._connection_pid = None
+
+    def __getstate__(self):
+        # worker processes open their own connection
+        state = dict(self.__dict__)
+        state["_connection"] = None
+        state["_connection_pid"] = None
+        return state
+
+    def start_run(self):
+        """ Names claimed from now on are never taken over, even before their outbox file is written """
+        self.run_started = time.time()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # --jobs worker processes each open their own connection
+        if self._connection is None or self._connection_pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.database_path)), exist_ok=True)
+            self._connection = sqlite3.connect(self.database_path, timeout=30, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS output_names ("
+                " outbox TEXT NOT NULL,"
+                " folder TEXT NOT NULL,"
+                " name TEXT NOT NULL,"
+                " source_file TEXT NOT NULL,"
+                " source_page INTEGER NOT NULL,"
+                " claimed_at REAL NOT NULL,"
+                " PRIMARY KEY (outbox, folder, name))"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS output_names_source ON output_names (outbox, folder, source_file)"
+            )
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def close(self):
+        if self._connection is not None and self._connection_pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+        self._connection_pid = None
+
+    @staticmethod
+    def _outbox_key(outbox_folder_path: str) -> str:
+        return os.path.abspath(outbox_folder_path)
+
+    def claim(
+            self,
+            outbox_folder_path: str,
+            folder: str,
+            source_filepath: str,
+            numbered_pages: list,
+            mark_duplicate,
+            output_exists,
+            overwrite: bool = False,
+    ) -> list:
+        """
+        Claims the output name of each page, marking pages whose name belongs to another source
+
+        :param outbox_folder_path:
+        :param folder: outbox folder, names are only compared within a folder
+        :param source_filepath: the inbox file the pages are from
+        :param numbered_pages: (page number, page) tuples, pages have an output_file_name
+        :param mark_duplicate: function marking a page as a duplicate, which changes its output_file_name
+        :param output_exists: function telling whether the outbox file of a name exists
+        :param overwrite: pages replace the file of a name claimed by another source instead of being marked,
+            as for REVISED time cards, the name stays with its source
+        :return: the marked pages
+        """
+        outbox = self._outbox_key(outbox_folder_path)
+        source_file = os.path.basename(source_filepath)
+        marked_pages = []
+        connection = self.connection
+        # IMMEDIATE takes the write lock up front, so two processes can't claim the same name
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for page_number, page in numbered_pages:
+                while True:
+                    row = connection.execute(
+                        "SELECT source_file, source_page, claimed_at FROM output_names"
+                        " WHERE outbox = ? AND folder = ? AND name = ?",
+                        (outbox, folder, page.output_file_name)
+                    ).fetchone()
+                    if row is None or row[:2] == (source_file, page_number) or (
+                        row[2] < self.run_started and
+                        (row[0] == source_file or not output_exists(page.output_file_name))
+                    ):
+                        connection.execute(
+                            "INSERT OR REPLACE INTO output_names"
+                            " (outbox, folder, name, source_file, source_page, claimed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                            (outbox, folder, page.output_file_name, source_file, page_number, time.time())
+                        )
+                        break
+                    if overwrite:
+                        break
+                    mark_duplicate(page)
+                    print(f'Detected duplicate of page {row[1]} of {row[0]}!  Marking file: {page.output_file_name}')
+                    if page not in marked_pages:
+                        marked_pages.append(page)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return marked_pages
+
+    def source(self, outbox_folder_path: str, folder: str, name: str):
+        """
+        :return: (inbox file name, page number) the name was claimed by, None if it's free
+        """
+        row = self.connection.execute(
+            "SELECT source_file, source_page FROM output_names WHERE outbox = ? AND folder = ? AND name = ?",
+            (self._outbox_key(outbox_folder_path), folder, name)
+        ).fetchone()
+        return tuple(row) if row is not None else None
+
+
+_output_name_registry = None
+
+
+def set_output_name_registry(registry: OutputNameRegistry) -> OutputNameRegistry:
+    """
+    Uses a registry of another process, e.g. the run's in each --jobs worker process
+
+    :param registry:
+    :return: the OutputNameRegistry
+    """
+    global _output_name_registry
+    _output_name_registry = registry
+    return _output_name_registry
+
+
+def get_output_name_registry(processing_folder_path: str) -> OutputNameRegistry:
+    """
+    :param processing_folder_path: the configured processing folder, see PayrollProcess.configure_production
+    :return: the OutputNameRegistry of this process, kept in the processing folder
+    """
+    global _output_name_registry
+    database_path = os.path.join(processing_folder_path, OUTPUT_NAME_REGISTRY_FILENAME)
+    if _output_name_registry is None or _output_name_registry.database_path != database_path:
+        if _output_name_registry is not None:
+            _output_name_registry.close()
+        _output_name_registry = OutputNameRegistry(database_path)
+    return _output_name_registry
@@ -1,43 +1,231 @@
-import hashlib
+import heapq
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from shutil import copyfile
 
-from film_payroll_pdf_processor.pdfbox_wrapper import PDFBox
-from film_payroll_pdf_processor.pdf_pages import TimeCardPDFPage, CheckCopyPDFPage
+from film_payroll_pdf_processor.extraction_cache import (
+    CHECK_COPY_LIST,
+    PAGE,
+    PDF_PAGE_TEXTS,
+    get_extraction_cache,
+    hash_file,
+    is_current_parse,
+)
+from film_payroll_pdf_processor.matching import MatchingEngine, MatchResult
+from film_payroll_pdf_processor.merge_manifest import (
+    MERGE_MANIFEST_FILENAME,
+    MergeManifest,
+    read_file_if_exists,
+    remove_file_if_exists,
+)
+from film_payroll_pdf_processor.output_name_registry import get_output_name_registry
+from film_payroll_pdf_processor.pdf_backends import get_pdf_backend
+from film_payroll_pdf_processor.pdf_pages import (
+    PARSER_VERSION,
+    TimeCardPDFPage,
+    CheckCopyPDFPage,
+    PageParseError,
+    invoice_number_from_filepath,
+)
+from film_payroll_pdf_processor.run_journal import (
+    DISCARDED_PAGE,
+    QUARANTINED_PAGE,
+    TIME_CARD_PAGE,
+    get_run_journal,
+)
+from film_payroll_pdf_processor.run_metrics import (
+    EXTRACT_TEXT,
+    FINGERPRINT,
+    MATCH,
+    MERGE,
+    PAGE_COUNT,
+    PARSE,
+    WRITE_PAGES,
+    get_run_metrics,
+)
+from film_payroll_pdf_processor.scratch_workspace import ScratchWorkspace, spill_text
 
 INBOX_FOLDER_PATH = '/home/pdfs/inbox/'
 OUTBOX_FOLDER_PATH = '/home/pdfs/outbox/'
-# PROCESSING_FOLDER_PATH = '/home/pdfs/processing/'
-PROCESSING_FOLDER_PATH = '/tmp/'
+PROCESSING_FOLDER_PATH = '/home/pdfs/processing/'
 
 OUTBOX_CHECK_COPY_FOLDER = 'check_copies'
 OUTBOX_TIME_CARD_FOLDER = 'time_cards'
 OUTBOX_MERGE_FOLDER = 'final'
+# Time card pages that couldn't be parsed, with their extracted text
+OUTBOX_QUARANTINE_FOLDER = 'quarantine'
+# Pages of an inbox file waiting for their output name, in a folder of each outbox folder, see `name_pending_pages`
+PENDING_FOLDER_PREFIX = '.pending-'
+
+TIME_CARD_FILE = "time_card"
+REVISED_TIME_CARD_FILE = "revised_time_card"
+CHECK_COPIES_FILE = "check_copies"
+IGNORED_FILE = "ignored"
+UNKNOWN_FILE = "unknown"
+
+
+def classify_inbox_file(filename: str) -> str:
+    """
+    File Type Detection for a file in the PDF Inbox
+
+    :param filename:
+    :return: one of the *_FILE constants
+    """
+    if filename.endswith(".pdf") and filename.startswith("WE_") and "REVISED" not in filename:
+        return TIME_CARD_FILE
+    elif filename.endswith(".pdf") and filename.startswith("WE_") and "REVISED" in filename:
+        return REVISED_TIME_CARD_FILE
+    elif filename.endswith(".pdf") and not filename.startswith("WE_"):
+        return CHECK_COPIES_FILE
+    elif filename.endswith(".txt") or filename == ".gitkeep" or "REVISED" in filename:
+        # Text files are picked up with their PDFs
+        # .gitkeep should be ignored
+        return IGNORED_FILE
+    return UNKNOWN_FILE
+
+
+def format_page_ranges(page_numbers: list) -> str:
+    """
+    Example:
+        [1, 2, 3, 7, 9, 10]
+        =
+        1-3, 7, 9-10
+
+    :param page_numbers: sorted page numbers
+    :return:
+    """
+    ranges = []
+    for page_number in page_numbers:
+        if ranges and ranges[-1][1] == page_number - 1:
+            ranges[-1][1] = page_number
+        else:
+            ranges.append([page_number, page_number])
+    return ", ".join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+
+def total_file_size(filepaths) -> int:
+    """ Sum of the sizes of the files that exist, for the run report """
+    return sum(os.path.getsize(filepath) for filepath in filepaths if os.path.exists(filepath))
 
 
 class PayrollProcess:
 
+    # Folders of the production being processed, see `configure_production`
+    INBOX_FOLDER_PATH = INBOX_FOLDER_PATH
+    OUTBOX_FOLDER_PATH = OUTBOX_FOLDER_PATH
+    PROCESSING_FOLDER_PATH = PROCESSING_FOLDER_PATH
+
+    # Pages of a single multi-page file are extracted concurrently in chunks when this is more than 1
+    PAGE_EXTRACTION_THREADS = 1
+    PAGE_EXTRACTION_CHUNK_SIZE = 20
+    # Classify extracted pages in page order so duplicate marking and naming match a serial run,
+    # otherwise chunks are classified as soon as they finish
+    PAGE_EXTRACTION_ORDERED = True
+    # Time card pages are written to the outbox in batches of this many pages
+    PAGE_WRITE_BATCH_SIZE = 20
+    # Merge leftover time cards and check copies whose names differ only slightly, see find_near_matches
+    MERGE_NEAR_MATCHES = False
+    # Skip merging pairs whose merged file was made from the same inputs, see MergeManifest
+    INCREMENTAL_MERGE = True
+    _merge_manifest = None
+    # Outbox pdfs are streamed into ZIP archives instead of left as loose files when set, see OutboxArchive
+    OUTBOX_ARCHIVE = None
+    # --jobs worker processes write pages under a pending name, the run's process names them in inbox file
+    # order with `name_pending_pages` so duplicate marking doesn't depend on which worker is first
+    PENDING_OUTPUT_NAMES = False
+
     @classmethod
-    def _copy_to_temp_file(cls, original_filepath: str):
+    def configure_production(
+            cls,
+            inbox_folder_path: str = None,
+            outbox_folder_path: str = None,
+            production_code: str = None,
+            processing_folder_path: str = None,
+    ):
         """
-        Creates a temporary
+        Points processing at another production's folders, settings left as None are unchanged
 
-        :param original_filepath:
-        :return hash_string, full_path: a tuple with the hashed filename and the full path to the newly created filename
+        :param inbox_folder_path:
+        :param outbox_folder_path: where the check_copies, time_cards and final folders are
+        :param production_code: prefix of merged file names, e.g. LLS2
+        :param processing_folder_path: where scratch workspaces are made and state is kept between runs, e.g.
+            the watch manifest and output name registry
+        :return:
+        """
+        if inbox_folder_path is not None:
+            cls.INBOX_FOLDER_PATH = inbox_folder_path
+        if outbox_folder_path is not None:
+            cls.OUTBOX_FOLDER_PATH = outbox_folder_path
+        if production_code is not None:
+            CheckCopyPDFPage.PRODUCTION_CODE = production_code
+        if processing_folder_path is not None:
+            cls.PROCESSING_FOLDER_PATH = processing_folder_path
+
+    @classmethod
+    def create_outbox_folders(cls):
+        """ Creates the check_copies, time_cards and final folders of a new production's outbox """
+        for folder in (OUTBOX_CHECK_COPY_FOLDER, OUTBOX_TIME_CARD_FOLDER, OUTBOX_MERGE_FOLDER):
+            os.makedirs(cls.outbox_filepath(folder), exist_ok=True)
+
+    @classmethod
+    def outbox_filepath(cls, *path_parts: str) -> str:
+        """
+        :param path_parts: outbox folder and file name
+        :return: where the file is written, the archive's staging folder when the outbox is archived
+        """
+        if cls.OUTBOX_ARCHIVE is not None:
+            return os.path.join(cls.OUTBOX_ARCHIVE.staging_folder_path, *path_parts)
+        return os.path.join(cls.OUTBOX_FOLDER_PATH, *path_parts)
+
+    @classmethod
+    def outbox_file_exists(cls, filepath: str) -> bool:
+        """
+        :param filepath: an `outbox_filepath`
+        :return: True if the file is in the outbox, or in the outbox archive when it is archived
+        """
+        if cls.OUTBOX_ARCHIVE is not None:
+            return cls.OUTBOX_ARCHIVE.exists(filepath)
+        return os.path.exists(filepath)
+
+    @classmethod
+    def read_outbox_file(cls, filepath: str):
         """
-        hash_string = hashlib.md5(original_filepath.encode('utf-8')).hexdigest()
-        temp_name = f"{hash_string}.pdf"
-        full_path = os.path.join(PROCESSING_FOLDER_PATH, temp_name)
+        :param filepath: an `outbox_filepath`
+        :return: the bytes of the outbox file, None if it doesn't exist
+        """
+        if cls.OUTBOX_ARCHIVE is not None:
+            return cls.OUTBOX_ARCHIVE.read(filepath)
+        return read_file_if_exists(filepath)
+
+    @classmethod
+    def remove_outbox_file(cls, filepath: str):
+        if cls.OUTBOX_ARCHIVE is not None:
+            cls.OUTBOX_ARCHIVE.remove(filepath)
+        else:
+            remove_file_if_exists(filepath)
 
-        # copy file to temp directory for processing
-        copyfile(original_filepath, full_path)
-        return hash_string, full_path
+    @classmethod
+    def outbox_files_size(cls, filepaths) -> int:
+        """ Sum of the sizes of the outbox files that exist, for the run report """
+        if cls.OUTBOX_ARCHIVE is not None:
+            return sum(cls.OUTBOX_ARCHIVE.size(filepath) for filepath in filepaths)
+        return total_file_size(filepaths)
+
+    @classmethod
+    def production_settings(cls) -> tuple:
+        """ (inbox, outbox, production code, processing folder), the arguments of `configure_production` """
+        return (
+            cls.INBOX_FOLDER_PATH,
+            cls.OUTBOX_FOLDER_PATH,
+            CheckCopyPDFPage.PRODUCTION_CODE,
+            cls.PROCESSING_FOLDER_PATH,
+        )
 
     @classmethod
-    def _read_check_copy_list(cls, check_copy_list_path: str) -> list:
+    def read_check_copy_list(cls, check_copy_list_path: str) -> list:
         """
-        Parses a list of checks in a check copy package
+        Parses a list of checks in a check copy package, also used to plan a run
 
         Example:
             Date:04/03/2021
@@ -46,8 +234,15 @@ class PayrollProcess:
             13,PINCKLEY,DENISE,EYM788
 
         :param check_copy_list_path:
-        :return:
+        :return: a CheckCopyPDFPage for every listed check
         """
+        cache = get_extraction_cache(cls.PROCESSING_FOLDER_PATH)
+        if cache is not None:
+            list_hash = hash_file(check_copy_list_path)
+            cached_list = cache.get(CHECK_COPY_LIST, list_hash)
+            if is_current_parse(cached_list, PARSER_VERSION):
+                return [CheckCopyPDFPage(**fields) for fields in cached_list["check_copies"]]
+
         check_copy_list = []
         month = ""
         day = ""
@@ -83,18 +278,211 @@ class PayrollProcess:
                         invoice_number=invoice,
                     )
                     check_copy_list.append(check_copy)
+
+        if cache is not None:
+            cache.put(CHECK_COPY_LIST, list_hash, {
+                "parser_version": PARSER_VERSION,
+                "check_copies": [check_copy.list_fields for check_copy in check_copy_list],
+            })
         return check_copy_list
 
     @classmethod
-    def _cleanup_temp_files(cls, hash_string):
-        """ Cleanup the original and split files in the processing directory based on original temp name hash"""
-        cleanup_list = []
-        for filename in os.listdir(PROCESSING_FOLDER_PATH):
-            if filename.startswith(hash_string):
-                process_page_path = os.path.join(PROCESSING_FOLDER_PATH, filename)
-                cleanup_list.append(process_page_path)
-        for file_path in cleanup_list:
-            os.remove(file_path)
+    def _iter_page_texts(cls, filepath: str, page_numbers: list = None):
+        """
+        Extracts the text of pages of a pdf, concurrently in chunks when PAGE_EXTRACTION_THREADS > 1
+
+        :param filepath:
+        :param page_numbers: sorted 1-based page numbers to extract, defaults to every page
+        :return: a generator of (page_number, text) tuples, in page order if PAGE_EXTRACTION_ORDERED
+        """
+        if page_numbers is None and cls.PAGE_EXTRACTION_THREADS <= 1:
+            yield from enumerate(cls._extract_page_texts(filepath), start=1)
+            return
+        if page_numbers is None:
+            with get_run_metrics().measure(PAGE_COUNT):
+                page_numbers = range(1, get_pdf_backend().get_page_count(filepath) + 1)
+
+        # group the pages into contiguous page ranges of at most PAGE_EXTRACTION_CHUNK_SIZE pages
+        chunk_size = max(1, cls.PAGE_EXTRACTION_CHUNK_SIZE)
+        chunks = []
+        for page_number in page_numbers:
+            if chunks and chunks[-1][1] == page_number - 1 and page_number - chunks[-1][0] < chunk_size:
+                chunks[-1][1] = page_number
+            else:
+                chunks.append([page_number, page_number])
+
+        if cls.PAGE_EXTRACTION_THREADS <= 1:
+            for start_page, end_page in chunks:
+                yield from enumerate(cls._extract_page_texts(filepath, start_page, end_page), start=start_page)
+            return
+
+        with ThreadPoolExecutor(max_workers=cls.PAGE_EXTRACTION_THREADS) as executor:
+            chunk_start_pages = {}
+            for start_page, end_page in chunks:
+                future = executor.submit(cls._extract_page_texts, filepath, start_page, end_page)
+                chunk_start_pages[future] = start_page
+            if cls.PAGE_EXTRACTION_ORDERED:
+                finished_chunks = list(chunk_start_pages)
+            else:
+                finished_chunks = as_completed(chunk_start_pages)
+            for future in finished_chunks:
+                yield from enumerate(future.result(), start=chunk_start_pages[future])
+
+    @classmethod
+    def _extract_page_texts(cls, filepath: str, start_page: int = 1, end_page: int = None) -> list:
+        """ Calls the backend's get_page_texts, measured for the run report """
+        with get_run_metrics().measure(EXTRACT_TEXT) as measurement:
+            page_texts = get_pdf_backend().get_page_texts(filepath, start_page, end_page)
+            measurement.pages = len(page_texts)
+            measurement.bytes_moved = sum(len(page_text.encode('utf-8')) for page_text in page_texts)
+        return page_texts
+
+    @classmethod
+    def _iter_time_card_pages(cls, filepath: str, original_filepath: str, skip_page_numbers=frozenset()):
+        """
+        Extracts and parses every page of a time card pdf, reusing the extraction cache for unchanged content
+
+        A whole pdf that was seen before is served from the cache without calling the backend.  Otherwise
+        page fingerprints, if the backend provides them, let unchanged pages skip text extraction.  Cached
+        pages parsed by an earlier PARSER_VERSION are parsed again from their cached text.  With the cache
+        on, pages are always returned in page order.
+
+        :param filepath: the pdf to read
+        :param original_filepath: the inbox filepath, used for the invoice number
+        :param skip_page_numbers: pages that are neither extracted nor returned, e.g. ones in the run journal
+        :return: a generator of (page_number, TimeCardPDFPage) tuples
+        """
+        cache = get_extraction_cache(cls.PROCESSING_FOLDER_PATH)
+        if cache is None:
+            page_numbers = cls._page_numbers_except(filepath, skip_page_numbers)
+            for page_number, text in cls._iter_page_texts(filepath, page_numbers):
+                yield page_number, cls._time_card_page(filepath, text, original_filepath, page_number)
+            return
+
+        file_hash = hash_file(filepath)
+        page_entries = cache.get(PDF_PAGE_TEXTS, file_hash)
+        if page_entries is not None:
+            print(f" - Unchanged file, using {len(page_entries)} cached pages")
+            stale_page_numbers = [
+                page_number
+                for page_number, page_entry in enumerate(page_entries, start=1)
+                if not is_current_parse(page_entry, PARSER_VERSION)
+            ]
+            if stale_page_numbers:
+                print(f"   - {len(stale_page_numbers)} cached pages were parsed by an earlier parser, parsing again")
+                for page_number in stale_page_numbers:
+                    page_entries[page_number - 1] = cls._page_cache_entry(
+                        page_entries[page_number - 1]["text"], original_filepath
+                    )
+                cache.put(PDF_PAGE_TEXTS, file_hash, page_entries)
+        else:
+            fingerprints = cls._page_fingerprints(filepath)
+            if fingerprints is None:
+                cached_pages = {}
+                page_texts = dict(
+                    cls._iter_page_texts(filepath, cls._page_numbers_except(filepath, skip_page_numbers))
+                )
+                fingerprints = [None] * (len(page_texts) + len(skip_page_numbers))
+            else:
+                cached_pages = cache.get_many(PAGE, fingerprints)
+                missing_page_numbers = [
+                    page_number
+                    for page_number, fingerprint in enumerate(fingerprints, start=1)
+                    if fingerprint not in cached_pages and page_number not in skip_page_numbers
+                ]
+                print(f" - {len(fingerprints) - len(missing_page_numbers)} pages unchanged since a previous run")
+                page_texts = dict(cls._iter_page_texts(filepath, missing_page_numbers))
+
+            page_entries = []
+            new_pages = {}
+            for page_number, fingerprint in enumerate(fingerprints, start=1):
+                if page_number in skip_page_numbers:
+                    page_entries.append(None)
+                    continue
+                if fingerprint in cached_pages:
+                    page_entry = cached_pages[fingerprint]
+                    if not is_current_parse(page_entry, PARSER_VERSION):
+                        page_entry = cls._page_cache_entry(page_entry["text"], original_filepath)
+                        new_pages[fingerprint] = page_entry
+                    page_entries.append(page_entry)
+                    continue
+                page_entry = cls._page_cache_entry(page_texts[page_number], original_filepath)
+                page_entries.append(page_entry)
+                if fingerprint is not None:
+                    new_pages[fingerprint] = page_entry
+            if new_pages:
+                cache.put_many(PAGE, new_pages)
+            # a pdf is only cached whole when every page was extracted
+            if not skip_page_numbers:
+                cache.put(PDF_PAGE_TEXTS, file_hash, page_entries)
+
+        for page_number, page_entry in enumerate(page_entries, start=1):
+            if page_number in skip_page_numbers:
+                continue
+            yield page_number, cls._time_card_page(
+                filepath, page_entry["text"], original_filepath, page_number, page_entry["fields"]
+            )
+
+    @staticmethod
+    def _time_card_page(
+            filepath: str,
+            text: str,
+            original_filepath: str,
+            page_number: int,
+            text_fields: dict = None,
+    ) -> TimeCardPDFPage:
+        """
+        Parses a page of a time card pdf, spilling the text of a time card page that is missing information
+        to the scratch workspace so its quarantine report doesn't extract it again
+
+        :param filepath: the pdf the page was read from, in a scratch workspace
+        :param text: the page's text
+        :param original_filepath: the inbox filepath
+        :param page_number:
+        :param text_fields: previously parsed fields of the text, see TimeCardPDFPage
+        :return:
+        """
+        page = TimeCardPDFPage(text, original_filepath, text_fields=text_fields, page_number=page_number)
+        if not page.is_end_of_batch() and not page.is_2nd_page_time_card() and page.missing_information():
+            page.page_text_path = spill_text(filepath, f"page-{page_number}.txt", text)
+        return page
+
+    @staticmethod
+    def _page_cache_entry(text: str, original_filepath: str) -> dict:
+        """
+        :param text: a time card page's text
+        :param original_filepath: the inbox filepath
+        :return: the page's extraction cache entry, its text and the fields the current parser parses from it
+        """
+        return {
+            "text": text,
+            "fields": TimeCardPDFPage(text, original_filepath).text_fields,
+            "parser_version": PARSER_VERSION,
+        }
+
+    @classmethod
+    def _page_fingerprints(cls, filepath: str):
+        """ Calls the backend's get_page_fingerprints, measured for the run report """
+        with get_run_metrics().measure(FINGERPRINT) as measurement:
+            fingerprints = get_pdf_backend().get_page_fingerprints(filepath)
+            measurement.pages = len(fingerprints or [])
+        return fingerprints
+
+    @classmethod
+    def _page_numbers_except(cls, filepath: str, skip_page_numbers):
+        """ Page numbers of the pdf not in skip_page_numbers, None meaning every page if none are skipped """
+        if not skip_page_numbers:
+            return None
+        with get_run_metrics().measure(PAGE_COUNT):
+            page_count = get_pdf_backend().get_page_count(filepath)
+        return [page_number for page_number in range(1, page_count + 1) if page_number not in skip_page_numbers]
+
+    @classmethod
+    def _outputs_exist(cls, outbox_folder: str, pages: list) -> bool:
+        return all(
+            cls.outbox_file_exists(cls.outbox_filepath(outbox_folder, page.output_file_name))
+            for page in pages
+        )
 
     @classmethod
     def process_multi_page_check_copies_package(cls, filepath: str) -> list:
@@ -104,138 +492,724 @@ class PayrollProcess:
         :param filepath:
         :return:
         """
+        return list(cls.iter_multi_page_check_copies_package(filepath))
+
+    @classmethod
+    def iter_multi_page_check_copies_package(cls, filepath: str):
+        """
+        Writes the pages named in the check copy list straight to the outbox and yields each check copy as
+        soon as its page is written, pages that aren't in the list are never extracted
+
+        A package the run journal has as finished, with its pages still in the outbox, isn't read again.
+
+        :param filepath:
+        :return: a generator of CheckCopyPDFPage, listed records without a page come last
+        """
+        journal = get_run_journal()
+        if journal is None:
+            yield from cls._iter_check_copies_package_outputs(filepath)
+            return
+
+        # a changed list changes the package's pages as much as a changed pdf
+        package_hash = hash_file(filepath)
+        check_copy_list_path = filepath.replace(".pdf", ".txt")
+        if Path(check_copy_list_path).exists():
+            package_hash += "-" + hash_file(check_copy_list_path)
+        records = journal.completed_file(filepath, package_hash)
+        if records is not None:
+            check_copies = [CheckCopyPDFPage.from_record(record) for record in records]
+            if cls._outputs_exist(OUTBOX_CHECK_COPY_FOLDER, cls._found_check_copies(check_copies)):
+                print(f" - Finished before the run was interrupted, {len(check_copies)} check copies from the run journal")
+                yield from check_copies
+                return
+
+        check_copies = []
+        for check_copy in cls._iter_check_copies_package_outputs(filepath):
+            check_copies.append(check_copy)
+            yield check_copy
+        journal.record_file(filepath, package_hash, [check_copy.record for check_copy in check_copies])
+
+    @classmethod
+    def _iter_check_copies_package_outputs(cls, filepath: str):
+        """
+        :param filepath:
+        :return: a generator of CheckCopyPDFPage, listed records without a page come last
+        """
 
         # check for list file
         unmatched_check_copies = []
         expected_check_copy_list_path = filepath.replace(".pdf", ".txt")
         if Path(expected_check_copy_list_path).exists():
-            unmatched_check_copies = cls._read_check_copy_list(expected_check_copy_list_path)
+            unmatched_check_copies = cls.read_check_copy_list(expected_check_copy_list_path)
             print(f" - Check copy list found with {len(unmatched_check_copies)}")
         else:
             print(f" - WARNING: No check list found for {filepath}, need {expected_check_copy_list_path}")
 
-        print(" - Splitting file into pages...")
-        hash_string, temp_path = cls._copy_to_temp_file(filepath)
-        PDFBox.split_pages(temp_path)
-        print(" - Finished splitting")
-
-        # print(" - Looking for split pages...")
-        duplicate_check_copy_set = set()
-        for filename in os.listdir(PROCESSING_FOLDER_PATH):
-            # PDFBox uses a filename-n.pdf naming convention by default
-            page_prefix = f"{hash_string}-"
-            if filename.startswith(page_prefix):
-                page_number = filename.replace(page_prefix, "").replace(".pdf", "")
+        with get_run_metrics().input_file(filepath), ScratchWorkspace(filepath, cls.PROCESSING_FOLDER_PATH) as workspace:
+            with get_run_metrics().measure(PAGE_COUNT):
+                page_count = get_pdf_backend().get_page_count(workspace.input_path)
+            print(f" - Package has {page_count} pages")
+
+            # Page number index of the list, the first record listing a page gets that page
+            check_copies_by_page = {}
+            for check_copy in unmatched_check_copies:
+                if check_copy.page_number.isdigit():
+                    check_copies_by_page.setdefault(int(check_copy.page_number), check_copy)
+
+            # (page number, CheckCopyPDFPage) of the pages found since the last write
+            numbered_check_copies = []
+            # pages are visited in page order
+            for page_number in sorted(check_copies_by_page):
+                if page_number < 1 or page_number > page_count:
+                    continue
                 print(f"   - Found page {page_number}")
-                filepath = os.path.join(PROCESSING_FOLDER_PATH, filename)
-                for i, check_copy in enumerate(unmatched_check_copies):
-                    if check_copy.page_number == page_number:
-                        # Check for a duplicate record that is the same name,date and invoice number and mark
-                        duplicate_check_copy_item = (
-                            check_copy.payee_first_name,
-                            check_copy.payee_last_name,
-                            check_copy.month,
-                            check_copy.day,
-                            check_copy.year,
-                            check_copy.invoice_number
-                        )
-                        if duplicate_check_copy_item in duplicate_check_copy_set:
-                            unmatched_check_copies[i].payee_first_name = check_copy.payee_first_name + "_DUPLICATE_TC"
-                            unmatched_check_copies[i].payee_last_name = check_copy.payee_last_name + "_DUPLICATE_TC"
-                            print(f'Detected duplicate!  Marking file: {check_copy.output_file_name}')
-                        else:
-                            duplicate_check_copy_set.add(duplicate_check_copy_item)
-
-                        output_filepath = os.path.join(
-                            OUTBOX_FOLDER_PATH,
-                            OUTBOX_CHECK_COPY_FOLDER,
-                            check_copy.output_file_name
-                        )
-                        copyfile(filepath, output_filepath)
-                        print(f"     - Found page record - Will be named: {output_filepath}")
-                        unmatched_check_copies[i].pdf_page_found = True
-                        break
-
-        cls._cleanup_temp_files(hash_string)
-
-        return unmatched_check_copies
+                numbered_check_copies.append((page_number, check_copies_by_page[page_number]))
+                if len(numbered_check_copies) >= cls.PAGE_WRITE_BATCH_SIZE:
+                    yield from cls._write_check_copies(workspace.input_path, filepath, numbered_check_copies)
+                    numbered_check_copies = []
+
+            yield from cls._write_check_copies(workspace.input_path, filepath, numbered_check_copies)
+
+        cls.print_check_copy_page_report(page_count, check_copies_by_page, unmatched_check_copies)
+        for check_copy in unmatched_check_copies:
+            if not check_copy.pdf_page_found:
+                yield check_copy
+
+    @classmethod
+    def _write_check_copies(cls, filepath: str, original_filepath: str, numbered_check_copies: list) -> list:
+        """
+        Claims the output names of a batch of check copies in the run's OutputNameRegistry, marking duplicates
+        of a check copy from any package, and writes the batch to the outbox
+
+        :param filepath: the package to read, in a scratch workspace
+        :param original_filepath: the inbox filepath
+        :param numbered_check_copies: (page number, CheckCopyPDFPage) tuples
+        :return: the batch's CheckCopyPDFPage, marked as found
+        """
+        if not cls.PENDING_OUTPUT_NAMES:
+            get_output_name_registry(cls.PROCESSING_FOLDER_PATH).claim(
+                cls.OUTBOX_FOLDER_PATH,
+                OUTBOX_CHECK_COPY_FOLDER,
+                original_filepath,
+                numbered_check_copies,
+                mark_duplicate=cls._mark_duplicate_check_copy,
+                output_exists=lambda name: cls.outbox_file_exists(cls.outbox_filepath(OUTBOX_CHECK_COPY_FOLDER, name)),
+            )
+        page_targets = []
+        for page_number, check_copy in numbered_check_copies:
+            output_filepath = cls._page_output_filepath(
+                OUTBOX_CHECK_COPY_FOLDER, original_filepath, page_number, check_copy.output_file_name
+            )
+            print(f"     - Found page {page_number} record - Will be named: {output_filepath}")
+            page_targets.append((page_number, output_filepath))
+        cls._write_outbox_pages(filepath, page_targets, "check copy")
+        return cls._found_check_copies([check_copy for _, check_copy in numbered_check_copies])
+
+    @staticmethod
+    def _found_check_copies(check_copies: list) -> list:
+        for check_copy in check_copies:
+            check_copy.pdf_page_found = True
+        return check_copies
+
+    @staticmethod
+    def _mark_duplicate_check_copy(check_copy: CheckCopyPDFPage):
+        check_copy.payee_first_name = check_copy.payee_first_name + "_DUPLICATE_TC"
+        check_copy.payee_last_name = check_copy.payee_last_name + "_DUPLICATE_TC"
+
+    @classmethod
+    def print_check_copy_page_report(cls, page_count: int, check_copies_by_page: dict, check_copies: list):
+        """
+        Lists the pages of a check copies package that aren't in its list and the listed pages it doesn't have
+
+        :param page_count: pages in the package
+        :param check_copies_by_page: page number to the check copy that was given that page
+        :param check_copies: every record of the list
+        :return:
+        """
+        unlisted_page_numbers = [
+            page_number for page_number in range(1, page_count + 1) if page_number not in check_copies_by_page
+        ]
+        if unlisted_page_numbers:
+            print(
+                f" - {len(unlisted_page_numbers)} pages aren't in the check copy list: "
+                f"{format_page_ranges(unlisted_page_numbers)}"
+            )
+        missing_check_copies = [check_copy for check_copy in check_copies if not check_copy.pdf_page_found]
+        if missing_check_copies:
+            print(f" - {len(missing_check_copies)} listed check copies didn't get a page:")
+            for check_copy in missing_check_copies:
+                page_owner = None
+                if check_copy.page_number.isdigit() and 1 <= int(check_copy.page_number) <= page_count:
+                    page_owner = check_copies_by_page.get(int(check_copy.page_number))
+                reason = "not in the package"
+                if page_owner is not None:
+                    reason = f"already listed for {page_owner.payee_last_name},{page_owner.payee_first_name}"
+                print(
+                    f"   - page {check_copy.page_number} {reason}: "
+                    f"{check_copy.payee_last_name},{check_copy.payee_first_name} {check_copy.invoice_number}"
+                )
 
     @classmethod
     def process_multi_page_time_card(cls, filepath: str, is_revision: bool = False) -> list:
         """
-        Splits a multi-page PDF into individual pages and then processes those pages
+        Extracts the text of every page of a multi-page PDF in one pass, classifies the pages and then
+        writes only the time card pages to the outbox
 
         :param filepath:
         :return:
         """
+        return list(cls.iter_multi_page_time_card(filepath, is_revision))
+
+    @classmethod
+    def iter_multi_page_time_card(cls, filepath: str, is_revision: bool = False):
+        """
+        Extracts and classifies the pages of a multi-page PDF, writing time card pages to the outbox in
+        batches of PAGE_WRITE_BATCH_SIZE and yielding each time card once its page is written
+
+        A file the run journal has as finished, with its pages still in the outbox, isn't read again, and
+        pages of a file the run stopped in aren't extracted again.
+
+        Pages of a revision that are the same as in the original batch for its invoice aren't extracted or
+        written again, only the time cards the revision changed are yielded.
+
+        :param filepath:
+        :param is_revision:
+        :return: a generator of TimeCardPDFPage
+        """
         original_filepath = filepath
-        hash_string, temp_path = cls._copy_to_temp_file(filepath)
-
-        # copy file to temp directory for processing
-        copyfile(filepath, temp_path)
-
-        print(" - Splitting file into pages...")
-        PDFBox.split_pages(temp_path)
-        print(" - Finished splitting")
-
-        print(" - Looking for split pages...")
-        unmatched_time_cards = []
-        duplicate_time_card_set = set()
-        for filename in os.listdir(PROCESSING_FOLDER_PATH):
-            # PDFBox uses a filename-n.pdf naming convention by default
-            page_prefix = f"{hash_string}-"
-            if filename.startswith(page_prefix):
-                page_number = filename.replace(page_prefix, "").replace(".pdf", "")
-                print(f"   - Found page {page_number}")
-                filepath = os.path.join(PROCESSING_FOLDER_PATH, filename)
-                text = PDFBox.get_pdf_text(filepath)
-                # print("--- start debugging time card text ---")
-                # print(text)
-                # print("--- end debugging time card text ---")
-                page = TimeCardPDFPage(text, original_filepath)
-                if page.is_end_of_batch():
-                    print(f"   - Detected END of BATCH page, discarding")
-                elif page.is_2nd_page_time_card():
-                    print(f"   - Detected 2nd page timecard, discarding")
-                else:
-                    page.verify_extracted_information()
+        journal = get_run_journal()
+        file_hash = None
+        if journal is not None:
+            file_hash = hash_file(filepath)
+            records = journal.completed_file(filepath, file_hash)
+            if records is not None:
+                time_cards = [TimeCardPDFPage.from_record(record) for record in records]
+                if cls._outputs_exist(OUTBOX_TIME_CARD_FOLDER, time_cards):
+                    print(f" - Finished before the run was interrupted, {len(time_cards)} time cards from the run journal")
+                    yield from time_cards
+                    return
+
+        time_cards = []
+        with get_run_metrics().input_file(filepath), ScratchWorkspace(filepath, cls.PROCESSING_FOLDER_PATH) as workspace:
+            unchanged_page_numbers = frozenset()
+            if is_revision:
+                unchanged_page_numbers = cls._unchanged_revision_pages(workspace.input_path, original_filepath)
+            for time_card in cls._iter_time_card_outputs(
+                    workspace.input_path, original_filepath, is_revision, file_hash, unchanged_page_numbers
+            ):
+                time_cards.append(time_card)
+                yield time_card
+        if journal is not None:
+            journal.record_file(filepath, file_hash, [time_card.record for time_card in time_cards])
+
+    @classmethod
+    def _iter_time_card_outputs(
+            cls,
+            filepath: str,
+            original_filepath: str,
+            is_revision: bool,
+            file_hash: str = None,
+            unchanged_page_numbers=frozenset(),
+    ):
+        """
+        Classifies the pages of a time card pdf and writes the time card pages to the outbox
 
-                    # Allow revisions to overwrite an existing CC
-                    if not is_revision:
-                        # Check for a duplicate record that is the same name,date and invoice number and mark
-                        duplicate_time_card_item = (
-                            page.first_name,
-                            page.last_name,
-                            page.pay_period_month_string,
-                            page.pay_period_day_string,
-                            page.pay_period_year_string,
-                            page.invoice_number
-                        )
-                        if duplicate_time_card_item in duplicate_time_card_set:
-                            page.first_name = page.first_name + "_DUPLICATE_CC"
-                            page.last_name = page.last_name + "_DUPLICATE_CC"
-                            print(f'Detected duplicate!  Marking file: {page.output_file_name}')
-                        else:
-                            duplicate_time_card_set.add(duplicate_time_card_item)
-
-                    print(f"   - Detected TimeCard - Will be named: {page.output_file_name}")
-                    output_filepath = os.path.join(
-                        OUTBOX_FOLDER_PATH,
-                        OUTBOX_TIME_CARD_FOLDER,
-                        page.output_file_name
+        Pages that can't be parsed are quarantined.  With a run journal, finished pages are journaled after
+        each write, and pages the journal already has are taken from it instead of being extracted.
+
+        :param filepath: the pdf to read, in a scratch workspace
+        :param original_filepath: the inbox filepath
+        :param is_revision:
+        :param file_hash: content hash of the file for the run journal
+        :param unchanged_page_numbers: pages of a revision that are the same in its original, skipped
+        :return: a generator of TimeCardPDFPage
+        """
+        journal = get_run_journal()
+        journaled_pages = {}
+        if journal is not None and file_hash is not None:
+            journaled_pages = journal.completed_pages(original_filepath, file_hash)
+        if journaled_pages:
+            print(f" - Resuming, {len(journaled_pages)} pages were finished before the run was interrupted")
+        journaled_time_cards = [
+            (page_number, TimeCardPDFPage.from_record(page_entry["record"]))
+            for page_number, page_entry in sorted(journaled_pages.items())
+            if page_entry["status"] == TIME_CARD_PAGE
+        ]
+        print(" - Extracting text from pages...")
+
+        # Only pages classified as time cards are split out to files, (page number, page, journal entry)
+        numbered_time_cards = []
+        # journal entries of the pages finished since the last write
+        page_entries = []
+        # output names of revised time cards that replace one from the original, and ones that are new
+        changed_cards = []
+        added_cards = []
+        skip_page_numbers = set(journaled_pages) | unchanged_page_numbers
+        for page_number, page in heapq.merge(
+                journaled_time_cards,
+                cls._iter_time_card_pages(filepath, original_filepath, skip_page_numbers),
+                key=lambda numbered_page: numbered_page[0],
+        ):
+            print(f"   - Found page {page_number}")
+            # print("--- start debugging time card text ---")
+            # print(page.raw_page_text)
+            # print("--- end debugging time card text ---")
+            if page.is_end_of_batch():
+                print(f"   - Detected END of BATCH page, discarding")
+                page_entries.append({"page": page_number, "status": DISCARDED_PAGE})
+            elif page.is_2nd_page_time_card():
+                print(f"   - Detected 2nd page timecard, discarding")
+                page_entries.append({"page": page_number, "status": DISCARDED_PAGE})
+            else:
+                try:
+                    page.verify_extracted_information()
+                except PageParseError as error:
+                    cls._quarantine_page(filepath, original_filepath, page_number, error)
+                    page_entries.append({"page": page_number, "status": QUARANTINED_PAGE})
+                    continue
+                # journaled before duplicate marking, the registry gives a resumed run's pages the same names
+                page_entry = {"page": page_number, "status": TIME_CARD_PAGE, "record": page.record}
+                print(f"   - Detected TimeCard")
+                numbered_time_cards.append((page_number, page, page_entry))
+                if len(numbered_time_cards) >= cls.PAGE_WRITE_BATCH_SIZE:
+                    written_time_cards = cls._write_time_cards(
+                        filepath, original_filepath, is_revision, numbered_time_cards, journaled_pages,
+                        page_entries, changed_cards, added_cards
                     )
-                    copyfile(filepath, output_filepath)
-                    unmatched_time_cards.append(page)
+                    cls._journal_pages(original_filepath, file_hash, page_entries)
+                    yield from written_time_cards
+                    numbered_time_cards = []
+                    page_entries = []
+
+        written_time_cards = cls._write_time_cards(
+            filepath, original_filepath, is_revision, numbered_time_cards, journaled_pages,
+            page_entries, changed_cards, added_cards
+        )
+        cls._journal_pages(original_filepath, file_hash, page_entries)
+        yield from written_time_cards
+
+        if is_revision:
+            cls.print_revision_report(original_filepath, len(unchanged_page_numbers), changed_cards, added_cards)
+
+    @classmethod
+    def _unchanged_revision_pages(cls, filepath: str, original_filepath: str) -> frozenset:
+        """
+        Finds the pages of a REVISED file that are the same as a page of the original batch for its invoice,
+        by page fingerprint, confirmed by comparing the pages' text
+
+        :param filepath: the revision to read, in a scratch workspace
+        :param original_filepath: the revision's inbox filepath, the originals are in the same folder
+        :return: page numbers of the unchanged pages
+        """
+        invoice_number = invoice_number_from_filepath(os.path.basename(original_filepath))
+        inbox_folder_path = os.path.dirname(original_filepath)
+        original_filepaths = [
+            os.path.join(inbox_folder_path, filename)
+            for filename in sorted(os.listdir(inbox_folder_path))
+            if classify_inbox_file(filename) == TIME_CARD_FILE and invoice_number_from_filepath(filename) == invoice_number
+        ]
+        if invoice_number is None or not original_filepaths:
+            print(" - No original batch for this invoice, processing every page")
+            return frozenset()
+
+        revision_fingerprints = cls._page_fingerprints(filepath)
+        # fingerprint -> (original filepath, page number) of the first original page with it
+        original_pages = {}
+        for original in original_filepaths:
+            if revision_fingerprints is None:
+                break
+            fingerprints = cls._page_fingerprints(original)
+            if fingerprints is None:
+                revision_fingerprints = None
+                continue
+            for page_number, fingerprint in enumerate(fingerprints, start=1):
+                original_pages.setdefault(fingerprint, (original, page_number))
+        if revision_fingerprints is None:
+            print(" - Page fingerprints aren't available, processing every page")
+            return frozenset()
 
-        cls._cleanup_temp_files(hash_string)
-        return unmatched_time_cards
+        unchanged_page_numbers = cls._same_text_pages(filepath, {
+            page_number: original_pages[fingerprint]
+            for page_number, fingerprint in enumerate(revision_fingerprints, start=1)
+            if fingerprint in original_pages
+        })
+        original_names = ", ".join(os.path.basename(original) for original in original_filepaths)
+        print(
+            f" - {len(unchanged_page_numbers)} of {len(revision_fingerprints)} pages are the same as in "
+            f"{original_names}, only changed pages are processed"
+        )
+        return unchanged_page_numbers
+
+    @classmethod
+    def _same_text_pages(cls, filepath: str, original_pages: dict) -> frozenset:
+        """
+        Compares the text of revision pages with the original pages that have the same fingerprint, so two
+        different pages with the same fingerprint can't skip a changed time card
+
+        The originals' text comes from the extraction cache when their whole file is cached.
+
+        :param filepath: the revision to read, in a scratch workspace
+        :param original_pages: revision page number -> (original filepath, page number) with its fingerprint
+        :return: page numbers of the revision pages with the same text as their original page
+        """
+        if not original_pages:
+            return frozenset()
+        revision_texts = dict(cls._iter_page_texts(filepath, sorted(original_pages)))
+
+        # original filepath -> its page numbers to compare
+        original_page_numbers = {}
+        for original, page_number in original_pages.values():
+            original_page_numbers.setdefault(original, set()).add(page_number)
+        cache = get_extraction_cache(cls.PROCESSING_FOLDER_PATH)
+        original_texts = {}
+        for original, page_numbers in original_page_numbers.items():
+            page_entries = cache.get(PDF_PAGE_TEXTS, hash_file(original)) if cache is not None else None
+            if page_entries is not None:
+                page_texts = [
+                    (page_number, page_entries[page_number - 1]["text"]) for page_number in sorted(page_numbers)
+                ]
+            else:
+                page_texts = cls._iter_page_texts(original, sorted(page_numbers))
+            for page_number, text in page_texts:
+                original_texts[original, page_number] = text
+
+        return frozenset(
+            page_number
+            for page_number, original_page in original_pages.items()
+            if revision_texts[page_number] == original_texts[original_page]
+        )
+
+    @staticmethod
+    def print_revision_report(filepath: str, unchanged_page_count: int, changed_cards: list, added_cards: list):
+        """ Lists the time cards a revision changed, also kept in the run report """
+        get_run_metrics().record_revision(filepath, unchanged_page_count, changed_cards, added_cards)
+        print(f" - Revision changed {len(changed_cards)} time cards and added {len(added_cards)}:")
+        for output_file_name in changed_cards:
+            print(f"   - changed: {output_file_name}")
+        for output_file_name in added_cards:
+            print(f"   - added: {output_file_name}")
+
+    @classmethod
+    def _write_time_cards(
+            cls,
+            filepath: str,
+            original_filepath: str,
+            is_revision: bool,
+            numbered_time_cards: list,
+            journaled_pages: dict,
+            page_entries: list,
+            changed_cards: list,
+            added_cards: list,
+    ) -> list:
+        """
+        Claims the output names of a batch of time cards in the run's OutputNameRegistry, marking duplicates of
+        a time card from any inbox file, and writes the batch to the outbox
+
+        :param filepath: the pdf to read, in a scratch workspace
+        :param original_filepath: the inbox filepath
+        :param is_revision: revised time cards replace the time card of the same name instead of being marked
+        :param numbered_time_cards: (page number, TimeCardPDFPage, journal entry) tuples
+        :param journaled_pages: pages finished before the run was interrupted
+        :param page_entries: journal entries of the written pages are added to it
+        :param changed_cards: output names of revised time cards replacing one from the original are added to it
+        :param added_cards: output names of new revised time cards are added to it
+        :return: the batch's TimeCardPDFPage
+        """
+        if not cls.PENDING_OUTPUT_NAMES:
+            get_output_name_registry(cls.PROCESSING_FOLDER_PATH).claim(
+                cls.OUTBOX_FOLDER_PATH,
+                OUTBOX_TIME_CARD_FOLDER,
+                original_filepath,
+                [(page_number, page) for page_number, page, _ in numbered_time_cards],
+                mark_duplicate=cls._mark_duplicate_time_card,
+                output_exists=lambda name: cls.outbox_file_exists(cls.outbox_filepath(OUTBOX_TIME_CARD_FOLDER, name)),
+                overwrite=is_revision,
+            )
+        page_targets = []
+        for page_number, page, page_entry in numbered_time_cards:
+            print(f"   - TimeCard of page {page_number} will be named: {page.output_file_name}")
+            output_filepath = cls._page_output_filepath(
+                OUTBOX_TIME_CARD_FOLDER, original_filepath, page_number, page.output_file_name
+            )
+            if is_revision:
+                # a changed card has the name, date and invoice of a card already written for the original
+                if cls.outbox_file_exists(output_filepath):
+                    changed_cards.append(page.output_file_name)
+                else:
+                    added_cards.append(page.output_file_name)
+            # a journaled page is only written again if its output is gone
+            if page_number not in journaled_pages or not cls.outbox_file_exists(output_filepath):
+                page_targets.append((page_number, output_filepath))
+                page_entries.append(page_entry)
+        cls._write_outbox_pages(filepath, page_targets, "time card")
+        return [page for _, page, _ in numbered_time_cards]
+
+    @classmethod
+    def _page_output_filepath(
+            cls,
+            folder: str,
+            original_filepath: str,
+            page_number: int,
+            output_file_name: str,
+    ) -> str:
+        """
+        :return: where a page is written, its pending name in --jobs worker processes, see PENDING_OUTPUT_NAMES
+        """
+        if not cls.PENDING_OUTPUT_NAMES:
+            return cls.outbox_filepath(folder, output_file_name)
+        pending_folder_path = cls._pending_folder_path(folder, original_filepath)
+        os.makedirs(pending_folder_path, exist_ok=True)
+        return os.path.join(pending_folder_path, f"page-{page_number}.pdf")
+
+    @classmethod
+    def _pending_folder_path(cls, folder: str, original_filepath: str) -> str:
+        return cls.outbox_filepath(folder, PENDING_FOLDER_PREFIX + os.path.basename(original_filepath))
+
+    @classmethod
+    def name_pending_pages(cls, file_type: str, filepath: str, pages: list):
+        """
+        Claims the output names of the pages a --jobs worker process wrote under pending names and moves each
+        page to its name, called for every first pass file in inbox file order so duplicates are marked as in
+        a serial run, whichever worker finished first
+
+        :param file_type: TIME_CARD_FILE or CHECK_COPIES_FILE
+        :param filepath: the inbox filepath
+        :param pages: the file's TimeCardPDFPage or CheckCopyPDFPage from the worker, their names are marked
+        :return:
+        """
+        if file_type == TIME_CARD_FILE:
+            folder = OUTBOX_TIME_CARD_FOLDER
+            mark_duplicate = cls._mark_duplicate_time_card
+            numbered_pages = [(page.page_number, page) for page in pages]
+        else:
+            folder = OUTBOX_CHECK_COPY_FOLDER
+            mark_duplicate = cls._mark_duplicate_check_copy
+            numbered_pages = [(int(page.page_number), page) for page in pages if page.pdf_page_found]
+        numbered_pages.sort(key=lambda numbered_page: numbered_page[0])
+        get_output_name_registry(cls.PROCESSING_FOLDER_PATH).claim(
+            cls.OUTBOX_FOLDER_PATH,
+            folder,
+            filepath,
+            numbered_pages,
+            mark_duplicate=mark_duplicate,
+            output_exists=lambda name: cls.outbox_file_exists(cls.outbox_filepath(folder, name)),
+        )
+        pending_folder_path = cls._pending_folder_path(folder, filepath)
+        for page_number, page in numbered_pages:
+            pending_filepath = os.path.join(pending_folder_path, f"page-{page_number}.pdf")
+            # pages of a file finished before an interrupted run were moved then
+            if os.path.exists(pending_filepath):
+                os.replace(pending_filepath, cls.outbox_filepath(folder, page.output_file_name))
+        shutil.rmtree(pending_folder_path, ignore_errors=True)
+
+    @staticmethod
+    def _mark_duplicate_time_card(page: TimeCardPDFPage):
+        page.first_name = page.first_name + "_DUPLICATE_CC"
+        page.last_name = page.last_name + "_DUPLICATE_CC"
+
+    @staticmethod
+    def _journal_pages(original_filepath: str, file_hash: str, page_entries: list):
+        journal = get_run_journal()
+        if journal is not None and file_hash is not None:
+            journal.record_pages(original_filepath, file_hash, page_entries)
+
+    @classmethod
+    def _quarantine_page(cls, filepath: str, original_filepath: str, page_number: int, error: PageParseError):
+        """
+        Writes a time card page that couldn't be parsed, and its extracted text, to the quarantine folder
+        instead of stopping the run
+
+        :param filepath: the pdf to read, in a scratch workspace
+        :param original_filepath: the inbox filepath
+        :param page_number:
+        :param error:
+        :return:
+        """
+        quarantine_folder_path = os.path.join(cls.OUTBOX_FOLDER_PATH, OUTBOX_QUARANTINE_FOLDER)
+        os.makedirs(quarantine_folder_path, exist_ok=True)
+        output_prefix = os.path.join(quarantine_folder_path, f"{Path(original_filepath).stem}-page-{page_number}")
+        missing = ", ".join(error.missing_information)
+        print(f"   - WARNING: Couldn't get {missing} from page {page_number}, quarantined as {output_prefix}.pdf")
+        get_run_metrics().record_failure(PARSE, f"page {page_number}: couldn't get {missing}")
+        with open(output_prefix + ".txt", "w") as text_file:
+            text_file.write(f"Couldn't get {missing} from page {page_number} of {original_filepath}\n\n")
+            text_file.write(error.page_text)
+        cls._write_outbox_pages(filepath, [(page_number, output_prefix + ".pdf")], "quarantined")
+
+    @classmethod
+    def _write_outbox_pages(cls, filepath: str, page_targets: list, page_description: str):
+        """
+        Writes pages of a pdf to their outbox files, straight into the outbox archive when the backend has
+        IN_MEMORY_PAGES, else as files that are then added to it
+
+        :param filepath:
+        :param page_targets: a list of (page_number, target_filepath) tuples
+        :param page_description:
+        :return:
+        """
+        if page_targets:
+            print(f" - Writing {len(page_targets)} {page_description} pages...")
+            backend = get_pdf_backend()
+            archived_targets = []
+            if cls.OUTBOX_ARCHIVE is not None and backend.IN_MEMORY_PAGES:
+                archived_targets = sorted(target for target in page_targets if cls.OUTBOX_ARCHIVE.archives(target[1]))
+            file_targets = sorted(set(page_targets) - set(archived_targets))
+            with get_run_metrics().measure(WRITE_PAGES, pages=len(page_targets)) as measurement:
+                if file_targets:
+                    backend.write_pages(filepath, file_targets)
+                if archived_targets:
+                    page_numbers = [page_number for page_number, _ in archived_targets]
+                    page_bytes = backend.iter_page_bytes(filepath, page_numbers)
+                    for (_, target_filepath), single_page_bytes in zip(archived_targets, page_bytes):
+                        cls.OUTBOX_ARCHIVE.write(target_filepath, single_page_bytes)
+                measurement.bytes_moved = cls.outbox_files_size(target for _, target in page_targets)
+            if cls.OUTBOX_ARCHIVE is not None:
+                cls.OUTBOX_ARCHIVE.add_files(target for _, target in file_targets)
+
+    @classmethod
+    def merge_manifest(cls) -> MergeManifest:
+        """
+        :return: the MergeManifest of the configured production's outbox, next to its archives when the
+            outbox is archived, the staging folder is removed once they are finished
+        """
+        manifest_path = os.path.join(cls.OUTBOX_FOLDER_PATH, MERGE_MANIFEST_FILENAME)
+        if cls._merge_manifest is None or cls._merge_manifest.manifest_path != manifest_path:
+            cls._merge_manifest = MergeManifest(manifest_path)
+        return cls._merge_manifest
+
+    @classmethod
+    def merge_matched_pairs(cls, matched_pairs: list):
+        """
+        Merges the outbox time card and check copy of every matched pair into the final folder as one batch
+
+        Each merge is written under a temporary name in the final folder and renamed into place, so a
+        merged file is either complete or missing.  Pairs merged before from the same time card and check
+        copy content are skipped, unless INCREMENTAL_MERGE is off.  A pair whose merge fails is tried once
+        more on its own, then reported, without stopping the other merges of the batch.  When the outbox is
+        archived and the backend has IN_MEMORY_PAGES, pairs are merged in memory straight into the archive.
+
+        :param matched_pairs: MatchedPair list
+        :return: merged output names of the pairs that couldn't be merged
+        """
+        manifest = cls.merge_manifest()
+        merges_in_archive = cls.OUTBOX_ARCHIVE is not None and get_pdf_backend().IN_MEMORY_PAGES
+        merge_pages_batch = cls._merge_pages_into_archive if merges_in_archive else get_pdf_backend().merge_pages_batch
+        merges = []
+        renames = []
+        manifest_entries = []
+        unchanged_count = 0
+        for pair in matched_pairs:
+            output_file_name = pair.merged_output_name
+            final_output_path = cls.outbox_filepath(OUTBOX_MERGE_FOLDER, output_file_name)
+            time_card_path = cls.outbox_filepath(OUTBOX_TIME_CARD_FOLDER, pair.time_card.output_file_name)
+            check_copy_path = cls.outbox_filepath(OUTBOX_CHECK_COPY_FOLDER, pair.check_copy.output_file_name)
+            manifest_entry = manifest.entry(time_card_path, check_copy_path, pair.nth_check, cls.read_outbox_file)
+            if cls.INCREMENTAL_MERGE and manifest.is_current(
+                    output_file_name, manifest_entry, final_output_path, cls.outbox_file_exists
+            ):
+                unchanged_count += 1
+                continue
+            print(f"   - Writing merged file to {output_file_name}")
+            if merges_in_archive:
+                merges.append((time_card_path, check_copy_path, final_output_path))
+            else:
+                if cls.OUTBOX_ARCHIVE is not None:
+                    # pages carried from the previous archive are staged for the backend to read
+                    cls.OUTBOX_ARCHIVE.extract(time_card_path)
+                    cls.OUTBOX_ARCHIVE.extract(check_copy_path)
+                partial_output_path = final_output_path + ".partial"
+                merges.append((time_card_path, check_copy_path, partial_output_path))
+                renames.append((partial_output_path, final_output_path))
+            manifest_entries.append((output_file_name, manifest_entry))
+        if unchanged_count:
+            print(f"   - {unchanged_count} merged files are unchanged since they were merged, skipped")
+
+        errors = []
+        try:
+            if merges:
+                # each merged file is a time card page and a check copy page
+                with get_run_metrics().measure(MERGE, pages=2 * len(merges)) as measurement:
+                    errors = merge_pages_batch(merges)
+                    failed = [index for index, error in enumerate(errors) if error is not None]
+                    if failed:
+                        print(f"   - {len(failed)} merges failed, trying them again")
+                        retry_errors = merge_pages_batch([merges[index] for index in failed])
+                        for index, error in zip(failed, retry_errors):
+                            errors[index] = error
+                    measurement.bytes_moved = cls.outbox_files_size(target for _, _, target in merges)
+            written = [index for index in range(len(renames)) if errors[index] is None]
+            for index in written:
+                os.replace(*renames[index])
+            if cls.OUTBOX_ARCHIVE is not None:
+                cls.OUTBOX_ARCHIVE.add_files(renames[index][1] for index in written)
+        finally:
+            for partial_output_path, _ in renames:
+                if os.path.exists(partial_output_path):
+                    os.remove(partial_output_path)
+
+        failed_output_names = []
+        for (output_file_name, manifest_entry), error in zip(manifest_entries, errors):
+            if error is None:
+                manifest.record(output_file_name, manifest_entry)
+            else:
+                failed_output_names.append(output_file_name)
+                print(f"   - WARNING: Couldn't merge {output_file_name}: {error}")
+                get_run_metrics().record_failure(MERGE, f"{output_file_name}: {error}")
+        if len(failed_output_names) < len(manifest_entries):
+            manifest.save()
+        return failed_output_names
+
+    @classmethod
+    def _merge_pages_into_archive(cls, merges: list) -> list:
+        """
+        merge_pages_batch of a backend with IN_MEMORY_PAGES, writing each merged file into the outbox archive
+
+        :param merges: a list of (filepath_1, filepath_2, target_filepath) tuples of outbox paths
+        :return: the error message of each merge, in the same order, None for the merges that were written
+        """
+        errors = []
+        for filepath_1, filepath_2, target_filepath in merges:
+            try:
+                merged_bytes = get_pdf_backend().merge_page_bytes(
+                    cls.read_outbox_file(filepath_1), cls.read_outbox_file(filepath_2)
+                )
+                cls.OUTBOX_ARCHIVE.write(target_filepath, merged_bytes)
+                errors.append(None)
+            except Exception as error:
+                errors.append(f"{type(error).__name__}: {error}")
+        return errors
+
+    @classmethod
+    def remove_stale_merges(cls, matched_pairs: list, time_card_names, check_copy_names):
+        """
+        Removes merged files of earlier runs whose pair no longer exists, e.g. after a correction re-paired
+        a time card, merged files of time cards and check copies that weren't processed are kept
+
+        :param matched_pairs: every current MatchedPair
+        :param time_card_names: output names of every time card that was processed
+        :param check_copy_names: output names of every check copy that was processed
+        :return:
+        """
+        manifest = cls.merge_manifest()
+        stale = manifest.remove_stale(
+            [pair.merged_output_name for pair in matched_pairs],
+            time_card_names,
+            check_copy_names,
+            cls.outbox_filepath(OUTBOX_MERGE_FOLDER),
+            cls.remove_outbox_file,
+        )
+        if stale:
+            print(f"\nRemoved {len(stale)} merged files whose pairing changed:")
+            for output_file_name in stale:
+                print(f" - {output_file_name}")
+            manifest.save()
 
     @classmethod
     def match_time_cards_to_check_copies(
         cls,
         unmatched_time_cards: list,
         unmatched_check_copies: list
-    ):
+    ) -> MatchResult:
         """
         Match time cards to check copies and merge into a single PDF
 
@@ -245,83 +1219,68 @@ class PayrollProcess:
 
         :param unmatched_time_cards:
         :param unmatched_check_copies:
-        :return:
+        :return: the matched pairs and what was left unmatched on each side, the given lists aren't changed
         """
-        # enumerate over copies of the unmatched lists so I can pull out matches during iteration
-        matched_time_cards = []
-        matched_check_copies = []
-        payee_name_counter = dict()
         print("\nMatching time cards to check copies:")
-        for tc in unmatched_time_cards:
-            for cc in unmatched_check_copies:
-                # tc = TimeCardPDFPage
-                # cc = CheckCopyPDFPage
-                if (
-                    tc.last_name == cc.payee_last_name and
-                    tc.first_name == cc.payee_first_name and
-                    tc.pay_period_month_string == cc.month and
-                    tc.pay_period_day_string == cc.day and
-                    tc.pay_period_year_string == cc.year and
-                    tc.invoice_number == cc.invoice_number
-                ):
-                    print(f"- {tc.output_file_name} <matched> {cc.output_file_name}")
-                    matched_time_cards.append(tc)
-                    matched_check_copies.append(cc)
-
-                    # increment name counter so we can number multiple checks by the same person
-                    name_key = f"{tc.last_name},{tc.first_name}"
-                    if name_key in payee_name_counter.keys():
-                        payee_name_counter[name_key] += 1
-                    else:
-                        payee_name_counter[name_key] = 1
-
-                    # Create merged file
-                    tc_hash, tc_temp_path = PayrollProcess._copy_to_temp_file(
-                        os.path.join(
-                            OUTBOX_FOLDER_PATH,
-                            OUTBOX_TIME_CARD_FOLDER,
-                            tc.output_file_name
-                        )
-                    )
-                    cc_hash, cc_temp_path = PayrollProcess._copy_to_temp_file(
-                        os.path.join(
-                            OUTBOX_FOLDER_PATH,
-                            OUTBOX_CHECK_COPY_FOLDER,
-                            cc.output_file_name
-                        )
-                    )
-                    merged_temp_path = cc_temp_path + "-merged"
-                    PDFBox.merge_pages(
-                        tc_temp_path,
-                        cc_temp_path,
-                        merged_temp_path
-                    )
-                    output_file_name = cc.merged_output_name(nth_check=payee_name_counter[name_key])
-                    print(f"   - Writing merged file to {output_file_name}")
-                    final_output_path = os.path.join(
-                        OUTBOX_FOLDER_PATH,
-                        OUTBOX_MERGE_FOLDER,
-                        output_file_name
-                    )
-                    copyfile(
-                        merged_temp_path,
-                        final_output_path
-                    )
-                    PayrollProcess._cleanup_temp_files(cc_hash)
+        with get_run_metrics().measure(MATCH, pages=len(unmatched_time_cards) + len(unmatched_check_copies)):
+            match_result = MatchingEngine.match(
+                unmatched_time_cards,
+                unmatched_check_copies,
+                near_matches=True,
+                merge_near_matches=cls.MERGE_NEAR_MATCHES,
+            )
+        for pair in match_result.matched_pairs:
+            print(f"- {pair.time_card.output_file_name} <matched> {pair.check_copy.output_file_name}")
+        cls.merge_matched_pairs(match_result.matched_pairs)
+        cls.remove_stale_merges(
+            match_result.matched_pairs,
+            [time_card.output_file_name for time_card in unmatched_time_cards],
+            [check_copy.output_file_name for check_copy in unmatched_check_copies],
+        )
 
-        # remove matches from unmatched lists
-        for matched_tc in matched_time_cards:
-            # print(f"Removing matched time card: {matched_tc.last_name} - {matched_tc.invoice_number}")
-            unmatched_time_cards.remove(matched_tc)
-        for matched_cc in matched_check_copies:
-            # print(f"Removing matched check copy: {matched_cc.last_name}")
-            unmatched_check_copies.remove(matched_cc)
+        cls.print_unmatched_report(match_result)
+        return match_result
 
+    @classmethod
+    def print_unmatched_report(cls, match_result: MatchResult):
         print("\nFinished.")
         print("\nThe following time cards were not matched to a check copy:")
-        for time_card in sorted(unmatched_time_cards, key=lambda x: x.output_file_name):
+        for time_card in sorted(match_result.unmatched_time_cards, key=lambda x: x.output_file_name):
             print(f" - {time_card.output_file_name}")
 
         print("\nThe following check copies were not matched to a time card:")
-        for check_copy in sorted(unmatched_check_copies, key=lambda x: x.output_file_name):
+        for check_copy in sorted(match_result.unmatched_check_copies, key=lambda x: x.output_file_name):
             print(f" - {check_copy.output_file_name}")
+
+        cls.print_near_match_report(match_result.near_matches)
+
+    @classmethod
+    def print_near_match_report(cls, near_matches: list):
+        """ Lists near matches of leftover records with their similarity, also kept in the run report """
+        get_run_metrics().record_near_matches([
+            {
+                "time_card": near_match.time_card.output_file_name,
+                "check_copy": near_match.check_copy.output_file_name,
+                "score": near_match.score,
+                "confident": near_match.confident,
+                "merged": near_match.pair is not None,
+            }
+            for near_match in near_matches
+        ])
+        merged = [near_match for near_match in near_matches if near_match.pair is not None]
+        suggested = [near_match for near_match in near_matches if near_match.pair is None]
+        if merged:
+            print("\nThe following near matches were merged:")
+            for near_match in merged:
+                print(
+                    f" - {near_match.time_card.output_file_name} <~> {near_match.check_copy.output_file_name} "
+                    f"({near_match.score:.2f}) as {near_match.pair.merged_output_name}"
+                )
+        if suggested:
+            print("\nPossible matches among the unmatched, similarity from 0 to 1:")
+            for near_match in suggested:
+                confident = ", merged with --merge-near-matches" if near_match.confident else ""
+                print(
+                    f" - {near_match.time_card.output_file_name} <~> {near_match.check_copy.output_file_name} "
+                    f"({near_match.score:.2f}{confident})"
+                )
@@ -0,0 +1,40 @@
+import os
+
+from film_payroll_pdf_processor.pdfbox_wrapper import PDFBox
+from film_payroll_pdf_processor.pypdf_wrapper import PyPDF
+
+# Backends share the same classmethod surface:
+#   split_pages, merge_pages, merge_pages_batch, get_pdf_text, get_page_count, get_page_fingerprints,
+#   get_page_texts, write_pages
+# and IN_MEMORY_PAGES, True for a backend that also has iter_page_bytes and merge_page_bytes
+PDF_BACKENDS = {
+    'pdfbox': PDFBox,
+    'pypdf': PyPDF,
+}
+DEFAULT_PDF_BACKEND = os.environ.get('PDF_BACKEND', 'pdfbox')
+
+_active_backend = None
+
+
+def set_pdf_backend(backend):
+    """
+    Selects the PDF backend used for all processing
+
+    :param backend: a name from PDF_BACKENDS or a backend class
+    :return:
+    """
+    global _active_backend
+    if isinstance(backend, str):
+        if backend not in PDF_BACKENDS:
+            raise ValueError(f"Unknown PDF backend '{backend}', expected one of: {', '.join(PDF_BACKENDS)}")
+        backend = PDF_BACKENDS[backend]
+    _active_backend = backend
+
+
+def get_pdf_backend():
+    """
+    :return: the active PDF backend class, configured by the PDF_BACKEND environment variable by default
+    """
+    if _active_backend is None:
+        set_pdf_backend(DEFAULT_PDF_BACKEND)
+    return _active_backend
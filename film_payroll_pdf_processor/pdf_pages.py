@@ -1,12 +1,110 @@
+import os
 import re
+import sys
+from functools import lru_cache
+
+# Example: "LIDDIARD, JOAQUIN SSN", "PEÑA, MARIA" or "McDONALD, RONALD", only the first word of the first
+# name is kept.  Letters are any Unicode letter, with combining accents, and a match is only taken as the
+# name if it's upper case, see `is_name_case`, so lines like "By electronically approving or signing, ..."
+# and numbers like "1,301.25" never are.  Matched from the start of each line with a ", " in it.
+NAME_SEPARATOR = ", "
+PAYEE_NAME_PATTERN = re.compile(r"([^\W\d_][\w\u0300-\u036f'.\- ]*), ([^\W\d_][\w\u0300-\u036f'\-]*)")
+# \w in the name pattern is faster than a letter only alternation, digits and underscores are ruled out after
+NOT_A_NAME_PATTERN = re.compile(r"[\d_]")
+NAME_WORD_SEPARATOR_PATTERN = re.compile(r"['.\- ]+")
+# Example: "03/13/2021Pay Period Ending :", matched against the text in front of the label on its line
+PAY_PERIOD_ENDING_LABEL = "Pay Period Ending"
+PAY_PERIOD_DATE_PATTERN = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})\s*$")
+INVOICE_NUMBER_PATTERN = re.compile(r"_[A-Z]{3}[0-9]{3}_")
+GRAND_TOTAL_INDICATOR = "Grand Total:"
+# Merged file names start with the production code, e.g. "LLS2-PR-TC-..."
+DEFAULT_PRODUCTION_CODE = "LLS2"
+# Kept with parsed fields in the extraction cache, bump it whenever page or check copy list parsing changes
+PARSER_VERSION = 2
+
+
+@lru_cache(maxsize=256)
+def invoice_number_from_filepath(filepath: str):
+    """
+    Looks for an invoice number surrounded by underscores in the filename, cached since every page of a
+    file has the same one
+
+    Example:
+        pdfs/inbox/WE_041021_EYY896_CONSTRUCTION (2).pdf
+        =
+        _EYY896_
+        =
+        EYY896
+
+    :param filepath:
+    :return: the invoice number, or None if the filename doesn't have one
+    """
+    match = INVOICE_NUMBER_PATTERN.search(filepath)
+    if match:
+        return match.group().replace("_", "")
+    return None
+
+
+def is_name_case(name: str) -> bool:
+    """
+    :param name:
+    :return: True if every word of the name is upper case, or a capital and one or two lower case letters
+        in front of an upper case rest, like McDONALD, MacKENZIE or DeLUCA
+    """
+    if NOT_A_NAME_PATTERN.search(name):
+        return False
+    if name.isupper():
+        return True
+    for word in NAME_WORD_SEPARATOR_PATTERN.split(name):
+        if word and not word.isupper() and not any(
+            word[0].isupper() and word[1:prefix_length].islower() and len(word) - prefix_length > 1 and
+            word[prefix_length:].isupper()
+            for prefix_length in (2, 3)
+        ):
+            return False
+    return True
+
+
+def intern_field(value):
+    """ Interns string field values, so the many records of a season share one copy of each name and date """
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class PageParseError(Exception):
+    """ Raised when a time card page is missing information it needs to be named and matched """
+
+    def __init__(self, message: str, missing_information: list, page_text: str):
+        """
+        :param message:
+        :param missing_information: names of the fields that couldn't be read
+        :param page_text: the extracted text of the page
+        """
+        super().__init__(message)
+        self.missing_information = missing_information
+        self.page_text = page_text
 
 
 class PDFPage:
-    pass
+    # Records are slotted, a multi-week run keeps many thousands of them
+    __slots__ = ()
 
 
 class CheckCopyPDFPage(PDFPage):
 
+    # Prefix of merged file names, set per production, see PayrollProcess.configure_production
+    PRODUCTION_CODE = DEFAULT_PRODUCTION_CODE
+
+    __slots__ = (
+        "month",
+        "day",
+        "year",
+        "page_number",
+        "payee_last_name",
+        "payee_first_name",
+        "invoice_number",
+        "pdf_page_found",
+    )
+
     month: str
     day: str
     year: str
@@ -14,8 +112,7 @@ class CheckCopyPDFPage(PDFPage):
     payee_last_name: str
     payee_first_name: str
     invoice_number: str
-
-    pdf_page_found: bool = False
+    pdf_page_found: bool
 
     def __init__(
             self,
@@ -27,13 +124,52 @@ class CheckCopyPDFPage(PDFPage):
             payee_first_name: str,
             invoice_number: str,
     ):
-        self.month = month
-        self.day = day
-        self.year = year
+        self.month = intern_field(month)
+        self.day = intern_field(day)
+        self.year = intern_field(year)
         self.page_number = page_number
-        self.payee_last_name = payee_last_name
-        self.payee_first_name = payee_first_name
-        self.invoice_number = invoice_number
+        self.payee_last_name = intern_field(payee_last_name)
+        self.payee_first_name = intern_field(payee_first_name)
+        self.invoice_number = intern_field(invoice_number)
+        self.pdf_page_found = False
+
+    @property
+    def list_fields(self) -> dict:
+        """ The fields read from the check copy list, as keyword arguments for the constructor """
+        return {
+            "month": self.month,
+            "day": self.day,
+            "year": self.year,
+            "page_number": self.page_number,
+            "payee_last_name": self.payee_last_name,
+            "payee_first_name": self.payee_first_name,
+            "invoice_number": self.invoice_number,
+        }
+
+    @property
+    def record(self) -> dict:
+        """ JSON serializable state, see `from_record` """
+        return dict(self.list_fields, pdf_page_found=self.pdf_page_found)
+
+    @classmethod
+    def from_record(cls, record: dict):
+        fields = dict(record)
+        pdf_page_found = fields.pop("pdf_page_found", False)
+        check_copy = cls(**fields)
+        check_copy.pdf_page_found = pdf_page_found
+        return check_copy
+
+    @property
+    def match_key(self) -> tuple:
+        """ (last, first, month, day, year, invoice), equal to the match_key of its time card """
+        return (
+            self.payee_last_name,
+            self.payee_first_name,
+            self.month,
+            self.day,
+            self.year,
+            self.invoice_number,
+        )
 
     @property
     def output_file_name(self):
@@ -66,33 +202,110 @@ class CheckCopyPDFPage(PDFPage):
         date = self.month + self.day + self.year
         invoice = self.invoice_number
 
-        return f"LLS2-PR-TC{counter}-{last},{first},{date}-{invoice}.pdf"
+        return f"{self.PRODUCTION_CODE}-PR-TC{counter}-{last},{first},{date}-{invoice}.pdf"
 
 
 class TimeCardPDFPage(PDFPage):
     """
     Models the important data in a split time card PDF page
+
+    The page text is only parsed, not kept in memory.  The text of a page that couldn't be parsed is
+    spilled to a file in its scratch workspace for `raw_page_text`, which is only used for its error message.
     """
 
     END_OF_BATCH_INDICATOR = "END of BATCH"
+    # Fields parsed from the page text alone, as opposed to the filename
+    TEXT_FIELD_NAMES = (
+        "first_name",
+        "last_name",
+        "pay_period_day_string",
+        "pay_period_month_string",
+        "pay_period_year_string",
+        "has_grand_total",
+        "has_end_of_batch",
+    )
 
-    raw_page_text: str = None
+    __slots__ = TEXT_FIELD_NAMES + (
+        "original_filepath",
+        "page_number",
+        "invoice_number",
+        "page_text_path",
+    )
 
-    first_name: str = None
-    last_name: str = None
-    pay_period_day_string: str = None
-    pay_period_month_string: str = None
-    pay_period_year_string: str = None
-    invoice_number: str = None
+    original_filepath: str
+    page_number: int
+    first_name: str
+    last_name: str
+    pay_period_day_string: str
+    pay_period_month_string: str
+    pay_period_year_string: str
+    invoice_number: str
+    has_grand_total: bool
+    has_end_of_batch: bool
+    page_text_path: str
 
-    def __init__(self, raw_page_text, original_filepath):
-        self.raw_page_text = raw_page_text
+    def __init__(self, raw_page_text, original_filepath, text_fields: dict = None, page_number: int = None):
+        """
+        :param raw_page_text:
+        :param original_filepath:
+        :param text_fields: previously parsed `text_fields` for this page text, skips parsing the text again
+        :param page_number: 1-based page number in the original pdf
+        """
         self.original_filepath = original_filepath
-        self.extract_name()
-        self.extract_pay_period_date()
+        self.page_number = page_number
+        # set when the text is spilled to a file, see `raw_page_text`
+        self.page_text_path = None
+        if text_fields is None or any(field_name not in text_fields for field_name in self.TEXT_FIELD_NAMES):
+            self.extract_page_fields(raw_page_text)
+        else:
+            for field_name in self.TEXT_FIELD_NAMES:
+                setattr(self, field_name, intern_field(text_fields.get(field_name)))
         self.extract_invoice_number()
 
-    def verify_extracted_information(self):
+    @property
+    def raw_page_text(self) -> str:
+        """
+        The text of the page, read from the file it was spilled to
+
+        :return: the page text, or an empty string if it wasn't spilled or its scratch workspace is gone
+        """
+        if self.page_text_path is None or not os.path.exists(self.page_text_path):
+            return ""
+        with open(self.page_text_path, encoding='utf-8') as page_text_file:
+            return page_text_file.read()
+
+    @property
+    def text_fields(self) -> dict:
+        return {field_name: getattr(self, field_name) for field_name in self.TEXT_FIELD_NAMES}
+
+    @property
+    def match_key(self) -> tuple:
+        """ (last, first, month, day, year, invoice), equal to the match_key of its check copy """
+        return (
+            self.last_name,
+            self.first_name,
+            self.pay_period_month_string,
+            self.pay_period_day_string,
+            self.pay_period_year_string,
+            self.invoice_number,
+        )
+
+    @property
+    def record(self) -> dict:
+        """ JSON serializable state without the page text, see `from_record` """
+        return dict(self.text_fields, original_filepath=self.original_filepath, page_number=self.page_number)
+
+    @classmethod
+    def from_record(cls, record: dict):
+        fields = dict(record)
+        original_filepath = fields.pop("original_filepath")
+        page_number = fields.pop("page_number", None)
+        return cls("", original_filepath, text_fields=fields, page_number=page_number)
+
+    def missing_information(self) -> list:
+        """
+        :return: names of the fields a time card page needs that couldn't be read
+        """
         missing_information = []
         if not self.first_name or not self.last_name:
             missing_information.append("Payee name")
@@ -100,14 +313,19 @@ class TimeCardPDFPage(PDFPage):
             missing_information.append("Pay period ending date")
         if not self.invoice_number:
             missing_information.append("Invoice Number")
+        return missing_information
+
+    def verify_extracted_information(self):
+        missing_information = self.missing_information()
         if len(missing_information):
             missing = ", ".join(missing_information)
+            page_text = self.raw_page_text
             error = f"\n\nERROR: Couldn't get the following information from this file: "
             error += self.original_filepath
             error += f"{missing}"
             error += "Extracted text from the PDF for troubleshooting:"
-            error += f"\n -------- \n {self.raw_page_text} \n ------- \n"
-            raise Exception(error)
+            error += f"\n -------- \n {page_text} \n ------- \n"
+            raise PageParseError(error, missing_information, page_text)
 
     def is_2nd_page_time_card(self) -> bool:
         """
@@ -115,7 +333,7 @@ class TimeCardPDFPage(PDFPage):
 
         :return:
         """
-        return "Grand Total:" not in self.raw_page_text
+        return not self.has_grand_total
 
     def is_end_of_batch(self) -> bool:
         """
@@ -123,7 +341,7 @@ class TimeCardPDFPage(PDFPage):
 
         :return:
         """
-        return self.END_OF_BATCH_INDICATOR in self.raw_page_text
+        return self.has_end_of_batch
 
     @property
     def output_file_name(self):
@@ -137,46 +355,32 @@ class TimeCardPDFPage(PDFPage):
         return f"TC-{last_name},{first_name}-{month}{day}{year}-{invoice_number}.pdf"
 
     def extract_invoice_number(self):
-        """
-        Looks for an invoice number surrounded by underscores in the filename
+        """ Looks for an invoice number surrounded by underscores in the filename """
+        self.invoice_number = invoice_number_from_filepath(self.original_filepath)
 
-        Example:
-            pdfs/inbox/WE_041021_EYY896_CONSTRUCTION (2).pdf
-            =
-            _EYY896_
-            =
-            EYY896
-        """
-        # print(self.original_filepath)
-        match = re.search(
-            r"_[A-Z]{3}[0-9]{3}_",
-            self.original_filepath
-        )
-        if match:
-            invoice_number = match.group()
-            invoice_number = invoice_number.replace("_", "")
-            self.invoice_number = invoice_number
-
-    def extract_name(self):
-        # Example: "LIDDIARD, JOAQUIN SSN"
-        # Example: "PINCKLEY, DENISE"
-        for line in self.raw_page_text.splitlines():
-            if "," in line:
-                name_list = line.split(", ")
-                self.last_name = name_list[0]
-                self.first_name = name_list[1]
-                # strip middle initial / SSN label
-                if " " in self.first_name:
-                    self.first_name = self.first_name.split(" ").pop(0)
-                break
-
-    def extract_pay_period_date(self):
-        # Example: "03/13/2021Pay Period Ending :"
-        for line in self.raw_page_text.splitlines():
-            if "Pay Period Ending" in line:
-                date_string = line.split("Pay").pop(0)
-                date_list = date_string.split("/")
-                self.pay_period_month_string = date_list[0]
-                self.pay_period_day_string = date_list[1]
-                self.pay_period_year_string = date_list[2]
+    def extract_page_fields(self, text: str):
+        """
+        Parses the payee name, pay period ending date and the Grand Total and END of BATCH markers from the
+        page text in one go with precompiled patterns
+        """
+        self.last_name = self.first_name = None
+        self.pay_period_month_string = self.pay_period_day_string = self.pay_period_year_string = None
+        separator_index = text.find(NAME_SEPARATOR)
+        while separator_index != -1:
+            line_start = text.rfind("\n", 0, separator_index) + 1
+            name_match = PAYEE_NAME_PATTERN.match(text, line_start)
+            if name_match and is_name_case(name_match.group(1)) and is_name_case(name_match.group(2)):
+                self.last_name, self.first_name = map(sys.intern, name_match.groups())
                 break
+            line_end = text.find("\n", separator_index)
+            separator_index = text.find(NAME_SEPARATOR, line_end) if line_end != -1 else -1
+        # finding the label first is much cheaper than a pattern that starts with a digit
+        label_index = text.find(PAY_PERIOD_ENDING_LABEL)
+        if label_index != -1:
+            line_start = text.rfind("\n", 0, label_index) + 1
+            date_match = PAY_PERIOD_DATE_PATTERN.search(text, line_start, label_index)
+            if date_match:
+                self.pay_period_month_string, self.pay_period_day_string, self.pay_period_year_string = \
+                    map(sys.intern, date_match.groups())
+        self.has_grand_total = GRAND_TOTAL_INDICATOR in text
+        self.has_end_of_batch = self.END_OF_BATCH_INDICATOR in text
@@ -1,10 +1,340 @@
+import atexit
+import os
+import struct
 import subprocess
+import tempfile
+import threading
+from pathlib import Path
+
+from film_payroll_pdf_processor.async_process_client import AsyncProcessClient, ProcessCallError
+from film_payroll_pdf_processor.run_metrics import get_run_metrics
+
+
+# PDFBox's PDFText2HTML starts every page with this
+PER_CALL_PAGE_START = b'<div style="page-break-before:always; page-break-after:always">'
+
+
+class PDFBoxError(Exception):
+    """ Raised when PDFBox reports a failure for a command """
+    pass
+
+
+class PDFBoxWorker:
+    """
+    A long-lived JVM running ApachePDFBox/PDFBoxWorker.java that accepts PDFBox commands over stdin/stdout
+
+    Messages in both directions are a 4 byte big-endian field count followed by that many fields,
+    each a 4 byte big-endian length and UTF-8 bytes.  Responses start with "OK" or "ERROR".
+
+    The worker's stderr goes to a temporary file so it can be reported when the worker fails.
+    """
+
+    def __init__(self, command: list, slot: int = 0):
+        """
+        :param command: the command starting the worker JVM
+        :param slot: the worker's place in the pool
+        """
+        self.slot = slot
+        # whether the worker has responded to a command, one that fails before that didn't start
+        self.answered = False
+        self.stderr_file = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=self.stderr_file,
+        )
+        self.lock = threading.Lock()
+
+    def request(self, *fields: str, timeout: float = None) -> list:
+        """
+        Sends one command to the worker and waits for the response
+
+        :param fields: the command name followed by its arguments
+        :param timeout: seconds to wait before the worker is killed, which raises EOFError
+        :return: the result fields of the response
+        """
+        timed_out = threading.Event()
+
+        def kill_hung_worker():
+            timed_out.set()
+            self.process.kill()
+
+        with self.lock:
+            watchdog = threading.Timer(timeout, kill_hung_worker) if timeout else None
+            if watchdog is not None:
+                watchdog.start()
+            try:
+                self._write_message(fields)
+                response = self._read_message()
+                self.answered = True
+            except EOFError:
+                if timed_out.is_set():
+                    raise EOFError(f"PDFBox worker timed out after {timeout:g} seconds")
+                raise
+            finally:
+                if watchdog is not None:
+                    watchdog.cancel()
+        status = response.pop(0)
+        if status != "OK":
+            raise PDFBoxError(f"PDFBox worker failed on {fields}: {' '.join(response)}")
+        return response
+
+    def stderr_output(self) -> str:
+        """ Everything the worker has written to stderr so far """
+        self.stderr_file.seek(0)
+        return self.stderr_file.read().decode('utf-8', errors='replace')
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.stderr_file.close()
+
+    def _write_message(self, fields):
+        message = [struct.pack(">i", len(fields))]
+        for field in fields:
+            encoded = field.encode('utf-8')
+            message.append(struct.pack(">i", len(encoded)))
+            message.append(encoded)
+        self.process.stdin.write(b"".join(message))
+        self.process.stdin.flush()
+
+    def _read_message(self) -> list:
+        count, = struct.unpack(">i", self._read_exactly(4))
+        fields = []
+        for _ in range(count):
+            length, = struct.unpack(">i", self._read_exactly(4))
+            fields.append(self._read_exactly(length).decode('utf-8'))
+        return fields
+
+    def _read_exactly(self, size: int) -> bytes:
+        data = self.process.stdout.read(size)
+        if len(data) != size:
+            raise EOFError("PDFBox worker exited unexpectedly")
+        return data
 
 
 class PDFBox:
-    """ Abstraction for command line calls to PDFBox """
+    """
+    Abstraction for command line calls to PDFBox
+
+    By default commands are sent to a pool of long-lived PDFBoxWorker JVMs.  The pool starts with one
+    worker and only grows, up to WORKER_POOL_SIZE, while every worker is busy with a concurrent call.
+    A worker that doesn't answer within WORKER_REQUEST_TIMEOUT_SECONDS is killed.  The command of a worker
+    that dies runs in a fresh `java -jar` process and the worker is replaced, up to WORKER_RESTARTS times
+    for each place in the pool.  If the worker class isn't compiled or WORKER_STARTUP_FAILURES workers in a
+    row die before answering, every call runs in a fresh `java -jar` process.
+
+    `java -jar` processes are run by an AsyncProcessClient, at most PER_CALL_CONCURRENCY at once, killed
+    after PER_CALL_TIMEOUT_SECONDS and retried PER_CALL_RETRIES times if they time out or crash.  A
+    process that still fails raises PDFBoxError with its stderr.
+    """
 
     PDFBOX_JAR = "/root/pdfbox-app-2.0.23.jar"
+    WORKER_CLASS_DIR = "/root/pdfbox-worker"
+    WORKER_CLASS_NAME = "PDFBoxWorker"
+
+    # pages are only written to files, see PyPDF.IN_MEMORY_PAGES
+    IN_MEMORY_PAGES = False
+
+    USE_WORKER = True
+    WORKER_POOL_SIZE = os.cpu_count() or 1
+    WORKER_REQUEST_TIMEOUT_SECONDS = 600
+    WORKER_RESTARTS = 3
+    WORKER_STARTUP_FAILURES = 3
+
+    PER_CALL_CONCURRENCY = os.cpu_count() or 1
+    PER_CALL_TIMEOUT_SECONDS = 120
+    PER_CALL_RETRIES = 2
+
+    _per_call_client = None
+
+    _workers = []
+    _idle_workers = []
+    _worker_pid = None
+    _worker_failed = False
+    # pool slot -> workers in it that died
+    _slot_failures = {}
+    # workers in a row that died before answering
+    _startup_failures = 0
+    _worker_available = threading.Condition()
+
+    @classmethod
+    def _checkout_worker(cls):
+        """
+        Takes an idle worker from the pool, starting one if the pool isn't full yet
+
+        :return: a PDFBoxWorker for the exclusive use of the caller, or None if per-call mode should be used
+        """
+        if not cls.USE_WORKER or cls._worker_failed:
+            return None
+        with cls._worker_available:
+            if cls._worker_pid != os.getpid():
+                # A forked child process can't share the parent's worker pipes, it starts its own
+                cls._workers = []
+                cls._idle_workers = []
+                cls._slot_failures = {}
+                cls._worker_pid = os.getpid()
+            while not cls._worker_failed and not cls._idle_workers and cls._workers and cls._free_slot() is None:
+                cls._worker_available.wait()
+            if cls._worker_failed:
+                return None
+            if cls._idle_workers:
+                return cls._idle_workers.pop()
+            slot = cls._free_slot()
+            if slot is None:
+                # every place in the pool has used up its restarts
+                return None
+
+            worker_class_file = os.path.join(cls.WORKER_CLASS_DIR, f"{cls.WORKER_CLASS_NAME}.class")
+            if not os.path.exists(worker_class_file):
+                print(f" - PDFBox worker not found at {worker_class_file}, running one JVM per call")
+                cls._worker_failed = True
+                return None
+            worker = PDFBoxWorker(cls._worker_command(), slot)
+            if not cls._workers:
+                atexit.register(cls.shutdown_worker)
+            cls._workers.append(worker)
+            return worker
+
+    @classmethod
+    def _worker_command(cls) -> list:
+        return ['java', '-cp', os.pathsep.join([cls.PDFBOX_JAR, cls.WORKER_CLASS_DIR]), cls.WORKER_CLASS_NAME]
+
+    @classmethod
+    def _free_slot(cls):
+        """
+        :return: a place in the pool without a worker that hasn't used up its restarts, None if there is none
+        """
+        used_slots = {worker.slot for worker in cls._workers}
+        for slot in range(max(1, cls.WORKER_POOL_SIZE)):
+            if slot not in used_slots and cls._slot_failures.get(slot, 0) <= cls.WORKER_RESTARTS:
+                return slot
+        return None
+
+    @classmethod
+    def _checkin_worker(cls, worker: PDFBoxWorker, failed: bool = False):
+        """
+        Returns a worker to the pool, or removes it from the pool if it failed so its slot can start another
+
+        :param worker: a worker from _checkout_worker
+        :param failed: the worker stopped responding
+        """
+        with cls._worker_available:
+            if failed:
+                worker.close()
+                if worker in cls._workers:
+                    cls._workers.remove(worker)
+                cls._slot_failures[worker.slot] = cls._slot_failures.get(worker.slot, 0) + 1
+                cls._startup_failures = 0 if worker.answered else cls._startup_failures + 1
+                if cls._startup_failures >= cls.WORKER_STARTUP_FAILURES:
+                    cls._worker_failed = True
+            else:
+                cls._startup_failures = 0
+                cls._idle_workers.append(worker)
+            # a waiting caller can start a worker in the failed worker's slot, or switch to per-call mode
+            cls._worker_available.notify_all()
+
+    @classmethod
+    def shutdown_worker(cls):
+        """ Stops every worker in the pool """
+        with cls._worker_available:
+            if cls._worker_pid == os.getpid():
+                for worker in cls._workers:
+                    worker.close()
+            cls._workers = []
+            cls._idle_workers = []
+            cls._worker_available.notify_all()
+
+    @classmethod
+    def _run_in_worker(cls, *fields: str):
+        """
+        Runs a command in a pooled worker
+
+        :return: the result fields, or None if the command has to be run per-call instead
+        """
+        worker = cls._checkout_worker()
+        if worker is None:
+            return None
+        operation = f"pdfbox:{fields[0]}"
+        try:
+            result = worker.request(*fields, timeout=cls.WORKER_REQUEST_TIMEOUT_SECONDS)
+        except (EOFError, OSError) as error:
+            try:
+                # a worker that died has usually exited by now, so its exit code can be reported
+                returncode = worker.process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                returncode = None
+            get_run_metrics().record_failure(
+                operation,
+                f"PDFBox worker stopped responding: {error}",
+                returncode=returncode,
+                stderr=worker.stderr_output(),
+            )
+            # the caller runs the command again in per-call mode
+            get_run_metrics().record_retry(operation)
+            cls._checkin_worker(worker, failed=True)
+            if cls._worker_failed:
+                print(" - WARNING: PDFBox workers keep failing to start, running one JVM per call")
+            elif cls._slot_failures[worker.slot] > cls.WORKER_RESTARTS:
+                print(" - WARNING: PDFBox worker stopped responding too often, not replacing it")
+            else:
+                print(" - WARNING: PDFBox worker stopped responding, replacing it")
+            return None
+        except PDFBoxError as error:
+            get_run_metrics().record_failure(operation, str(error))
+            cls._checkin_worker(worker)
+            raise
+        cls._checkin_worker(worker)
+        return result
+
+    @classmethod
+    def _get_per_call_client(cls) -> AsyncProcessClient:
+        if cls._per_call_client is None:
+            cls._per_call_client = AsyncProcessClient(
+                max_concurrency=cls.PER_CALL_CONCURRENCY,
+                timeout=cls.PER_CALL_TIMEOUT_SECONDS,
+                retries=cls.PER_CALL_RETRIES,
+            )
+        return cls._per_call_client
+
+    @classmethod
+    def _per_call_command(cls, arguments) -> list:
+        return ['java', '-jar', cls.PDFBOX_JAR, *arguments]
+
+    @classmethod
+    def _run_per_call(cls, *arguments: str) -> bytes:
+        """
+        Runs one PDFBox command line command in its own JVM
+
+        :param arguments: the command name followed by its arguments
+        :return: what the command wrote to stdout
+        """
+        return cls._run_many_per_call([arguments])[0]
+
+    @classmethod
+    def _run_many_per_call(cls, argument_lists: list) -> list:
+        """
+        Runs PDFBox command line commands concurrently, each in its own JVM
+
+        :param argument_lists: a list of command argument lists, all for the same command
+        :return: the stdout of each command, in the same order
+        """
+        if not argument_lists:
+            return []
+        command_name = argument_lists[0][0]
+        try:
+            results = cls._get_per_call_client().run_many_sync(
+                [cls._per_call_command(arguments) for arguments in argument_lists],
+                operation=f"pdfbox:{command_name}",
+            )
+        except ProcessCallError as error:
+            raise PDFBoxError(f"PDFBox {command_name} failed, {error}: {error.stderr.strip()[-500:]}") from error
+        return [result.stdout for result in results]
 
     @classmethod
     def split_pages(cls, filepath: str):
@@ -15,16 +345,9 @@ class PDFBox:
         :return:
         """
         # print(f"   - Splitting PDF into pages:")
-        result = subprocess.run([
-            'java',
-            '-jar',
-            cls.PDFBOX_JAR,
-            'PDFSplit',
-            filepath
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        # print(result.stdout)
-        # error_messages = result.stderr
-        # print(error_messages)
+        if cls._run_in_worker('PDFSplit', filepath) is not None:
+            return
+        cls._run_per_call('PDFSplit', filepath)
 
     @classmethod
     def merge_pages(cls, filepath_1: str, filepath_2: str, target_filepath: str):
@@ -36,19 +359,34 @@ class PDFBox:
         :param target_filepath:
         :return:
         """
-        # print(f"   - Splitting PDF into pages:")
-        result = subprocess.run([
-            'java',
-            '-jar',
-            cls.PDFBOX_JAR,
-            'PDFMerger',
-            filepath_1,
-            filepath_2,
-            target_filepath
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        # print(result.stdout)
-        # error_messages = result.stderr
-        # print(error_messages)
+        if cls._run_in_worker('PDFMerger', filepath_1, filepath_2, target_filepath) is not None:
+            return
+        cls._run_per_call('PDFMerger', filepath_1, filepath_2, target_filepath)
+
+    @classmethod
+    def merge_pages_batch(cls, merges: list) -> list:
+        """
+        Merge many pairs of PDFs in a single worker call, a merge that fails doesn't stop the others
+
+        :param merges: a list of (filepath_1, filepath_2, target_filepath) tuples
+        :return: the error message of each merge, in the same order, None for the merges that were written
+        """
+        if not merges:
+            return []
+        fields = [filepath for merge in merges for filepath in merge]
+        worker_result = cls._run_in_worker('PDFMergerBatch', *fields)
+        if worker_result is not None:
+            return [None if status == "OK" else status[len("ERROR "):] for status in worker_result]
+
+        results = cls._get_per_call_client().run_many_sync(
+            [cls._per_call_command(('PDFMerger', *merge)) for merge in merges],
+            operation="pdfbox:PDFMerger",
+            return_errors=True,
+        )
+        return [
+            f"{result}: {result.stderr.strip()[-500:]}" if isinstance(result, ProcessCallError) else None
+            for result in results
+        ]
 
     @classmethod
     def get_pdf_text(cls, filepath: str) -> str:
@@ -58,15 +396,101 @@ class PDFBox:
         :param filepath:
         :return:
         """
-        result = subprocess.run([
-            'java',
-            '-jar',
-            cls.PDFBOX_JAR,
-            'ExtractText',
-            filepath,
-            '-console',
-            'true'
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        output_string = result.stdout.decode('utf-8')
-        error_string = result.stderr
-        return output_string
\ No newline at end of file
+        worker_result = cls._run_in_worker('ExtractText', filepath)
+        if worker_result is not None:
+            return worker_result[0]
+        return cls._run_per_call('ExtractText', filepath, '-console', 'true').decode('utf-8')
+
+    @classmethod
+    def get_page_count(cls, filepath: str) -> int:
+        """
+        Count the pages of a pdf
+
+        Per-call fallback runs ExtractText once with HTML output, which starts every page with a page break
+        div, instead of writing a file per page.  Pages without a content stream don't get one.
+
+        :param filepath:
+        :return:
+        """
+        worker_result = cls._run_in_worker('PageCount', filepath)
+        if worker_result is not None:
+            return int(worker_result[0])
+
+        html = cls._run_per_call('ExtractText', '-html', filepath, '-console', 'true')
+        return html.count(PER_CALL_PAGE_START)
+
+    @classmethod
+    def get_page_fingerprints(cls, filepath: str):
+        """
+        Hash the content stream and resources of every page of a pdf without extracting text
+
+        Not available in per-call mode, there's no PDFBox command line tool for it.
+
+        :param filepath:
+        :return: a list of sha256 hex digests in page order, or None if fingerprints aren't available
+        """
+        return cls._run_in_worker('PageFingerprints', filepath)
+
+    @classmethod
+    def get_page_texts(cls, filepath: str, start_page: int = 1, end_page: int = None) -> list:
+        """
+        Extract the text of every page of a pdf, or a range of its pages, in a single pass
+
+        Per-call fallback runs ExtractText once for each page, PER_CALL_CONCURRENCY pages at a time.
+
+        :param filepath:
+        :param start_page: first 1-based page to extract
+        :param end_page: last 1-based page to extract, inclusive, defaults to the last page
+        :return: a list of page text strings in page order, so page n is at index n - start_page
+        """
+        range_fields = [str(start_page)]
+        if end_page is not None:
+            range_fields.append(str(end_page))
+        worker_result = cls._run_in_worker('ExtractPageTexts', filepath, *range_fields)
+        if worker_result is not None:
+            return worker_result
+
+        if end_page is None:
+            end_page = cls.get_page_count(filepath)
+        outputs = cls._run_many_per_call([
+            (
+                'ExtractText',
+                '-startPage', str(page_number),
+                '-endPage', str(page_number),
+                filepath,
+                '-console', 'true'
+            )
+            for page_number in range(start_page, end_page + 1)
+        ])
+        return [output.decode('utf-8') for output in outputs]
+
+    @classmethod
+    def write_pages(cls, filepath: str, page_targets: list):
+        """
+        Write selected pages of a pdf to their own single page files
+
+        :param filepath:
+        :param page_targets: a list of (page_number, target_filepath) tuples with 1-based page numbers
+        :return:
+        """
+        if not page_targets:
+            return
+        fields = []
+        for page_number, target_filepath in page_targets:
+            fields += [str(page_number), target_filepath]
+        if cls._run_in_worker('WritePages', filepath, *fields) is not None:
+            return
+
+        output_prefixes = [str(Path(target_filepath).with_suffix("")) for _, target_filepath in page_targets]
+        cls._run_many_per_call([
+            (
+                'PDFSplit',
+                '-startPage', str(page_number),
+                '-endPage', str(page_number),
+                '-outputPrefix', output_prefix,
+                filepath
+            )
+            for (page_number, _), output_prefix in zip(page_targets, output_prefixes)
+        ])
+        for (_, target_filepath), output_prefix in zip(page_targets, output_prefixes):
+            os.replace(f"{output_prefix}-1.pdf", target_filepath)
@@ -0,0 +1,265 @@
+import hashlib
+import io
+import os
+import threading
+from pathlib import Path
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+
+class PyPDF:
+    """
+    In-process PDF backend built on the pure-Python pypdf library, with the same surface as PDFBox
+
+    Pages are read once into memory and written from page objects, so no JVM, temp copies or split
+    page files are needed.  Requires `pip install pypdf`.
+
+    pypdf lays out extracted text differently from PDFBox in places, so production time card parsing
+    is only validated against PDFBox output.
+    """
+
+    # pages can be written as bytes, e.g. straight into the outbox archive, see iter_page_bytes
+    IN_MEMORY_PAGES = True
+
+    _reader_cache = None
+    _reader_lock = threading.Lock()
+
+    @classmethod
+    def _require_pypdf(cls):
+        if pypdf is None:
+            raise ImportError("The pypdf backend requires the pypdf package: pip install pypdf")
+
+    @classmethod
+    def _get_reader(cls, filepath: str):
+        """
+        Parses a pdf, reusing the last parsed document when the same unchanged file is read again
+
+        :param filepath:
+        :return: a pypdf.PdfReader
+        """
+        cls._require_pypdf()
+        stat = os.stat(filepath)
+        cache_key = (os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size)
+        with cls._reader_lock:
+            if cls._reader_cache is None or cls._reader_cache[0] != cache_key:
+                with open(filepath, 'rb') as pdf_file:
+                    pdf_bytes = pdf_file.read()
+                cls._reader_cache = (cache_key, pypdf.PdfReader(io.BytesIO(pdf_bytes)))
+            return cls._reader_cache[1]
+
+    @classmethod
+    def get_pages(cls, filepath: str) -> list:
+        """
+        :param filepath:
+        :return: the pypdf page objects of a pdf in page order
+        """
+        return list(cls._get_reader(filepath).pages)
+
+    @classmethod
+    def page_to_bytes(cls, *pages) -> bytes:
+        """
+        Serializes one or more page objects as a new pdf document
+
+        :param pages:
+        :return: the bytes of the new pdf
+        """
+        cls._require_pypdf()
+        writer = pypdf.PdfWriter()
+        for page in pages:
+            writer.add_page(page)
+        output = io.BytesIO()
+        writer.write(output)
+        return output.getvalue()
+
+    @classmethod
+    def iter_page_bytes(cls, filepath: str, page_numbers: list):
+        """
+        :param filepath:
+        :param page_numbers: 1-based page numbers
+        :return: generator of the bytes of a single page pdf of each page, in the same order
+        """
+        pages = cls.get_pages(filepath)
+        for page_number in page_numbers:
+            yield cls.page_to_bytes(pages[page_number - 1])
+
+    @classmethod
+    def merge_page_bytes(cls, pdf_bytes_1: bytes, pdf_bytes_2: bytes) -> bytes:
+        """
+        Merges two PDFs held in memory
+
+        :param pdf_bytes_1:
+        :param pdf_bytes_2:
+        :return: the bytes of the merged pdf
+        """
+        cls._require_pypdf()
+        writer = pypdf.PdfWriter()
+        for pdf_bytes in (pdf_bytes_1, pdf_bytes_2):
+            writer.append(io.BytesIO(pdf_bytes))
+        output = io.BytesIO()
+        writer.write(output)
+        return output.getvalue()
+
+    @classmethod
+    def split_pages(cls, filepath: str):
+        """
+        Splits a pdf into single page files using the PDFBox filename-n.pdf naming convention
+
+        :param filepath:
+        :return:
+        """
+        output_prefix = str(Path(filepath).with_suffix(""))
+        cls.write_pages(filepath, [
+            (page_number, f"{output_prefix}-{page_number}.pdf")
+            for page_number in range(1, len(cls.get_pages(filepath)) + 1)
+        ])
+
+    @classmethod
+    def merge_pages(cls, filepath_1: str, filepath_2: str, target_filepath: str):
+        """
+        Merges two PDFs into a new target PDF
+
+        :param filepath_1:
+        :param filepath_2:
+        :param target_filepath:
+        :return:
+        """
+        with open(filepath_1, 'rb') as pdf_file_1, open(filepath_2, 'rb') as pdf_file_2:
+            merged_bytes = cls.merge_page_bytes(pdf_file_1.read(), pdf_file_2.read())
+        with open(target_filepath, 'wb') as target_file:
+            target_file.write(merged_bytes)
+
+    @classmethod
+    def merge_pages_batch(cls, merges: list) -> list:
+        """
+        Merge many pairs of PDFs, a merge that fails doesn't stop the others
+
+        :param merges: a list of (filepath_1, filepath_2, target_filepath) tuples
+        :return: the error message of each merge, in the same order, None for the merges that were written
+        """
+        cls._require_pypdf()
+        errors = []
+        for filepath_1, filepath_2, target_filepath in merges:
+            try:
+                cls.merge_pages(filepath_1, filepath_2, target_filepath)
+                errors.append(None)
+            except Exception as error:
+                errors.append(f"{type(error).__name__}: {error}")
+        return errors
+
+    @classmethod
+    def get_pdf_text(cls, filepath: str) -> str:
+        """
+        Extracts the text of a whole pdf
+
+        :param filepath:
+        :return:
+        """
+        return "\n".join(cls.get_page_texts(filepath))
+
+    @classmethod
+    def get_page_count(cls, filepath: str) -> int:
+        """
+        Count the pages of a pdf
+
+        :param filepath:
+        :return:
+        """
+        return len(cls._get_reader(filepath).pages)
+
+    @classmethod
+    def get_page_fingerprints(cls, filepath: str) -> list:
+        """
+        Hash the content stream and the resources of every page of a pdf without extracting text
+
+        Resources are hashed with every object and stream they reference, so pages drawing different text
+        through form XObjects or subset fonts don't hash the same.  Objects shared by many pages, like fonts,
+        are hashed once per file.
+
+        :param filepath:
+        :return: a list of sha256 hex digests in page order
+        """
+        fingerprints = []
+        object_digests = {}
+        for page in cls.get_pages(filepath):
+            digest = hashlib.sha256()
+            contents = page.get_contents()
+            digest.update(b"contents")
+            cls._digest_pdf_object(digest, contents.get_data() if contents is not None else b"", object_digests)
+            digest.update(b"resources")
+            cls._digest_pdf_object(digest, page.get("/Resources"), object_digests)
+            fingerprints.append(digest.hexdigest())
+        return fingerprints
+
+    @classmethod
+    def _digest_pdf_object(cls, digest, pdf_object, object_digests: dict):
+        """
+        Adds a pdf object to a digest, following indirect references and including decoded stream data
+
+        :param digest:
+        :param pdf_object:
+        :param object_digests: (object number, generation) -> digest of the indirect objects hashed so far,
+            None while an object is being hashed, for reference cycles
+        :return:
+        """
+        if isinstance(pdf_object, pypdf.generic.IndirectObject):
+            reference = (pdf_object.idnum, pdf_object.generation)
+            if reference not in object_digests:
+                object_digests[reference] = None
+                object_digest = hashlib.sha256()
+                cls._digest_pdf_object(object_digest, pdf_object.get_object(), object_digests)
+                object_digests[reference] = object_digest.digest()
+            digest.update(object_digests[reference] or b"cycle")
+            return
+        if isinstance(pdf_object, bytes):
+            digest.update(b"b%d:" % len(pdf_object) + pdf_object)
+        elif isinstance(pdf_object, pypdf.generic.DictionaryObject):
+            digest.update(b"<<")
+            for key in sorted(pdf_object):
+                # a resource's /Parent leads back up the page tree, not to what the page draws
+                if key != "/Parent":
+                    digest.update(key.encode("utf-8"))
+                    cls._digest_pdf_object(digest, pdf_object.raw_get(key), object_digests)
+            digest.update(b">>")
+            if isinstance(pdf_object, pypdf.generic.StreamObject):
+                cls._digest_pdf_object(digest, pdf_object.get_data(), object_digests)
+        elif isinstance(pdf_object, pypdf.generic.ArrayObject):
+            digest.update(b"[")
+            for item in pdf_object:
+                cls._digest_pdf_object(digest, item, object_digests)
+            digest.update(b"]")
+        elif pdf_object is None:
+            digest.update(b"null")
+        else:
+            serialized = io.BytesIO()
+            pdf_object.write_to_stream(serialized)
+            digest.update(b"v%d:" % len(serialized.getvalue()) + serialized.getvalue())
+
+    @classmethod
+    def get_page_texts(cls, filepath: str, start_page: int = 1, end_page: int = None) -> list:
+        """
+        Extract the text of every page of a pdf, or a range of its pages, in a single pass
+
+        :param filepath:
+        :param start_page: first 1-based page to extract
+        :param end_page: last 1-based page to extract, inclusive, defaults to the last page
+        :return: a list of page text strings in page order, so page n is at index n - start_page
+        """
+        pages = cls.get_pages(filepath)
+        return [page.extract_text() for page in pages[start_page - 1:end_page]]
+
+    @classmethod
+    def write_pages(cls, filepath: str, page_targets: list):
+        """
+        Write selected pages of a pdf to their own single page files
+
+        :param filepath:
+        :param page_targets: a list of (page_number, target_filepath) tuples with 1-based page numbers
+        :return:
+        """
+        page_bytes = cls.iter_page_bytes(filepath, [page_number for page_number, _ in page_targets])
+        for (_, target_filepath), single_page_bytes in zip(page_targets, page_bytes):
+            with open(target_filepath, 'wb') as target_file:
+                target_file.write(single_page_bytes)
@@ -0,0 +1,137 @@
+import json
+import os
+import threading
+
+RUN_JOURNAL_PATH = '/home/pdfs/processing/run_journal.jsonl'
+
+# Page statuses
+TIME_CARD_PAGE = "time_card"
+DISCARDED_PAGE = "discarded"
+QUARANTINED_PAGE = "quarantined"
+
+
+class RunJournal:
+    """
+    Append-only record of the files and pages a run has finished, so an interrupted run can resume
+
+    Each line is a JSON entry, either the pages of a file written to the outbox since the last entry or
+    a whole file being done with its records.  Entries are keyed by file name and content hash, so a file
+    that changed since it was journaled is processed again.  A line cut short by a crash is ignored.
+    The journal is removed once the run finishes.
+
+    Usage:
+        journal = RunJournal(RUN_JOURNAL_PATH)
+        records = journal.completed_file(filepath, file_hash)
+        ...
+        journal.record_pages(filepath, file_hash, [{"page": 3, "status": TIME_CARD_PAGE, "record": {...}}])
+        journal.record_file(filepath, file_hash, [time_card.record for time_card in time_cards])
+        ...
+        journal.finish()
+    """
+
+    def __init__(self, journal_path: str = RUN_JOURNAL_PATH):
+        self.journal_path = journal_path
+        self._lock = threading.Lock()
+        # (file name, hash) -> records
+        self.files = {}
+        # (file name, hash) -> page number -> page entry
+        self.pages = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path) as journal_file:
+            for line in journal_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # written partially when the run stopped
+                    continue
+                key = (entry["file"], entry["hash"])
+                if "records" in entry:
+                    self.files[key] = entry["records"]
+                else:
+                    file_pages = self.pages.setdefault(key, {})
+                    for page_entry in entry["pages"]:
+                        file_pages[page_entry["page"]] = page_entry
+
+    @property
+    def is_resuming(self) -> bool:
+        return bool(self.files or self.pages)
+
+    @staticmethod
+    def _key(filepath: str, file_hash: str) -> tuple:
+        return os.path.basename(filepath), file_hash
+
+    def completed_file(self, filepath: str, file_hash: str):
+        """
+        :return: the records of a file the run already finished, None if it didn't
+        """
+        return self.files.get(self._key(filepath, file_hash))
+
+    def completed_pages(self, filepath: str, file_hash: str) -> dict:
+        """
+        :return: page number -> page entry for pages of the file the run already finished
+        """
+        return dict(self.pages.get(self._key(filepath, file_hash), {}))
+
+    def record_pages(self, filepath: str, file_hash: str, page_entries: list):
+        """
+        :param filepath:
+        :param file_hash:
+        :param page_entries: dicts with the page number as "page", its status and for time cards its record
+        :return:
+        """
+        if page_entries:
+            file_name, file_hash = self._key(filepath, file_hash)
+            self._append({"file": file_name, "hash": file_hash, "pages": page_entries})
+
+    def record_file(self, filepath: str, file_hash: str, records: list):
+        file_name, file_hash = self._key(filepath, file_hash)
+        self._append({"file": file_name, "hash": file_hash, "records": records})
+
+    def _append(self, entry: dict):
+        line = (json.dumps(entry) + "\n").encode("utf-8")
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.journal_path)), exist_ok=True)
+            # a single appending write, --jobs worker processes share the journal
+            journal_fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(journal_fd, line)
+                os.fsync(journal_fd)
+            finally:
+                os.close(journal_fd)
+
+    def finish(self):
+        """ Removes the journal, the next run starts from scratch """
+        with self._lock:
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self.files = {}
+            self.pages = {}
+
+
+_run_journal = None
+
+
+def configure_run_journal(journal_path: str = None, resume: bool = True):
+    """
+    Turns journaling on for a run, or off when journal_path is None
+
+    :param journal_path:
+    :param resume: continue from an existing journal, otherwise it is discarded
+    :return: the RunJournal, or None
+    """
+    global _run_journal
+    if journal_path is not None and not resume and os.path.exists(journal_path):
+        os.remove(journal_path)
+    _run_journal = RunJournal(journal_path) if journal_path is not None else None
+    return _run_journal
+
+
+def get_run_journal():
+    """
+    :return: the RunJournal of the current run, or None when journaling is off
+    """
+    return _run_journal
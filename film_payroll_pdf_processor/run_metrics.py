@@ -0,0 +1,306 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+RUN_REPORT_PATH = '/home/pdfs/processing/run_report.json'
+# stderr kept with each recorded failure
+FAILURE_OUTPUT_LIMIT = 2000
+
+# Operations
+EXTRACT_TEXT = "extract_text"
+PAGE_COUNT = "page_count"
+FINGERPRINT = "fingerprint"
+WRITE_PAGES = "write_pages"
+MERGE = "merge"
+COPY = "copy"
+MATCH = "match"
+# time card pages that couldn't be parsed and were quarantined
+PARSE = "parse"
+
+
+class Measurement:
+    """ Pages and bytes of one measured call, filled in by the caller once they are known """
+
+    def __init__(self, pages: int = 0, bytes_moved: int = 0):
+        self.pages = pages
+        self.bytes_moved = bytes_moved
+
+
+def _new_stats() -> dict:
+    return {"calls": 0, "failures": 0, "retries": 0, "seconds": 0.0, "pages": 0, "bytes": 0}
+
+
+class RunMetrics:
+    """
+    Collects durations, pages, bytes, failures and retries of backend calls, file copies and matching
+
+    Measurements are totalled per operation and per input file, the input file being whichever file
+    is being processed when the measurement is taken.  Seconds of calls running in parallel threads are
+    added together, so they can be more than the run's duration.
+
+    Usage:
+        metrics = get_run_metrics()
+        with metrics.input_file(filepath):
+            with metrics.measure(EXTRACT_TEXT) as measurement:
+                page_texts = backend.get_page_texts(filepath)
+                measurement.pages = len(page_texts)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.current_input_file = None
+        self.operations = {}
+        # input filename -> operation -> stats
+        self.files = {}
+        self.failures = []
+        # REVISED filename -> pages left as in the original and the cards that changed
+        self.revisions = {}
+        # near matches of leftover records, see PayrollProcess.print_near_match_report
+        self.near_matches = []
+
+    @contextmanager
+    def input_file(self, filepath: str):
+        """ Attributes measurements taken inside the block to an input file """
+        previous_input_file = self.current_input_file
+        self.current_input_file = os.path.basename(filepath)
+        try:
+            yield
+        finally:
+            self.current_input_file = previous_input_file
+
+    @contextmanager
+    def measure(self, operation: str, pages: int = 0, bytes_moved: int = 0):
+        """
+        Times the block, a block that raises is counted as a failure of the operation
+
+        :param operation: one of the operation constants
+        :param pages: pages handled, if known before the call
+        :param bytes_moved: bytes read or written, if known before the call
+        :return: a Measurement to set pages and bytes_moved on
+        """
+        measurement = Measurement(pages, bytes_moved)
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield measurement
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self._add(
+                operation,
+                calls=1,
+                failures=int(failed),
+                seconds=time.perf_counter() - start,
+                pages=measurement.pages,
+                bytes=measurement.bytes_moved,
+            )
+
+    def record_failure(self, operation: str, message: str, returncode: int = None, stderr: str = None):
+        """
+        Records a failed subprocess or worker call, also when processing carries on without raising
+
+        :param operation:
+        :param message:
+        :param returncode: exit code of the process, if it exited
+        :param stderr: what the process wrote to stderr, the end of it is kept
+        :return:
+        """
+        failure = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "operation": operation,
+            "input_file": self.current_input_file,
+            "message": message,
+            "returncode": returncode,
+            "stderr": stderr[-FAILURE_OUTPUT_LIMIT:] if stderr else stderr,
+        }
+        with self._lock:
+            self.failures.append(failure)
+        self._add(operation, failures=1)
+
+    def record_retry(self, operation: str):
+        """ Records a call that is being made again after a failure """
+        self._add(operation, retries=1)
+
+    def record_revision(self, filepath: str, unchanged_pages: int, changed_cards: list, added_cards: list):
+        """
+        Records what a REVISED file changed compared with its original batch
+
+        :param filepath:
+        :param unchanged_pages: pages that are the same as in the original, not processed again
+        :param changed_cards: output names of time cards the revision rewrote
+        :param added_cards: output names of time cards that weren't in the original
+        :return:
+        """
+        with self._lock:
+            self.revisions[os.path.basename(filepath)] = {
+                "unchanged_pages": unchanged_pages,
+                "changed_cards": list(changed_cards),
+                "added_cards": list(added_cards),
+            }
+
+    def record_near_matches(self, near_matches: list):
+        """
+        :param near_matches: time card and check copy output names, similarity score and whether they were merged
+        :return:
+        """
+        with self._lock:
+            self.near_matches = list(near_matches)
+
+    def failure_count(self, operation: str) -> int:
+        with self._lock:
+            return self.operations.get(operation, {}).get("failures", 0)
+
+    def _add(self, operation: str, **amounts):
+        with self._lock:
+            stats_list = [self.operations.setdefault(operation, _new_stats())]
+            if self.current_input_file is not None:
+                file_operations = self.files.setdefault(self.current_input_file, {})
+                stats_list.append(file_operations.setdefault(operation, _new_stats()))
+            for stats in stats_list:
+                for name, amount in amounts.items():
+                    stats[name] += amount
+
+    def state(self) -> dict:
+        """ Picklable totals, so --jobs worker processes can send them back with `merge` """
+        with self._lock:
+            return json.loads(json.dumps({
+                "operations": self.operations,
+                "files": self.files,
+                "failures": self.failures,
+                "revisions": self.revisions,
+            }))
+
+    def merge(self, state: dict):
+        """ Adds the totals of another RunMetrics `state` to this one """
+        with self._lock:
+            for operation, stats in state["operations"].items():
+                self._add_stats(self.operations.setdefault(operation, _new_stats()), stats)
+            for input_file, operations in state["files"].items():
+                file_operations = self.files.setdefault(input_file, {})
+                for operation, stats in operations.items():
+                    self._add_stats(file_operations.setdefault(operation, _new_stats()), stats)
+            self.failures.extend(state["failures"])
+            self.revisions.update(state["revisions"])
+
+    @staticmethod
+    def _add_stats(stats: dict, other_stats: dict):
+        for name, amount in other_stats.items():
+            stats[name] += amount
+
+    @staticmethod
+    def _report_stats(stats: dict) -> dict:
+        report_stats = dict(stats, seconds=round(stats["seconds"], 6))
+        if stats["pages"] and stats["seconds"]:
+            report_stats["pages_per_second"] = round(stats["pages"] / stats["seconds"], 2)
+        else:
+            report_stats["pages_per_second"] = None
+        return report_stats
+
+    def report(self) -> dict:
+        """
+        :return: the run report, totals per operation and per input file and every recorded failure, and what each
+            REVISED file changed and the near matches of unmatched records
+        """
+        finished = time.time()
+        with self._lock:
+            return {
+                "started": datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+                "finished": datetime.fromtimestamp(finished).isoformat(timespec="seconds"),
+                "duration_seconds": round(finished - self.started, 6),
+                "operations": {
+                    operation: self._report_stats(stats) for operation, stats in sorted(self.operations.items())
+                },
+                "files": {
+                    input_file: {
+                        "seconds": round(sum(stats["seconds"] for stats in operations.values()), 6),
+                        "operations": {
+                            operation: self._report_stats(stats) for operation, stats in sorted(operations.items())
+                        },
+                    }
+                    for input_file, operations in sorted(self.files.items())
+                },
+                "failures": list(self.failures),
+                "revisions": dict(sorted(self.revisions.items())),
+                "near_matches": list(self.near_matches),
+            }
+
+    def write_json_report(self, report_path: str = RUN_REPORT_PATH):
+        self._write_file(report_path, json.dumps(self.report(), indent=2))
+
+    def write_prometheus_textfile(self, textfile_path: str):
+        """
+        Writes the totals in the Prometheus text format, for the node_exporter textfile collector
+
+        :param textfile_path: should end in .prom
+        :return:
+        """
+        report = self.report()
+        lines = [
+            "# HELP payroll_run_duration_seconds Duration of the last payroll run.",
+            "# TYPE payroll_run_duration_seconds gauge",
+            f"payroll_run_duration_seconds {report['duration_seconds']}",
+            "# HELP payroll_run_finished_timestamp_seconds When the last payroll run finished.",
+            "# TYPE payroll_run_finished_timestamp_seconds gauge",
+            f"payroll_run_finished_timestamp_seconds {time.time():.0f}",
+        ]
+        for name, help_text in (
+                ("calls", "Calls of each operation."),
+                ("failures", "Failed calls of each operation."),
+                ("retries", "Calls of each operation made again after a failure."),
+                ("seconds", "Time spent in each operation."),
+                ("pages", "Pages handled by each operation."),
+                ("bytes", "Bytes read or written by each operation."),
+        ):
+            metric_name = f"payroll_operation_{name}"
+            lines.append(f"# HELP {metric_name} {help_text}")
+            lines.append(f"# TYPE {metric_name} gauge")
+            for operation, stats in report["operations"].items():
+                lines.append(f'{metric_name}{{operation="{operation}"}} {stats[name]}')
+            for input_file, file_report in report["files"].items():
+                for operation, stats in file_report["operations"].items():
+                    lines.append(
+                        f'{metric_name}{{operation="{operation}",file="{self._label_value(input_file)}"}} {stats[name]}'
+                    )
+        self._write_file(textfile_path, "\n".join(lines) + "\n")
+
+    @staticmethod
+    def _label_value(value: str) -> str:
+        return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+    @staticmethod
+    def _write_file(path: str, content: str):
+        # write then rename so readers never see a half written file
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        partial_path = path + ".partial"
+        with open(partial_path, "w") as output_file:
+            output_file.write(content)
+        os.replace(partial_path, path)
+
+
+_run_metrics = None
+
+
+def get_run_metrics() -> RunMetrics:
+    """
+    :return: the RunMetrics collecting measurements in this process
+    """
+    global _run_metrics
+    if _run_metrics is None:
+        _run_metrics = RunMetrics()
+    return _run_metrics
+
+
+def reset_run_metrics() -> RunMetrics:
+    """
+    Starts collecting measurements from scratch
+
+    :return: the new RunMetrics
+    """
+    global _run_metrics
+    _run_metrics = RunMetrics()
+    return _run_metrics
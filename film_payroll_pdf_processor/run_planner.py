@@ -0,0 +1,299 @@
+import json
+import math
+import os
+from pathlib import Path
+
+from film_payroll_pdf_processor.payroll_process import (
+    CHECK_COPIES_FILE,
+    REVISED_TIME_CARD_FILE,
+    TIME_CARD_FILE,
+    UNKNOWN_FILE,
+    PayrollProcess,
+    classify_inbox_file,
+    format_page_ranges,
+)
+from film_payroll_pdf_processor.pdf_backends import get_pdf_backend
+from film_payroll_pdf_processor.pdf_pages import invoice_number_from_filepath
+from film_payroll_pdf_processor.run_metrics import (
+    COPY,
+    EXTRACT_TEXT,
+    FINGERPRINT,
+    MERGE,
+    PAGE_COUNT,
+    RUN_REPORT_PATH,
+    WRITE_PAGES,
+)
+
+# Used for operations the last run report doesn't have, roughly PDFBox started once per call
+DEFAULT_SECONDS_PER_CALL = 1.5
+DEFAULT_SECONDS_PER_PAGE = 0.05
+
+
+class PlannedFile:
+    """ An inbox file as the run would handle it, with the backend calls it would take """
+
+    def __init__(self, filename: str, file_type: str):
+        self.filename = filename
+        self.file_type = file_type
+        self.page_count = None
+        # operation -> {"calls": ..., "pages": ...}
+        self.operations = {}
+        self.problems = []
+
+    def add_calls(self, operation: str, calls: int, pages: int = 0):
+        if calls:
+            stats = self.operations.setdefault(operation, {"calls": 0, "pages": 0})
+            stats["calls"] += calls
+            stats["pages"] += pages
+
+
+class RunPlanner:
+    """
+    Dry run of a PDF Inbox: classifies every file the way `run.py` does, counts each pdf's pages with the
+    PDF backend, checks the check copy lists and estimates the backend calls and runtime of the run
+
+    Estimates are upper bounds for pages the extraction cache or the run journal already has.  Runtime is
+    estimated from the seconds per page, or per call, of each operation in the last run report.
+
+    Usage:
+        RunPlanner(inbox_folder_path, jobs=4).print_plan()
+    """
+
+    def __init__(
+            self,
+            inbox_folder_path: str,
+            jobs: int = 1,
+            page_threads: int = 1,
+            use_cache: bool = True,
+            report_path: str = RUN_REPORT_PATH,
+    ):
+        """
+        :param inbox_folder_path:
+        :param jobs: worker processes of the planned run's first pass
+        :param page_threads: threads extracting the pages of a single time card file
+        :param use_cache: the planned run uses the extraction cache, so time card pages are fingerprinted
+        :param report_path: run report of a previous run to take operation rates from
+        """
+        self.inbox_folder_path = inbox_folder_path
+        self.jobs = jobs
+        self.page_threads = page_threads
+        self.use_cache = use_cache
+        self.report_path = report_path
+
+    def plan(self) -> list:
+        """
+        :return: a PlannedFile for every inbox file, first pass files then revisions then skipped files,
+            like the run handles them
+        """
+        filenames = sorted(os.listdir(self.inbox_folder_path))
+        first_pass_files = []
+        revision_files = []
+        skipped_files = []
+        for filename in filenames:
+            file_type = classify_inbox_file(filename)
+            planned_file = PlannedFile(filename, file_type)
+            if file_type == TIME_CARD_FILE:
+                self._plan_time_card_file(planned_file)
+                first_pass_files.append(planned_file)
+            elif file_type == CHECK_COPIES_FILE:
+                self._plan_check_copies_file(planned_file)
+                first_pass_files.append(planned_file)
+            elif file_type == REVISED_TIME_CARD_FILE:
+                revision_files.append(planned_file)
+            elif file_type == UNKNOWN_FILE:
+                planned_file.problems.append("not identified, the run skips it")
+                skipped_files.append(planned_file)
+        for planned_file in revision_files:
+            self._plan_revision_file(planned_file, filenames)
+        return first_pass_files + revision_files + skipped_files
+
+    def _read_page_count(self, planned_file: PlannedFile) -> bool:
+        try:
+            planned_file.page_count = self._page_count(planned_file.filename)
+        except Exception as error:
+            planned_file.problems.append(f"page count couldn't be read: {type(error).__name__}: {error}")
+            return False
+        return True
+
+    def _page_count(self, filename: str) -> int:
+        # the backend the run uses, so the planned pages are the pages the run sees
+        return get_pdf_backend().get_page_count(os.path.join(self.inbox_folder_path, filename))
+
+    def _plan_time_card_file(self, planned_file: PlannedFile, changed_pages: int = None):
+        if planned_file.page_count is None and not self._read_page_count(planned_file):
+            return
+        planned_file.add_calls(COPY, 1)
+        pages = planned_file.page_count if changed_pages is None else changed_pages
+        chunk_size = max(1, PayrollProcess.PAGE_EXTRACTION_CHUNK_SIZE)
+        if self.use_cache:
+            planned_file.add_calls(FINGERPRINT, 1, planned_file.page_count)
+        if self.use_cache or self.page_threads > 1 or changed_pages is not None:
+            # pages are extracted in chunks once the run has page numbers to pick from
+            if not self.use_cache:
+                planned_file.add_calls(PAGE_COUNT, 1)
+            planned_file.add_calls(EXTRACT_TEXT, math.ceil(pages / chunk_size), pages)
+        else:
+            planned_file.add_calls(EXTRACT_TEXT, 1, pages)
+        # END of BATCH and summary pages aren't written, so this is at most
+        planned_file.add_calls(WRITE_PAGES, math.ceil(pages / max(1, PayrollProcess.PAGE_WRITE_BATCH_SIZE)), pages)
+
+    def _plan_revision_file(self, planned_file: PlannedFile, filenames: list):
+        invoice_number = invoice_number_from_filepath(planned_file.filename)
+        originals = [
+            filename
+            for filename in filenames
+            if classify_inbox_file(filename) == TIME_CARD_FILE and invoice_number_from_filepath(filename) == invoice_number
+        ]
+        if invoice_number is None or not originals:
+            planned_file.problems.append("no original batch for its invoice, every page is processed")
+            self._plan_time_card_file(planned_file)
+            return
+        if not self._read_page_count(planned_file):
+            return
+        # fingerprints of the revision and its originals find the unchanged pages, at worst none are
+        original_pages = 0
+        for original in originals:
+            try:
+                original_pages += self._page_count(original)
+            except Exception:
+                pass
+        planned_file.add_calls(FINGERPRINT, 1 + len(originals), planned_file.page_count + original_pages)
+        self._plan_time_card_file(planned_file, changed_pages=planned_file.page_count)
+
+    def _plan_check_copies_file(self, planned_file: PlannedFile):
+        filepath = os.path.join(self.inbox_folder_path, planned_file.filename)
+        check_copy_list_path = filepath.replace(".pdf", ".txt")
+        if not self._read_page_count(planned_file):
+            return
+        planned_file.add_calls(COPY, 1)
+        planned_file.add_calls(PAGE_COUNT, 1)
+        if not Path(check_copy_list_path).exists():
+            planned_file.problems.append(f"no check list, need {os.path.basename(check_copy_list_path)}")
+            return
+
+        listed_pages = set()
+        out_of_range_pages = set()
+        duplicate_pages = set()
+        for check_copy in PayrollProcess.read_check_copy_list(check_copy_list_path):
+            if not check_copy.page_number.isdigit():
+                planned_file.problems.append(
+                    f"check list page '{check_copy.page_number}' of {check_copy.payee_last_name} isn't a number"
+                )
+                continue
+            page_number = int(check_copy.page_number)
+            if page_number in listed_pages:
+                duplicate_pages.add(page_number)
+            elif page_number < 1 or page_number > planned_file.page_count:
+                out_of_range_pages.add(page_number)
+            listed_pages.add(page_number)
+        if out_of_range_pages:
+            planned_file.problems.append(
+                f"listed pages not in the {planned_file.page_count} page package: "
+                f"{format_page_ranges(sorted(out_of_range_pages))}"
+            )
+        if duplicate_pages:
+            planned_file.problems.append(
+                f"pages listed more than once, the first record gets the page: "
+                f"{format_page_ranges(sorted(duplicate_pages))}"
+            )
+        pages = len(listed_pages - out_of_range_pages)
+        planned_file.add_calls(WRITE_PAGES, math.ceil(pages / max(1, PayrollProcess.PAGE_WRITE_BATCH_SIZE)), pages)
+
+    def operation_rates(self) -> dict:
+        """
+        :return: operation -> (seconds per page or None, seconds per call) from the last run report, for
+            operations it measured
+        """
+        if not self.report_path or not os.path.exists(self.report_path):
+            return {}
+        try:
+            with open(self.report_path) as report_file:
+                operations = json.load(report_file)["operations"]
+        except (OSError, ValueError, KeyError):
+            return {}
+        rates = {}
+        for operation, stats in operations.items():
+            if stats["calls"]:
+                seconds_per_page = stats["seconds"] / stats["pages"] if stats["pages"] else None
+                rates[operation] = (seconds_per_page, stats["seconds"] / stats["calls"])
+        return rates
+
+    @staticmethod
+    def estimate_seconds(operations: dict, rates: dict) -> float:
+        seconds = 0.0
+        for operation, stats in operations.items():
+            seconds_per_page, seconds_per_call = rates.get(operation, (DEFAULT_SECONDS_PER_PAGE, DEFAULT_SECONDS_PER_CALL))
+            if seconds_per_page is not None and stats["pages"]:
+                seconds += stats["pages"] * seconds_per_page
+            else:
+                seconds += stats["calls"] * seconds_per_call
+        return seconds
+
+    def print_plan(self) -> list:
+        """
+        Prints how the run would handle each inbox file, problems to fix before running and the estimates
+
+        :return: the PlannedFile list
+        """
+        planned_files = self.plan()
+        rates = self.operation_rates()
+        print(f"Run plan for {self.inbox_folder_path}")
+        if rates:
+            print(f" - Runtime estimated from the run report {self.report_path}")
+        else:
+            print(" - No previous run report, runtime estimated from rough PDFBox figures")
+
+        total_operations = {}
+        first_pass_seconds = []
+        serial_seconds = 0.0
+        time_card_pages = 0
+        check_copy_pages = 0
+        for planned_file in planned_files:
+            seconds = self.estimate_seconds(planned_file.operations, rates)
+            if EXTRACT_TEXT in planned_file.operations:
+                # chunks of a single file are extracted in parallel with --page-threads
+                extract_seconds = self.estimate_seconds({EXTRACT_TEXT: planned_file.operations[EXTRACT_TEXT]}, rates)
+                threads = min(self.page_threads, planned_file.operations[EXTRACT_TEXT]["calls"])
+                seconds -= extract_seconds - extract_seconds / max(1, threads)
+            details = []
+            if planned_file.page_count is not None:
+                details.append(f"{planned_file.page_count} pages")
+            if planned_file.operations:
+                details.append(f"~{seconds:.1f}s")
+            print(f"\n{planned_file.file_type}: {planned_file.filename}" + (f" ({', '.join(details)})" if details else ""))
+            for problem in planned_file.problems:
+                print(f" - WARNING: {problem}")
+            for operation, stats in sorted(planned_file.operations.items()):
+                total_stats = total_operations.setdefault(operation, {"calls": 0, "pages": 0})
+                total_stats["calls"] += stats["calls"]
+                total_stats["pages"] += stats["pages"]
+            if planned_file.file_type in (TIME_CARD_FILE, CHECK_COPIES_FILE):
+                first_pass_seconds.append(seconds)
+            else:
+                serial_seconds += seconds
+            if planned_file.file_type == TIME_CARD_FILE:
+                time_card_pages += planned_file.operations.get(WRITE_PAGES, {"pages": 0})["pages"]
+            elif planned_file.file_type == CHECK_COPIES_FILE:
+                check_copy_pages += planned_file.operations.get(WRITE_PAGES, {"pages": 0})["pages"]
+
+        # every pair is merged in one batch, at most as many pairs as the smaller side
+        merged_pairs = min(time_card_pages, check_copy_pages)
+        if merged_pairs:
+            merge_operations = {MERGE: {"calls": 1, "pages": 2 * merged_pairs}}
+            total_operations[MERGE] = merge_operations[MERGE]
+            serial_seconds += self.estimate_seconds(merge_operations, rates)
+
+        print("\nBackend calls:")
+        for operation, stats in sorted(total_operations.items()):
+            print(f" - {operation}: {stats['calls']} calls, {stats['pages']} pages")
+        print(f" - total: {sum(stats['calls'] for stats in total_operations.values())} calls")
+        serial_total = sum(first_pass_seconds) + serial_seconds
+        print(f"\nEstimated runtime: ~{serial_total:.0f}s with --jobs 1")
+        if self.jobs > 1 and len(first_pass_seconds) > 1:
+            # first pass files are spread over the workers, revisions and the merge run after them
+            parallel_first_pass = max(max(first_pass_seconds), sum(first_pass_seconds) / self.jobs)
+            print(f" - ~{parallel_first_pass + serial_seconds:.0f}s with --jobs {self.jobs}")
+        problem_count = sum(len(planned_file.problems) for planned_file in planned_files)
+        if problem_count:
+            print(f" - WARNING: {problem_count} problems to look at before running")
+        return planned_files
@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+
+from film_payroll_pdf_processor.run_metrics import COPY, get_run_metrics
+
+
+def link_or_copy(source_path: str, target_path: str):
+    """ Hardlinks a file, copying it instead when the paths are on different filesystems """
+    with get_run_metrics().measure(COPY, bytes_moved=os.path.getsize(source_path)):
+        try:
+            os.link(source_path, target_path)
+        except OSError:
+            shutil.copyfile(source_path, target_path)
+
+
+def spill_text(workspace_filepath: str, filename: str, text: str) -> str:
+    """
+    Writes text to a file next to a file in a scratch workspace, so it's removed with the workspace
+
+    :param workspace_filepath: e.g. a workspace's `input_path`
+    :param filename:
+    :param text:
+    :return: the path of the text file
+    """
+    text_path = os.path.join(os.path.dirname(workspace_filepath), filename)
+    with open(text_path, 'w', encoding='utf-8') as text_file:
+        text_file.write(text)
+    return text_path
+
+
+class ScratchWorkspace:
+    """
+    A private temporary directory for processing one input file, removed on exit even after an exception
+
+    Usage:
+        with ScratchWorkspace(filepath, PROCESSING_FOLDER_PATH) as workspace:
+            backend.write_pages(workspace.input_path, [(1, first_page_path)])
+    """
+
+    INPUT_NAME = "input"
+
+    def __init__(self, source_filepath: str, parent_directory: str = None):
+        """
+        :param source_filepath: the file to process, linked into the workspace as `input_path`
+        :param parent_directory: where the workspace directory is created, defaults to the system temp directory
+        """
+        self.source_filepath = source_filepath
+        self.parent_directory = parent_directory
+        self.path = None
+        self.input_path = None
+
+    def __enter__(self):
+        if self.parent_directory is not None:
+            # e.g. a processing folder given with --processing that doesn't exist yet
+            os.makedirs(self.parent_directory, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix="payroll-", dir=self.parent_directory)
+        self.input_path = os.path.join(self.path, f"{self.INPUT_NAME}.pdf")
+        try:
+            link_or_copy(self.source_filepath, self.input_path)
+        except BaseException:
+            self.cleanup()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
+        return False
+
+    def cleanup(self):
+        if self.path is not None:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.path = None
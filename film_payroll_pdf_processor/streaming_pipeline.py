@@ -0,0 +1,115 @@
+import os
+
+from film_payroll_pdf_processor.matching import MatchingEngine, MatchResult
+from film_payroll_pdf_processor.payroll_process import (
+    PayrollProcess,
+    TIME_CARD_FILE,
+    REVISED_TIME_CARD_FILE,
+    CHECK_COPIES_FILE,
+)
+
+MERGE_BATCH_SIZE = 25
+
+
+class StreamingPipeline:
+    """
+    Streams inbox files through split -> extract -> classify -> name/write -> match -> merge
+
+    Records are matched as soon as they are written, and matched pairs are merged in batches of
+    merge_batch_size or at the end of each input file, so the first merged files appear while the rest
+    of the inbox is still being processed.  Only unmatched records are held in memory.
+
+    REVISED files still run after every original.  A time card the revision changed that was already
+    merged is merged again so the final file has the revision, unchanged pages of a revision are skipped.
+
+    Multiple checks for the same payee are numbered in the order their pairs are matched.  Time card
+    batches (WE_...) come before check copies packages in name order, so their checks are numbered in
+    check list order, where a batch run numbers them in time card order.  The pairs are the same, only
+    which merged file gets -02, -03... can differ.  Everything else in the outbox is the same as a batch run.
+    """
+
+    def __init__(self, merge_batch_size: int = MERGE_BATCH_SIZE):
+        self.merge_batch_size = max(1, merge_batch_size)
+        self.engine = MatchingEngine(keep_matched_pairs=False)
+        # time card output name -> MatchedPair, so revisions can be merged again
+        self.merged_pairs = {}
+        self.merged_count = 0
+        self._pending_merges = []
+        # output names of every record read, only merges of these records can be stale
+        self.time_card_names = set()
+        self.check_copy_names = set()
+
+    def run(self, first_pass_files: list, revision_files: list) -> MatchResult:
+        """
+        :param first_pass_files: (file type, filepath) tuples of time card and check copies files
+        :param revision_files: filepaths of REVISED time card files
+        :return: every merged pair and what was left unmatched
+        """
+        print("\nStreaming inbox files, merged files are written as matches are found")
+        files = list(first_pass_files) + [(REVISED_TIME_CARD_FILE, filepath) for filepath in revision_files]
+        for file_type, filepath in files:
+            for record in self._iter_file_records(file_type, filepath):
+                self._add_record(file_type, record)
+            self._flush_merges()
+
+        # leftovers that only differ by a typo or a middle name
+        for near_match in self.engine.match_near_misses(PayrollProcess.MERGE_NEAR_MATCHES):
+            if near_match.pair is not None:
+                self.merged_pairs[near_match.time_card.output_file_name] = near_match.pair
+                self._pending_merges.append(near_match.pair)
+        self._flush_merges()
+        PayrollProcess.remove_stale_merges(
+            list(self.merged_pairs.values()), self.time_card_names, self.check_copy_names
+        )
+
+        unmatched = self.engine.result()
+        match_result = MatchResult(
+            matched_pairs=list(self.merged_pairs.values()),
+            unmatched_time_cards=unmatched.unmatched_time_cards,
+            unmatched_check_copies=unmatched.unmatched_check_copies,
+            near_matches=unmatched.near_matches,
+        )
+        print(f"\nMerged {self.merged_count} files")
+        PayrollProcess.print_unmatched_report(match_result)
+        return match_result
+
+    @staticmethod
+    def _iter_file_records(file_type: str, filepath: str):
+        filename = os.path.basename(filepath)
+        if file_type == CHECK_COPIES_FILE:
+            print(f"\nDetected PDF file for processing, processing as Check Copies package: {filename}")
+            return PayrollProcess.iter_multi_page_check_copies_package(filepath)
+        if file_type == REVISED_TIME_CARD_FILE:
+            print(f"\nDetected *Revised* TimeCards file for processing: {filename}")
+            return PayrollProcess.iter_multi_page_time_card(filepath, is_revision=True)
+        print(f"\nDetected TimeCards file for processing: {filename}")
+        return PayrollProcess.iter_multi_page_time_card(filepath)
+
+    def _add_record(self, file_type: str, record):
+        if file_type == CHECK_COPIES_FILE:
+            self.check_copy_names.add(record.output_file_name)
+        else:
+            self.time_card_names.add(record.output_file_name)
+        if file_type == TIME_CARD_FILE:
+            pair = self.engine.add_time_card(record)
+        elif file_type == CHECK_COPIES_FILE:
+            pair = self.engine.add_check_copy(record)
+        else:
+            # the revision overwrote this time card's outbox file
+            pair = self.merged_pairs.get(record.output_file_name)
+            if pair is not None:
+                print(f"   - Revised time card, merging again: {pair.merged_output_name}")
+        if pair is None:
+            return
+        if file_type != REVISED_TIME_CARD_FILE:
+            print(f"- {pair.time_card.output_file_name} <matched> {pair.check_copy.output_file_name}")
+            self.merged_pairs[pair.time_card.output_file_name] = pair
+        self._pending_merges.append(pair)
+        if len(self._pending_merges) >= self.merge_batch_size:
+            self._flush_merges()
+
+    def _flush_merges(self):
+        if self._pending_merges:
+            PayrollProcess.merge_matched_pairs(self._pending_merges)
+            self.merged_count += len(self._pending_merges)
+            self._pending_merges = []
@@ -1,62 +1,573 @@
+import argparse
+import multiprocessing
+import multiprocessing.connection
 import os
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stderr, redirect_stdout
 
+from film_payroll_pdf_processor.extraction_cache import configure_extraction_cache
+from film_payroll_pdf_processor.inbox_watcher import InboxWatcher, WATCH_POLL_INTERVAL_SECONDS
+from film_payroll_pdf_processor.job_queue import JOB_QUEUE_PATH, RUNNING, JobQueue, job_log_folder_path
+from film_payroll_pdf_processor.outbox_archive import ARCHIVE_MODES, ARCHIVE_PER_FOLDER, OutboxArchive, week_name
+from film_payroll_pdf_processor.output_name_registry import (
+    OutputNameRegistry,
+    get_output_name_registry,
+    set_output_name_registry,
+)
+from film_payroll_pdf_processor.pdf_backends import get_pdf_backend, set_pdf_backend
+from film_payroll_pdf_processor.run_journal import RUN_JOURNAL_PATH, configure_run_journal
+from film_payroll_pdf_processor.run_metrics import PARSE, RUN_REPORT_PATH, get_run_metrics, reset_run_metrics
+from film_payroll_pdf_processor.run_planner import RunPlanner
+from film_payroll_pdf_processor.streaming_pipeline import StreamingPipeline
 from film_payroll_pdf_processor.payroll_process import (
     PayrollProcess,
-    INBOX_FOLDER_PATH,
+    OUTBOX_CHECK_COPY_FOLDER,
+    OUTBOX_MERGE_FOLDER,
+    OUTBOX_QUARANTINE_FOLDER,
+    OUTBOX_TIME_CARD_FOLDER,
+    TIME_CARD_FILE,
+    REVISED_TIME_CARD_FILE,
+    CHECK_COPIES_FILE,
+    UNKNOWN_FILE,
+    classify_inbox_file,
 )
 
 
-def main():
+def configure_processing(
+        backend,
+        page_threads: int,
+        ordered_pages: bool,
+        use_cache: bool,
+        production_settings: tuple = None,
+        journal_path: str = None,
+        outbox_archive: OutboxArchive = None,
+        output_name_registry: OutputNameRegistry = None,
+        pending_output_names: bool = False,
+):
+    """
+    Applies processing settings, in this process and in each --jobs worker process
+
+    :param backend: PDF backend name or class
+    :param page_threads: threads extracting pages of a single file concurrently
+    :param ordered_pages: classify pages in page order
+    :param use_cache: reuse extraction results for unchanged PDFs and pages from previous runs
+    :param production_settings: PayrollProcess.production_settings() of the production being processed
+    :param journal_path: run journal of the run, None for no journal
+    :param outbox_archive: the run's OutboxArchive, None for loose outbox files
+    :param output_name_registry: the run's OutputNameRegistry, this process's by default
+    :param pending_output_names: write pages under a pending name, for the run's process to name, as --jobs
+        worker processes do
+    """
+    set_pdf_backend(backend)
+    configure_extraction_cache(enabled=use_cache)
+    PayrollProcess.PAGE_EXTRACTION_THREADS = page_threads
+    PayrollProcess.PAGE_EXTRACTION_ORDERED = ordered_pages
+    if production_settings is not None:
+        PayrollProcess.configure_production(*production_settings)
+    configure_run_journal(journal_path)
+    PayrollProcess.OUTBOX_ARCHIVE = outbox_archive
+    if output_name_registry is not None:
+        set_output_name_registry(output_name_registry)
+    PayrollProcess.PENDING_OUTPUT_NAMES = pending_output_names
+
+
+def process_inbox_file(file_type: str, filename: str) -> list:
+    """
+    Processes a single first pass file from the PDF Inbox, runs in worker processes when --jobs > 1
+
+    :param file_type: TIME_CARD_FILE or CHECK_COPIES_FILE
+    :param filename:
+    :return: the TimeCardPDFPage or CheckCopyPDFPage list for the file
+    """
+    filepath = os.path.join(PayrollProcess.INBOX_FOLDER_PATH, filename)
+    if file_type == TIME_CARD_FILE:
+        print(f"\nDetected TimeCards file for processing: {filename}")
+        return PayrollProcess.process_multi_page_time_card(filepath)
+    print(f"\nDetected PDF file for processing, processing as Check Copies package: {filename}")
+    return PayrollProcess.process_multi_page_check_copies_package(filepath)
+
+
+def process_inbox_file_in_worker(file_type: str, filename: str) -> tuple:
+    """
+    Runs process_inbox_file in a --jobs worker process
+
+    :return: the pages and the worker's run metrics state for this file
+    """
+    run_metrics = reset_run_metrics()
+    pages = process_inbox_file(file_type, filename)
+    return pages, run_metrics.state()
+
+
+def main(
+        jobs: int = 1,
+        page_threads: int = 1,
+        ordered_pages: bool = True,
+        use_cache: bool = True,
+        stream: bool = False,
+        report_path: str = RUN_REPORT_PATH,
+        prometheus_textfile_path: str = None,
+        inbox_folder_path: str = None,
+        outbox_folder_path: str = None,
+        production_code: str = None,
+        journal_path: str = RUN_JOURNAL_PATH,
+        resume: bool = True,
+        merge_near_matches: bool = False,
+        merge_all: bool = False,
+        outbox_archive_mode: str = None,
+        processing_folder_path: str = None,
+):
     """
     Iterates through pdfs in the PDF Inbox, processing check copies and time cards
+
+    :param jobs: number of worker processes for the first pass, 1 processes every file in this process
+    :param page_threads: threads extracting the pages of a single time card file concurrently
+    :param ordered_pages: classify pages in page order so results match a serial run
+    :param use_cache: reuse extraction results for unchanged PDFs and pages from previous runs
+    :param stream: match and merge records as they are written instead of after every file is processed
+    :param report_path: where to write the JSON run report, None to skip it
+    :param prometheus_textfile_path: where to write the run metrics in the Prometheus text format, if anywhere
+    :param inbox_folder_path: the production's PDF Inbox, the configured one by default
+    :param outbox_folder_path: the production's outbox, the configured one by default
+    :param production_code: prefix of merged file names, the configured one by default
+    :param journal_path: where to journal finished files and pages so an interrupted run can resume, None
+        for no journal
+    :param resume: continue an interrupted run from its journal, otherwise start from scratch
+    :param merge_near_matches: merge leftover records whose names are almost the same instead of only
+        suggesting them
+    :param merge_all: merge every pair again, also when its time card and check copy haven't changed since
+        its merged file was written
+    :param outbox_archive_mode: ARCHIVE_PER_WEEK or ARCHIVE_PER_FOLDER to stream the outbox pdfs into ZIP
+        archives, None for loose files
+    :param processing_folder_path: where scratch workspaces are made and state is kept between runs, the
+        configured one by default
     """
+    PayrollProcess.configure_production(inbox_folder_path, outbox_folder_path, production_code, processing_folder_path)
+    PayrollProcess.MERGE_NEAR_MATCHES = merge_near_matches
+    PayrollProcess.INCREMENTAL_MERGE = not merge_all
+    run_metrics = reset_run_metrics()
+    # names claimed by earlier runs can be taken over once their outbox file is gone
+    get_output_name_registry(PayrollProcess.PROCESSING_FOLDER_PATH).start_run()
+    journal = configure_run_journal(journal_path, resume)
+    if journal is not None and journal.is_resuming:
+        print(f"Resuming the interrupted run in {journal_path}")
+    outbox_archive = None
+    if outbox_archive_mode is not None:
+        outbox_archive = OutboxArchive(
+            PayrollProcess.OUTBOX_FOLDER_PATH,
+            PayrollProcess.PROCESSING_FOLDER_PATH,
+            week_name(PayrollProcess.INBOX_FOLDER_PATH),
+            (OUTBOX_TIME_CARD_FOLDER, OUTBOX_CHECK_COPY_FOLDER, OUTBOX_MERGE_FOLDER),
+            per_folder=outbox_archive_mode == ARCHIVE_PER_FOLDER,
+        )
+        outbox_archive.open()
+    try:
+        process_inbox(jobs, page_threads, ordered_pages, use_cache, stream, journal_path, outbox_archive)
+        if outbox_archive is not None:
+            print("\nOutbox archived to:")
+            for archive_path in outbox_archive.close():
+                print(f" - {archive_path}")
+        if journal is not None:
+            journal.finish()
+    finally:
+        if outbox_archive is not None:
+            # the staged files of an interrupted run are archived when it resumes
+            outbox_archive.abandon()
+            PayrollProcess.OUTBOX_ARCHIVE = None
+        if report_path:
+            run_metrics.write_json_report(report_path)
+            print(f"\nRun report written to {report_path}")
+        if prometheus_textfile_path:
+            run_metrics.write_prometheus_textfile(prometheus_textfile_path)
+
+
+def process_inbox(
+        jobs: int,
+        page_threads: int,
+        ordered_pages: bool,
+        use_cache: bool,
+        stream: bool,
+        journal_path: str = None,
+        outbox_archive: OutboxArchive = None,
+):
+    """ Processes the PDF Inbox, see `main` """
+    processing_settings = (
+        get_pdf_backend(),
+        page_threads,
+        ordered_pages,
+        use_cache,
+        PayrollProcess.production_settings(),
+        journal_path,
+        outbox_archive,
+        get_output_name_registry(PayrollProcess.PROCESSING_FOLDER_PATH),
+    )
+    configure_processing(*processing_settings)
+    PayrollProcess.create_outbox_folders()
+    inbox_folder_path = PayrollProcess.INBOX_FOLDER_PATH
 
     unmatched_time_cards = []
     unmatched_check_copies = []
 
-    # First pass, do all
-    for filename in os.listdir(INBOX_FOLDER_PATH):
-        # File Type Detection
-        if filename.endswith(".pdf") and filename.startswith("WE_") and "REVISED" not in filename:
-            print(f"\nDetected TimeCards file for processing: {filename}")
-            unmatched_time_cards = unmatched_time_cards + \
-                PayrollProcess.process_multi_page_time_card(
-                    os.path.join(INBOX_FOLDER_PATH, filename)
-                )
-        elif filename.endswith(".pdf") and not filename.startswith("WE_"):
-            print(f"\nDetected PDF file for processing, processing as Check Copies package: {filename}")
-            unmatched_check_copies = unmatched_check_copies + \
-                PayrollProcess.process_multi_page_check_copies_package(
-                    os.path.join(INBOX_FOLDER_PATH, filename)
-                )
-        elif filename.endswith(".txt") or filename == ".gitkeep" or "REVISED" in filename:
-            # Text files are picked up with their PDFs
+    # Files are handled in name order so results, and duplicate marking, don't depend on directory order
+    first_pass_files = []
+    revision_files = []
+    for filename in sorted(os.listdir(inbox_folder_path)):
+        file_type = classify_inbox_file(filename)
+        if file_type in (TIME_CARD_FILE, CHECK_COPIES_FILE):
+            first_pass_files.append((file_type, filename))
+        elif file_type == REVISED_TIME_CARD_FILE:
             # Revisions handled in second pass
-            # .gitkeep should be ignored
-            pass
-        else:
+            revision_files.append(filename)
+        elif file_type == UNKNOWN_FILE:
             print(f"\nSKIPPING: File found but not identified: {filename}")
 
+    if stream:
+        if jobs > 1:
+            print("\n--stream processes files in this process, ignoring --jobs")
+        StreamingPipeline().run(
+            [(file_type, os.path.join(inbox_folder_path, filename)) for file_type, filename in first_pass_files],
+            [os.path.join(inbox_folder_path, filename) for filename in revision_files],
+        )
+        print_quarantine_summary()
+        return
+
+    # First pass, do all
+    if jobs > 1 and len(first_pass_files) > 1:
+        print(f"\nProcessing {len(first_pass_files)} files with {jobs} worker processes")
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=configure_processing,
+            initargs=processing_settings + (True,)
+        ) as executor:
+            futures = [
+                (file_type, filename, executor.submit(process_inbox_file_in_worker, file_type, filename))
+                for file_type, filename in first_pass_files
+            ]
+            # Results are collected in submission order, not completion order
+            first_pass_results = []
+            for file_type, filename, future in futures:
+                pages, worker_metrics_state = future.result()
+                get_run_metrics().merge(worker_metrics_state)
+                # named in inbox file order, so duplicates are marked as in a serial run
+                PayrollProcess.name_pending_pages(file_type, os.path.join(inbox_folder_path, filename), pages)
+                if outbox_archive is not None:
+                    # workers only stage their pages
+                    outbox_archive.sync()
+                first_pass_results.append((file_type, pages))
+    else:
+        first_pass_results = [
+            (file_type, process_inbox_file(file_type, filename))
+            for file_type, filename in first_pass_files
+        ]
+    for file_type, pages in first_pass_results:
+        if file_type == TIME_CARD_FILE:
+            unmatched_time_cards.extend(pages)
+        else:
+            unmatched_check_copies.extend(pages)
+
     # Revision pass
-    # First pass, do only revisions
+    # Runs after every original has been written so revisions overwrite them
     revised_time_cards = []
-    for filename in os.listdir(INBOX_FOLDER_PATH):
-        if filename.endswith(".pdf") and filename.startswith("WE_") and "REVISED" in filename:
-            print(f"\nDetected *Revised* TimeCards file for processing: {filename}")
-            revised_time_cards = revised_time_cards + \
-                PayrollProcess.process_multi_page_time_card(
-                    os.path.join(INBOX_FOLDER_PATH, filename), is_revision=True
-                )
+    for filename in revision_files:
+        print(f"\nDetected *Revised* TimeCards file for processing: {filename}")
+        revised_time_cards.extend(
+            PayrollProcess.process_multi_page_time_card(
+                os.path.join(inbox_folder_path, filename), is_revision=True
+            )
+        )
 
     print(f"\nFiles written:")
     print(f" - wrote {len(unmatched_time_cards)} time cards")
     print(f" - wrote {len(revised_time_cards)} check copies REVISIONS")
     print(f" - wrote {len(unmatched_check_copies)} check copies")
+    print_quarantine_summary()
     PayrollProcess.match_time_cards_to_check_copies(
         unmatched_time_cards,
         unmatched_check_copies
     )
 
 
+def print_quarantine_summary():
+    quarantined_page_count = get_run_metrics().failure_count(PARSE)
+    if quarantined_page_count:
+        quarantine_folder_path = os.path.join(PayrollProcess.OUTBOX_FOLDER_PATH, OUTBOX_QUARANTINE_FOLDER)
+        print(f" - WARNING: quarantined {quarantined_page_count} pages that couldn't be parsed in {quarantine_folder_path}")
+
+
+def run_queued_job(job: dict, job_queue_path: str, backend, jobs: int, page_threads: int, ordered_pages: bool, use_cache: bool):
+    """
+    Processes one queued job in its own worker process, so a crash or leftover state only affects that job
+
+    Everything the job prints goes to the job's log, its run report to the job's report path.
+
+    :param job: a claimed job, see JobQueue.claim_job
+    :param job_queue_path:
+    :param backend: PDF backend name or class
+    :param jobs: worker processes for the job's first pass
+    :param page_threads:
+    :param ordered_pages:
+    :param use_cache:
+    :return:
+    """
+    job_queue = JobQueue(job_queue_path)
+    os.makedirs(os.path.dirname(job["log_path"]), exist_ok=True)
+    with open(job["log_path"], "w") as log_file, redirect_stdout(log_file), redirect_stderr(log_file):
+        try:
+            set_pdf_backend(backend)
+            main(
+                jobs=jobs,
+                page_threads=page_threads,
+                ordered_pages=ordered_pages,
+                use_cache=use_cache,
+                report_path=job["report_path"],
+                inbox_folder_path=job["inbox_folder_path"],
+                outbox_folder_path=job["outbox_folder_path"],
+                production_code=job["production_code"],
+                journal_path=job["journal_path"],
+                processing_folder_path=job["processing_folder_path"],
+            )
+        except Exception:
+            traceback.print_exc()
+            job_queue.fail_job(job["id"], traceback.format_exc())
+            sys.exit(1)
+    job_queue.finish_job(job["id"])
+
+
+def drain_job_queue(
+        workers: int,
+        jobs: int = 1,
+        page_threads: int = 1,
+        ordered_pages: bool = True,
+        use_cache: bool = True,
+        job_queue_path: str = JOB_QUEUE_PATH,
+        processing_folder_path: str = None,
+):
+    """
+    Processes queued jobs until the queue is empty, up to `workers` jobs at a time
+
+    Each job runs in a new process, in its own processing folder.  Jobs left running by a drainer that stopped
+    are queued again first.
+
+    :param workers: jobs processed at the same time
+    :param jobs: worker processes for each job's first pass
+    :param page_threads:
+    :param ordered_pages:
+    :param use_cache:
+    :param job_queue_path:
+    :param processing_folder_path: jobs queued before jobs had a processing folder get one in its jobs folder
+    :return:
+    """
+    job_queue = JobQueue(job_queue_path, job_log_folder_path(processing_folder_path))
+    requeued_job_ids = job_queue.requeue_interrupted_jobs()
+    if requeued_job_ids:
+        print(f"Queued interrupted jobs again: {', '.join(str(job_id) for job_id in requeued_job_ids)}")
+
+    # sentinel -> (worker process, job)
+    running = {}
+    while True:
+        while len(running) < workers:
+            job = job_queue.claim_job(os.getpid())
+            if job is None:
+                break
+            worker = multiprocessing.Process(
+                target=run_queued_job,
+                args=(job, job_queue_path, get_pdf_backend(), jobs, page_threads, ordered_pages, use_cache),
+                name=f"payroll-job-{job['id']}",
+            )
+            worker.start()
+            job_queue.set_worker_pid(job["id"], worker.pid)
+            running[worker.sentinel] = (worker, job)
+            print(
+                f"Job {job['id']} started: {job['production_code']} {job['inbox_folder_path']} -> "
+                f"{job['outbox_folder_path']}, log {job['log_path']}"
+            )
+        if not running:
+            break
+        for sentinel in multiprocessing.connection.wait(list(running)):
+            worker, job = running.pop(sentinel)
+            worker.join()
+            # a worker that died without recording its failure, e.g. killed for running out of memory
+            if worker.exitcode != 0 and job_queue.get_job(job["id"])["status"] == RUNNING:
+                job_queue.fail_job(job["id"], f"worker process exited with {worker.exitcode}")
+            print(f"Job {job['id']} {job_queue.get_job(job['id'])['status']}")
+
+    print("\nJob queue is empty")
+    for job in job_queue.jobs():
+        error = job["error"].strip().splitlines()[-1] if job["error"] else ""
+        print(f" - Job {job['id']} {job['status']}: {job['production_code']} {job['inbox_folder_path']} {error}")
+
+
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Process payroll PDFs in the PDF Inbox")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of worker processes used to process inbox files in parallel (default: 1)"
+    )
+    parser.add_argument(
+        "--page-threads",
+        type=int,
+        default=1,
+        help="number of threads extracting the pages of a single time card file concurrently (default: 1)"
+    )
+    parser.add_argument(
+        "--unordered-pages",
+        action="store_true",
+        help="classify pages as soon as their chunk is extracted instead of in page order, "
+             "duplicate marking may then differ from a serial run"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="don't read or write the extraction cache, every page is extracted again"
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="keep running and process inbox files as soon as they are complete"
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=WATCH_POLL_INTERVAL_SECONDS,
+        help=f"seconds between inbox checks in --watch mode (default: {WATCH_POLL_INTERVAL_SECONDS:g})"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="match and merge time cards and check copies as soon as both are written"
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="only classify the inbox files, check the check copy lists and estimate the backend calls and "
+             "runtime of the run, reading page counts without the PDF backend"
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="discard the journal of an interrupted run and process every file again"
+    )
+    parser.add_argument(
+        "--merge-near-matches",
+        action="store_true",
+        help="merge unmatched time cards and check copies with the same invoice and date whose names differ "
+             "only by a typo or a middle name, otherwise they are only suggested"
+    )
+    parser.add_argument(
+        "--merge-all",
+        action="store_true",
+        help="merge every matched pair again, by default pairs whose time card and check copy haven't changed "
+             "since they were merged are skipped"
+    )
+    parser.add_argument(
+        "--zip-outbox",
+        choices=ARCHIVE_MODES,
+        help="stream the time_cards, check_copies and final pdfs into one ZIP archive for the week, or one per "
+             "folder, instead of writing loose files to the outbox"
+    )
+    parser.add_argument(
+        "--report",
+        default=RUN_REPORT_PATH,
+        help=f"where to write the JSON run report (default: {RUN_REPORT_PATH})"
+    )
+    parser.add_argument(
+        "--inbox",
+        help="PDF Inbox of the production to process (default: /home/pdfs/inbox/)"
+    )
+    parser.add_argument(
+        "--outbox",
+        help="outbox of the production to process (default: /home/pdfs/outbox/)"
+    )
+    parser.add_argument(
+        "--production-code",
+        help="prefix of merged file names (default: LLS2)"
+    )
+    parser.add_argument(
+        "--processing",
+        help="processing folder for scratch files and the state kept between runs, e.g. the watch manifest and "
+             "output name registry (default: /home/pdfs/processing/)"
+    )
+    parser.add_argument(
+        "--enqueue",
+        action="store_true",
+        help="add a job for --inbox, --outbox and --production-code to the job queue instead of processing"
+    )
+    parser.add_argument(
+        "--drain-queue",
+        action="store_true",
+        help="process queued jobs until the job queue is empty"
+    )
+    parser.add_argument(
+        "--queue-workers",
+        type=int,
+        default=2,
+        help="jobs processed at the same time by --drain-queue (default: 2)"
+    )
+    parser.add_argument(
+        "--job-queue",
+        default=JOB_QUEUE_PATH,
+        help=f"job queue database (default: {JOB_QUEUE_PATH})"
+    )
+    parser.add_argument(
+        "--prometheus-textfile",
+        help="also write the run metrics to this file in the Prometheus text format, e.g. for the "
+             "node_exporter textfile collector"
+    )
+    args = parser.parse_args()
+    if args.zip_outbox and (args.watch or args.enqueue or args.drain_queue):
+        parser.error("--zip-outbox can't be used with --watch, --enqueue or --drain-queue")
+    if args.enqueue:
+        if not (args.inbox and args.outbox and args.production_code):
+            parser.error("--enqueue needs --inbox, --outbox and --production-code")
+        job_queue = JobQueue(args.job_queue, job_log_folder_path(args.processing))
+        job_id = job_queue.add_job(args.inbox, args.outbox, args.production_code)
+        print(f"Queued job {job_id}")
+    elif args.drain_queue:
+        drain_job_queue(
+            workers=max(1, args.queue_workers),
+            jobs=max(1, args.jobs),
+            page_threads=max(1, args.page_threads),
+            ordered_pages=not args.unordered_pages,
+            use_cache=not args.no_cache,
+            job_queue_path=args.job_queue,
+            processing_folder_path=args.processing,
+        )
+    elif args.plan:
+        PayrollProcess.configure_production(args.inbox, args.outbox, args.production_code, args.processing)
+        # check lists are read without the extraction cache, planning doesn't write anything
+        configure_extraction_cache(enabled=False)
+        RunPlanner(
+            PayrollProcess.INBOX_FOLDER_PATH,
+            jobs=max(1, args.jobs),
+            page_threads=max(1, args.page_threads),
+            use_cache=not args.no_cache,
+            report_path=args.report,
+        ).print_plan()
+    elif args.watch:
+        PayrollProcess.configure_production(args.inbox, args.outbox, args.production_code, args.processing)
+        PayrollProcess.create_outbox_folders()
+        PayrollProcess.MERGE_NEAR_MATCHES = args.merge_near_matches
+        PayrollProcess.INCREMENTAL_MERGE = not args.merge_all
+        configure_processing(get_pdf_backend(), max(1, args.page_threads), not args.unordered_pages, not args.no_cache)
+        InboxWatcher(poll_interval=args.poll_interval).run()
+    else:
+        main(
+            jobs=max(1, args.jobs),
+            page_threads=max(1, args.page_threads),
+            ordered_pages=not args.unordered_pages,
+            use_cache=not args.no_cache,
+            stream=args.stream,
+            report_path=args.report,
+            prometheus_textfile_path=args.prometheus_textfile,
+            inbox_folder_path=args.inbox,
+            outbox_folder_path=args.outbox,
+            production_code=args.production_code,
+            resume=not args.restart,
+            merge_near_matches=args.merge_near_matches,
+            merge_all=args.merge_all,
+            outbox_archive_mode=args.zip_outbox,
+            processing_folder_path=args.processing,
+        )
@@ -0,0 +1,60 @@
+import os
+import sys
+
+import pytest
+
+REPOSITORY_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_PATH)
+sys.path.insert(0, os.path.join(REPOSITORY_PATH, "benchmarks"))
+
+from film_payroll_pdf_processor.extraction_cache import configure_extraction_cache  # noqa: E402
+from film_payroll_pdf_processor.output_name_registry import (  # noqa: E402
+    get_output_name_registry,
+    set_output_name_registry,
+)
+from film_payroll_pdf_processor.payroll_process import PayrollProcess  # noqa: E402
+from film_payroll_pdf_processor.pdf_backends import get_pdf_backend, set_pdf_backend  # noqa: E402
+from film_payroll_pdf_processor.pdf_pages import CheckCopyPDFPage  # noqa: E402
+from film_payroll_pdf_processor.run_journal import configure_run_journal  # noqa: E402
+from film_payroll_pdf_processor.run_metrics import reset_run_metrics  # noqa: E402
+
+
+@pytest.fixture
+def production(tmp_path, monkeypatch):
+    """
+    A production with its inbox, outbox and processing folders in a temporary directory, processed with
+    the pypdf backend and without the extraction cache or a run journal
+
+    :return: the temporary directory, with inbox, outbox and processing folders
+    """
+    pytest.importorskip("pypdf")
+    for folder in ("inbox", "outbox", "processing"):
+        (tmp_path / folder).mkdir()
+    for attribute in (
+        "INBOX_FOLDER_PATH",
+        "OUTBOX_FOLDER_PATH",
+        "PROCESSING_FOLDER_PATH",
+        "INCREMENTAL_MERGE",
+        "MERGE_NEAR_MATCHES",
+        "OUTBOX_ARCHIVE",
+        "_merge_manifest",
+    ):
+        monkeypatch.setattr(PayrollProcess, attribute, getattr(PayrollProcess, attribute))
+    monkeypatch.setattr(CheckCopyPDFPage, "PRODUCTION_CODE", CheckCopyPDFPage.PRODUCTION_CODE)
+    PayrollProcess.configure_production(
+        str(tmp_path / "inbox") + os.sep,
+        str(tmp_path / "outbox") + os.sep,
+        "TEST",
+        str(tmp_path / "processing"),
+    )
+    PayrollProcess.create_outbox_folders()
+    previous_backend = get_pdf_backend()
+    set_pdf_backend("pypdf")
+    configure_extraction_cache(enabled=False)
+    configure_run_journal(None)
+    reset_run_metrics()
+    yield tmp_path
+    get_output_name_registry(PayrollProcess.PROCESSING_FOLDER_PATH).close()
+    set_output_name_registry(None)
+    configure_extraction_cache(enabled=False)
+    set_pdf_backend(previous_backend)
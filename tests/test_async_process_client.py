@@ -0,0 +1,141 @@
+import asyncio
+import sys
+import time
+
+import pytest
+
+from film_payroll_pdf_processor.async_process_client import AsyncProcessClient, ProcessCallError
+from film_payroll_pdf_processor.run_metrics import reset_run_metrics
+
+OPERATION = "test:command"
+SLEEP = "import time; time.sleep(30)"
+EXIT_WITH_ERROR = "import sys; sys.stderr.write('bad arguments'); sys.exit(3)"
+KILLED = "import os, signal; os.kill(os.getpid(), signal.SIGKILL)"
+# killed by a signal the first time, a marker file tells the second attempt to succeed
+KILLED_ONCE = (
+    "import os, signal, sys\n"
+    "if not os.path.exists(sys.argv[1]):\n"
+    "    open(sys.argv[1], 'w').close()\n"
+    "    os.kill(os.getpid(), signal.SIGKILL)\n"
+    "print('done')\n"
+)
+# prints when it started and finished running
+TIMED = "import time; started = time.time(); time.sleep(0.3); print(started, time.time())"
+
+
+def python(code: str, *arguments: str) -> list:
+    return [sys.executable, "-c", code, *arguments]
+
+
+@pytest.fixture
+def run_metrics():
+    return reset_run_metrics()
+
+
+@pytest.fixture
+def backoff_waits(monkeypatch):
+    """ Seconds of every asyncio.sleep, i.e. of every wait before a retry """
+    waits = []
+    sleep = asyncio.sleep
+
+    def recording_sleep(seconds, *arguments, **keywords):
+        waits.append(seconds)
+        return sleep(seconds, *arguments, **keywords)
+
+    monkeypatch.setattr(asyncio, "sleep", recording_sleep)
+    return waits
+
+
+def test_a_command_that_runs_too_long_is_killed(run_metrics):
+    client = AsyncProcessClient(timeout=0.5, retries=0)
+    started = time.monotonic()
+    with pytest.raises(ProcessCallError) as error:
+        client.run_sync(python(SLEEP), OPERATION)
+
+    assert time.monotonic() - started < 10
+    assert error.value.timed_out
+    assert error.value.transient
+    # killed with SIGKILL
+    assert error.value.returncode == -9
+    assert run_metrics.failure_count(OPERATION) == 1
+
+
+def test_a_timed_out_command_is_retried(run_metrics, backoff_waits):
+    client = AsyncProcessClient(timeout=0.3, retries=1, backoff_seconds=0.01)
+    with pytest.raises(ProcessCallError) as error:
+        client.run_sync(python(SLEEP), OPERATION)
+
+    assert error.value.timed_out
+    assert run_metrics.failure_count(OPERATION) == 2
+    assert run_metrics.operations[OPERATION]["retries"] == 1
+    assert backoff_waits == [0.01]
+
+
+def test_a_killed_command_is_retried_with_backoff(run_metrics, backoff_waits):
+    client = AsyncProcessClient(retries=3, backoff_seconds=0.05)
+    with pytest.raises(ProcessCallError) as error:
+        client.run_sync(python(KILLED), OPERATION)
+
+    assert error.value.returncode == -9
+    assert not error.value.timed_out
+    assert run_metrics.failure_count(OPERATION) == 4
+    assert run_metrics.operations[OPERATION]["retries"] == 3
+    assert backoff_waits == [0.05, 0.1, 0.2]
+
+
+def test_a_retried_command_returns_the_successful_attempt(tmp_path, run_metrics, backoff_waits):
+    client = AsyncProcessClient(retries=2, backoff_seconds=0.01)
+    result = client.run_sync(python(KILLED_ONCE, str(tmp_path / "marker")), OPERATION)
+
+    assert result.stdout.strip() == b"done"
+    assert result.attempts == 2
+    assert run_metrics.failure_count(OPERATION) == 1
+    assert backoff_waits == [0.01]
+
+
+def test_a_command_that_exits_with_an_error_isnt_retried(run_metrics, backoff_waits):
+    client = AsyncProcessClient(retries=2, backoff_seconds=0.01)
+    with pytest.raises(ProcessCallError) as error:
+        client.run_sync(python(EXIT_WITH_ERROR), OPERATION)
+
+    assert error.value.returncode == 3
+    assert not error.value.transient
+    assert error.value.stderr == "bad arguments"
+    assert run_metrics.failure_count(OPERATION) == 1
+    assert run_metrics.operations[OPERATION]["retries"] == 0
+    assert backoff_waits == []
+
+
+def test_a_missing_program_isnt_retried(tmp_path, run_metrics, backoff_waits):
+    client = AsyncProcessClient(retries=2, backoff_seconds=0.01)
+    with pytest.raises(ProcessCallError) as error:
+        client.run_sync([str(tmp_path / "missing-program")], OPERATION)
+
+    assert not error.value.transient
+    assert error.value.returncode is None
+    assert backoff_waits == []
+
+
+def test_at_most_max_concurrency_commands_run_at_once(run_metrics):
+    client = AsyncProcessClient(max_concurrency=2)
+    results = client.run_many_sync([python(TIMED)] * 6, OPERATION)
+
+    runs = [tuple(map(float, result.stdout.split())) for result in results]
+    most_running = max(
+        sum(1 for started, finished in runs if started <= moment < finished)
+        for moment, _ in runs
+    )
+    assert most_running == 2
+
+
+def test_run_many_returns_the_errors_of_failed_commands_in_their_place(run_metrics):
+    client = AsyncProcessClient(retries=0)
+    results = client.run_many_sync(
+        [python("print('first')"), python(EXIT_WITH_ERROR), python("print('third')")],
+        OPERATION,
+        return_errors=True,
+    )
+
+    assert results[0].stdout.strip() == b"first"
+    assert isinstance(results[1], ProcessCallError) and results[1].returncode == 3
+    assert results[2].stdout.strip() == b"third"
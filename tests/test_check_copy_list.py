@@ -0,0 +1,34 @@
+from film_payroll_pdf_processor.payroll_process import PayrollProcess
+
+
+def test_every_listed_check_is_read_with_the_list_date(production):
+    check_copy_list_path = production / "inbox" / "checks.txt"
+    check_copy_list_path.write_text(
+        "Date:04/03/2021\n"
+        "PAGE,LAST,FIRST,INVOICE\n"
+        "12,PINCKLEY,DENISE,EYM788\n"
+        "13,O'BRIEN,SEAN,EYM789\n"
+    )
+
+    check_copies = PayrollProcess.read_check_copy_list(str(check_copy_list_path))
+
+    assert [check_copy.list_fields for check_copy in check_copies] == [
+        {
+            "month": "04",
+            "day": "03",
+            "year": "2021",
+            "page_number": "12",
+            "payee_last_name": "PINCKLEY",
+            "payee_first_name": "DENISE",
+            "invoice_number": "EYM788",
+        },
+        {
+            "month": "04",
+            "day": "03",
+            "year": "2021",
+            "page_number": "13",
+            "payee_last_name": "O'BRIEN",
+            "payee_first_name": "SEAN",
+            "invoice_number": "EYM789",
+        },
+    ]
@@ -0,0 +1,102 @@
+import os
+from datetime import date
+
+from film_payroll_pdf_processor.inbox_watcher import InboxWatcher, WATCH_MANIFEST_FILENAME
+from film_payroll_pdf_processor.payroll_process import (
+    OUTBOX_CHECK_COPY_FOLDER,
+    OUTBOX_MERGE_FOLDER,
+    OUTBOX_TIME_CARD_FOLDER,
+    PayrollProcess,
+)
+from synthetic_corpus import SyntheticCorpus, generate_corpus, write_pdf
+
+
+def test_the_manifest_is_kept_in_the_configured_processing_folder(production):
+    generate_corpus(PayrollProcess.INBOX_FOLDER_PATH, 8)
+    watcher = InboxWatcher(poll_interval=0)
+    assert watcher.manifest_path == str(production / "processing" / WATCH_MANIFEST_FILENAME)
+    # the first poll only sees the file sizes
+    assert not watcher.poll()
+    assert watcher.poll()
+    assert os.path.exists(watcher.manifest_path)
+    assert os.listdir(production / "outbox" / "final")
+
+    restarted_watcher = InboxWatcher(poll_interval=0)
+    assert restarted_watcher.manifest["files"] == watcher.manifest["files"]
+    assert not restarted_watcher.poll()
+    assert not restarted_watcher.poll()
+
+
+WEEK_ENDING = date(2021, 3, 13)
+
+
+def write_batch(corpus: SyntheticCorpus, filename: str, invoice_number: str, card_numbers: list, revised=False):
+    page_texts = []
+    for card_number in card_numbers:
+        page_text = corpus.time_card_text(*SyntheticCorpus.payee_name(card_number), WEEK_ENDING)
+        page_texts.append(page_text + "\nREVISED\n" if revised else page_text)
+    page_texts.append(corpus.end_of_batch_text(invoice_number))
+    write_pdf(os.path.join(PayrollProcess.INBOX_FOLDER_PATH, filename), page_texts)
+
+
+def poll_until_processed(watcher: InboxWatcher) -> list:
+    """
+    :return: the files processed, in order, the first poll only sees the file sizes
+    """
+    processed = []
+    process = watcher._process
+    watcher._process = lambda file_type, filename: processed.append(filename) or process(file_type, filename)
+    watcher.poll()
+    watcher.poll()
+    watcher._process = process
+    return processed
+
+
+def outbox_folder_files(folder: str) -> list:
+    return sorted(os.listdir(os.path.join(PayrollProcess.OUTBOX_FOLDER_PATH, folder)))
+
+
+def test_a_late_original_only_rewrites_revisions_of_its_invoices(production):
+    corpus = SyntheticCorpus(4)
+    write_batch(corpus, "WE_031321_EAA000_TEAMSTERS REVISED.pdf", "EAA000", [0], revised=True)
+    write_batch(corpus, "WE_031321_EBB000_TEAMSTERS REVISED.pdf", "EBB000", [1], revised=True)
+    watcher = InboxWatcher(poll_interval=0)
+    assert poll_until_processed(watcher) == [
+        "WE_031321_EAA000_TEAMSTERS REVISED.pdf",
+        "WE_031321_EBB000_TEAMSTERS REVISED.pdf",
+    ]
+
+    write_batch(corpus, "WE_031321_ECC000_TEAMSTERS.pdf", "ECC000", [2])
+    assert poll_until_processed(watcher) == ["WE_031321_ECC000_TEAMSTERS.pdf"]
+
+    write_batch(corpus, "WE_031321_EAA000_TEAMSTERS.pdf", "EAA000", [0, 3])
+    assert poll_until_processed(watcher) == [
+        "WE_031321_EAA000_TEAMSTERS.pdf",
+        "WE_031321_EAA000_TEAMSTERS REVISED.pdf",
+    ]
+
+
+def test_a_file_removed_from_the_inbox_has_its_outbox_and_merged_files_removed(production):
+    corpus = SyntheticCorpus(3)
+    cards = [SyntheticCorpus.payee_name(card_number) for card_number in range(3)]
+    write_batch(corpus, "WE_031321_EAA000_TEAMSTERS.pdf", "EAA000", [0, 1])
+    write_batch(corpus, "WE_031321_EBB000_TEAMSTERS.pdf", "EBB000", [2])
+    corpus.write_check_copies_packages(
+        PayrollProcess.INBOX_FOLDER_PATH,
+        WEEK_ENDING,
+        [(last_name, first_name, "EAA000") for last_name, first_name in cards[:2]] + [(*cards[2], "EBB000")],
+    )
+    watcher = InboxWatcher(poll_interval=0)
+    poll_until_processed(watcher)
+    assert len(outbox_folder_files(OUTBOX_MERGE_FOLDER)) == 3
+    kept_time_card, = [name for name in outbox_folder_files(OUTBOX_TIME_CARD_FOLDER) if "EBB000" in name]
+    kept_merge, = [name for name in outbox_folder_files(OUTBOX_MERGE_FOLDER) if "EBB000" in name]
+
+    os.remove(os.path.join(PayrollProcess.INBOX_FOLDER_PATH, "WE_031321_EAA000_TEAMSTERS.pdf"))
+    assert watcher.poll()
+
+    assert outbox_folder_files(OUTBOX_TIME_CARD_FOLDER) == [kept_time_card]
+    assert outbox_folder_files(OUTBOX_MERGE_FOLDER) == [kept_merge]
+    assert len(outbox_folder_files(OUTBOX_CHECK_COPY_FOLDER)) == 3
+    assert list(PayrollProcess.merge_manifest().merged) == [kept_merge]
+    assert list(watcher.manifest["merged"]) == [kept_merge]
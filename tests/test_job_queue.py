@@ -0,0 +1,170 @@
+import multiprocessing
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from datetime import date
+
+import run
+from film_payroll_pdf_processor.job_queue import DONE, QUEUED, RUNNING, JobQueue
+from film_payroll_pdf_processor.output_name_registry import OUTPUT_NAME_REGISTRY_FILENAME
+from film_payroll_pdf_processor.payroll_process import OUTBOX_MERGE_FOLDER, PayrollProcess
+from synthetic_corpus import SyntheticCorpus
+
+WEEK_ENDING = date(2021, 3, 13)
+INVOICE_NUMBER = "EAA000"
+
+
+def job_queue(tmp_path) -> JobQueue:
+    return JobQueue(str(tmp_path / "job_queue.sqlite3"), str(tmp_path / "jobs"))
+
+
+def add_jobs(queue: JobQueue, count: int) -> list:
+    return [queue.add_job(f"/inbox/{n}/", f"/outbox/{n}/", f"P{n}") for n in range(count)]
+
+
+def claim_jobs(database_path: str, log_folder_path: str, claimed):
+    queue = JobQueue(database_path, log_folder_path)
+    while True:
+        job = queue.claim_job(os.getpid())
+        if job is None:
+            return
+        claimed.put(job["id"])
+
+
+def test_jobs_are_claimed_oldest_first(tmp_path):
+    queue = job_queue(tmp_path)
+    job_ids = add_jobs(queue, 3)
+    assert [queue.claim_job()["id"] for _ in job_ids] == job_ids
+    assert queue.claim_job() is None
+    assert [job["status"] for job in queue.jobs()] == [RUNNING] * 3
+
+
+def test_processes_draining_the_same_queue_claim_each_job_once(tmp_path):
+    queue = job_queue(tmp_path)
+    job_ids = add_jobs(queue, 40)
+    context = multiprocessing.get_context("fork")
+    claimed = context.Queue()
+    workers = [
+        context.Process(target=claim_jobs, args=(queue.database_path, queue.log_folder_path, claimed))
+        for _ in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    claimed_ids = [claimed.get(timeout=5) for _ in job_ids]
+
+    assert sorted(claimed_ids) == job_ids
+    assert claimed.empty()
+    worker_pids = {worker.pid for worker in workers}
+    assert all(job["status"] == RUNNING and job["worker_pid"] in worker_pids for job in queue.jobs())
+
+
+def test_claiming_waits_for_another_claim_to_commit(tmp_path):
+    queue = job_queue(tmp_path)
+    add_jobs(queue, 2)
+    # another drainer is part way through claiming job 1
+    other = sqlite3.connect(queue.database_path, timeout=30, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    other.execute("UPDATE jobs SET status = ? WHERE id = 1", (RUNNING,))
+    claimed = []
+    claiming = threading.Thread(
+        target=lambda: claimed.append(JobQueue(queue.database_path, queue.log_folder_path).claim_job()["id"])
+    )
+    claiming.start()
+    time.sleep(0.5)
+    assert claiming.is_alive()
+
+    other.execute("COMMIT")
+    claiming.join(timeout=30)
+    other.close()
+    assert claimed == [2]
+
+
+def test_requeue_interrupted_jobs_requeues_jobs_whose_worker_is_gone(tmp_path):
+    finished_worker = subprocess.Popen([sys.executable, "-c", "pass"])
+    finished_worker.wait()
+    queue = job_queue(tmp_path)
+    dead_job_id, running_job_id, unstarted_job_id, queued_job_id = add_jobs(queue, 4)
+    queue.claim_job(finished_worker.pid)
+    queue.claim_job(os.getpid())
+    # the drainer stopped before starting the job's worker
+    queue.claim_job(None)
+
+    assert queue.requeue_interrupted_jobs() == [dead_job_id, unstarted_job_id]
+    statuses = {job["id"]: (job["status"], job["worker_pid"]) for job in queue.jobs()}
+    assert statuses == {
+        dead_job_id: (QUEUED, None),
+        running_job_id: (RUNNING, os.getpid()),
+        unstarted_job_id: (QUEUED, None),
+        queued_job_id: (QUEUED, None),
+    }
+    assert queue.claim_job()["id"] == dead_job_id
+
+
+def test_requeue_interrupted_jobs_keeps_jobs_of_other_users_processes(tmp_path, monkeypatch):
+    queue = job_queue(tmp_path)
+    job_id, = add_jobs(queue, 1)
+    queue.claim_job(12345)
+
+    def kill(pid, signal):
+        raise PermissionError()
+
+    monkeypatch.setattr(os, "kill", kill)
+    assert queue.requeue_interrupted_jobs() == []
+    assert queue.get_job(job_id)["status"] == RUNNING
+
+
+def test_each_job_has_its_own_processing_folder(tmp_path):
+    queue = job_queue(tmp_path)
+    first_job_id, second_job_id = add_jobs(queue, 2)
+    shared_job_id = queue.add_job("/inbox/", "/outbox/", "P", str(tmp_path / "lls2"))
+
+    assert queue.get_job(first_job_id)["processing_folder_path"] == str(tmp_path / "jobs" / "job-1")
+    assert queue.get_job(second_job_id)["processing_folder_path"] == str(tmp_path / "jobs" / "job-2")
+    assert queue.get_job(shared_job_id)["processing_folder_path"] == str(tmp_path / "lls2")
+
+
+def test_jobs_queued_before_processing_folders_get_one(tmp_path):
+    database_path = str(tmp_path / "job_queue.sqlite3")
+    connection = sqlite3.connect(database_path)
+    connection.execute(
+        "CREATE TABLE jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, inbox_folder_path TEXT NOT NULL,"
+        " outbox_folder_path TEXT NOT NULL, production_code TEXT NOT NULL, status TEXT NOT NULL,"
+        " queued_at REAL NOT NULL, started_at REAL, finished_at REAL, worker_pid INTEGER, log_path TEXT,"
+        " report_path TEXT, journal_path TEXT, error TEXT)"
+    )
+    connection.execute(
+        "INSERT INTO jobs (inbox_folder_path, outbox_folder_path, production_code, status, queued_at)"
+        " VALUES ('/inbox/', '/outbox/', 'P', ?, 0)", (QUEUED,)
+    )
+    connection.commit()
+    connection.close()
+
+    queue = job_queue(tmp_path)
+    assert queue.claim_job()["processing_folder_path"] == str(tmp_path / "jobs" / "job-1")
+
+
+def test_queued_job_runs_in_its_processing_folder(production):
+    cards = [SyntheticCorpus.payee_name(n) for n in range(2)]
+    corpus = SyntheticCorpus(len(cards))
+    corpus.write_time_card_batch(
+        PayrollProcess.INBOX_FOLDER_PATH, f"WE_031321_{INVOICE_NUMBER}_TEAMSTERS", INVOICE_NUMBER, WEEK_ENDING, cards
+    )
+    corpus.write_check_copies_packages(
+        PayrollProcess.INBOX_FOLDER_PATH, WEEK_ENDING, [(last, first, INVOICE_NUMBER) for last, first in cards]
+    )
+    queue = JobQueue(str(production / "job_queue.sqlite3"), str(production / "processing" / "jobs"))
+    job_id = queue.add_job(PayrollProcess.INBOX_FOLDER_PATH, PayrollProcess.OUTBOX_FOLDER_PATH, "TEST")
+
+    run.run_queued_job(queue.claim_job(), queue.database_path, "pypdf", 1, 1, True, False)
+
+    job = queue.get_job(job_id)
+    assert job["status"] == DONE
+    assert PayrollProcess.PROCESSING_FOLDER_PATH == job["processing_folder_path"]
+    assert os.path.exists(os.path.join(job["processing_folder_path"], OUTPUT_NAME_REGISTRY_FILENAME))
+    assert not os.path.exists(os.path.join(production, "processing", OUTPUT_NAME_REGISTRY_FILENAME))
+    assert len(os.listdir(os.path.join(PayrollProcess.OUTBOX_FOLDER_PATH, OUTBOX_MERGE_FOLDER))) == len(cards)
@@ -0,0 +1,250 @@
+import random
+
+import pytest
+
+from film_payroll_pdf_processor.matching import (
+    NEAR_MATCH_AUTO_MERGE_SCORE,
+    NEAR_MATCH_MARGIN,
+    NEAR_MATCH_MIN_SCORE,
+    MatchingEngine,
+    edit_distance,
+    find_near_matches,
+    name_similarity,
+)
+from film_payroll_pdf_processor.pdf_pages import CheckCopyPDFPage, TimeCardPDFPage
+
+NAMES = [("SMITH", "JOHN"), ("DOE", "JANE"), ("PINCKLEY", "DENISE")]
+DATES = [("03", "13", "2021"), ("03", "20", "2021")]
+INVOICES = ["EYM788", "EYM789"]
+
+
+def time_card(last_name: str, first_name: str, date: tuple = DATES[0], invoice_number: str = INVOICES[0]):
+    month, day, year = date
+    return TimeCardPDFPage.from_record({
+        "first_name": first_name,
+        "last_name": last_name,
+        "pay_period_day_string": day,
+        "pay_period_month_string": month,
+        "pay_period_year_string": year,
+        "has_grand_total": True,
+        "has_end_of_batch": False,
+        "original_filepath": f"pdfs/inbox/WE_{month}{day}{year[2:]}_{invoice_number}_TEAMSTERS.pdf",
+    })
+
+
+def check_copy(last_name: str, first_name: str, date: tuple = DATES[0], invoice_number: str = INVOICES[0]):
+    month, day, year = date
+    return CheckCopyPDFPage(month, day, year, "1", last_name, first_name, invoice_number)
+
+
+def nested_loop_pairing(time_cards: list, check_copies: list):
+    """
+    The nested loop matching replaced by MatchingEngine, pairing each time card with the first equal check
+    copy that isn't paired yet and numbering a payee's checks in match order
+
+    :return: (time card, check copy, nth check) list, unmatched time cards, unmatched check copies
+    """
+    pairs = []
+    paired_check_copies = []
+    payee_name_counter = {}
+    unmatched_time_cards = []
+    for tc in time_cards:
+        for cc in check_copies:
+            if any(cc is paired for paired in paired_check_copies):
+                continue
+            if (
+                tc.last_name == cc.payee_last_name and
+                tc.first_name == cc.payee_first_name and
+                tc.pay_period_month_string == cc.month and
+                tc.pay_period_day_string == cc.day and
+                tc.pay_period_year_string == cc.year and
+                tc.invoice_number == cc.invoice_number
+            ):
+                name_key = f"{tc.last_name},{tc.first_name}"
+                payee_name_counter[name_key] = payee_name_counter.get(name_key, 0) + 1
+                pairs.append((tc, cc, payee_name_counter[name_key]))
+                paired_check_copies.append(cc)
+                break
+        else:
+            unmatched_time_cards.append(tc)
+    unmatched_check_copies = [cc for cc in check_copies if not any(cc is paired for paired in paired_check_copies)]
+    return pairs, unmatched_time_cards, unmatched_check_copies
+
+
+def engine_pairing(time_cards: list, check_copies: list):
+    result = MatchingEngine.match(time_cards, check_copies)
+    pairs = [(pair.time_card, pair.check_copy, pair.nth_check) for pair in result.matched_pairs]
+    return pairs, result.unmatched_time_cards, result.unmatched_check_copies
+
+
+def identities(pairing):
+    pairs, unmatched_time_cards, unmatched_check_copies = pairing
+    return (
+        [(id(tc), id(cc), nth_check) for tc, cc, nth_check in pairs],
+        [id(tc) for tc in unmatched_time_cards],
+        [id(cc) for cc in unmatched_check_copies],
+    )
+
+
+def test_each_record_is_matched_at_most_once():
+    time_cards = [time_card("SMITH", "JOHN"), time_card("SMITH", "JOHN")]
+    check_copies = [check_copy("SMITH", "JOHN"), check_copy("SMITH", "JOHN"), check_copy("SMITH", "JOHN")]
+
+    pairs, unmatched_time_cards, unmatched_check_copies = engine_pairing(time_cards, check_copies)
+
+    assert [(tc, cc) for tc, cc, _ in pairs] == list(zip(time_cards, check_copies))
+    assert unmatched_time_cards == []
+    assert unmatched_check_copies == [check_copies[2]]
+
+
+def test_repeated_keys_number_the_checks_of_a_payee_in_match_order():
+    time_cards = [time_card("SMITH", "JOHN"), time_card("DOE", "JANE"), time_card("SMITH", "JOHN")]
+    check_copies = [check_copy("SMITH", "JOHN"), check_copy("SMITH", "JOHN"), check_copy("DOE", "JANE")]
+
+    result = MatchingEngine.match(time_cards, check_copies)
+
+    assert [(pair.time_card.last_name, pair.nth_check) for pair in result.matched_pairs] == [
+        ("SMITH", 1), ("DOE", 1), ("SMITH", 2)
+    ]
+    assert [pair.merged_output_name for pair in result.matched_pairs][::2] == [
+        f"{CheckCopyPDFPage.PRODUCTION_CODE}-PR-TC-SMITH,JOHN,03132021-EYM788.pdf",
+        f"{CheckCopyPDFPage.PRODUCTION_CODE}-PR-TC-02-SMITH,JOHN,03132021-EYM788.pdf",
+    ]
+
+
+def test_unmatched_records_come_back_in_the_order_they_were_given():
+    time_cards = [
+        time_card("SMITH", "JOHN", date=DATES[1]),
+        time_card("DOE", "JANE"),
+        time_card("SMITH", "JOHN", invoice_number=INVOICES[1]),
+    ]
+    check_copies = [check_copy("DOE", "JANE"), check_copy("PINCKLEY", "DENISE"), check_copy("SMITH", "JOHN")]
+
+    _, unmatched_time_cards, unmatched_check_copies = engine_pairing(time_cards, check_copies)
+
+    assert unmatched_time_cards == [time_cards[0], time_cards[2]]
+    assert unmatched_check_copies == [check_copies[1], check_copies[2]]
+
+
+def test_the_engine_pairs_like_the_nested_loop_it_replaced():
+    random_numbers = random.Random(788)
+    for _ in range(200):
+        time_cards = [
+            time_card(*random_numbers.choice(NAMES), random_numbers.choice(DATES), random_numbers.choice(INVOICES))
+            for _ in range(random_numbers.randint(0, 12))
+        ]
+        check_copies = [
+            check_copy(*random_numbers.choice(NAMES), random_numbers.choice(DATES), random_numbers.choice(INVOICES))
+            for _ in range(random_numbers.randint(0, 12))
+        ]
+
+        assert identities(engine_pairing(time_cards, check_copies)) == \
+            identities(nested_loop_pairing(time_cards, check_copies))
+
+
+def test_records_added_one_at_a_time_pair_like_complete_lists():
+    time_cards = [time_card("SMITH", "JOHN"), time_card("DOE", "JANE"), time_card("SMITH", "JOHN")]
+    check_copies = [check_copy("SMITH", "JOHN"), check_copy("DOE", "JANE"), check_copy("SMITH", "JOHN")]
+    engine = MatchingEngine()
+
+    # each time card arrives before its check copy, as in a streamed run
+    pairs = []
+    for tc, cc in zip(time_cards, check_copies):
+        assert engine.add_time_card(tc) is None
+        pairs.append(engine.add_check_copy(cc))
+
+    assert [(pair.time_card, pair.check_copy, pair.nth_check) for pair in pairs] == \
+        engine_pairing(time_cards, check_copies)[0]
+    assert engine.result().unmatched_time_cards == []
+
+
+@pytest.mark.parametrize("a, b, distance", [
+    ("", "", 0),
+    ("", "ABC", 3),
+    ("SMITH", "SMITH", 0),
+    ("SMITH", "SMYTH", 1),
+    ("SMITH", "SMTIH", 2),
+    ("KITTEN", "SITTING", 3),
+])
+def test_edit_distance(a, b, distance):
+    assert edit_distance(a, b) == distance
+    assert edit_distance(b, a) == distance
+
+
+def test_name_similarity():
+    assert name_similarity("SMITH", "JOHN", "SMITH", "JOHN") == 1.0
+    # one edit in "SMITH,JOHN"
+    assert name_similarity("SMITH", "JOHN", "SMYTH", "JOHN") == pytest.approx(0.9)
+    # a middle name or initial on one side doesn't count against a match
+    assert name_similarity("DOE", "JANE M", "DOE", "JANE") == 1.0
+    assert name_similarity("SMITH", "JOHN", "JONES", "MARY") < NEAR_MATCH_MIN_SCORE
+
+
+def test_a_typo_is_a_confident_near_match():
+    time_cards = [time_card("PINCKLEY", "DENISE"), time_card("SMITH", "JOHN")]
+    check_copies = [check_copy("PINKLEY", "DENISE"), check_copy("JONES", "MARY")]
+
+    [near_match] = find_near_matches(time_cards, check_copies)
+
+    assert (near_match.time_card, near_match.check_copy) == (time_cards[0], check_copies[0])
+    assert near_match.score == pytest.approx(1 - 1 / len("PINCKLEY,DENISE"), abs=0.001)
+    assert near_match.score >= NEAR_MATCH_AUTO_MERGE_SCORE
+    assert near_match.confident
+
+
+def test_a_confident_near_match_is_merged_and_named_after_the_check():
+    result = MatchingEngine.match(
+        [time_card("PINCKLEY", "DENISE")],
+        [check_copy("PINKLEY", "DENISE")],
+        near_matches=True,
+        merge_near_matches=True,
+    )
+
+    [pair] = result.matched_pairs
+    assert pair is result.near_matches[0].pair
+    assert "PINKLEY,DENISE" in pair.merged_output_name
+    assert result.unmatched_time_cards == []
+    assert result.unmatched_check_copies == []
+
+
+def test_close_candidates_within_the_margin_are_not_merged():
+    time_cards = [time_card("PINCKLEY", "DENISE")]
+    # both one edit away, so neither is clearly the best
+    check_copies = [check_copy("PINKLEY", "DENISE"), check_copy("PINCKLEY", "DENISA")]
+
+    result = MatchingEngine.match(time_cards, check_copies, near_matches=True, merge_near_matches=True)
+
+    [near_match] = result.near_matches
+    assert near_match.score >= NEAR_MATCH_AUTO_MERGE_SCORE
+    assert near_match.score - name_similarity("PINCKLEY", "DENISE", "PINCKLEY", "DENISA") < NEAR_MATCH_MARGIN
+    assert not near_match.confident
+    assert near_match.pair is None
+    assert result.matched_pairs == []
+    assert result.unmatched_time_cards == time_cards
+    assert result.unmatched_check_copies == check_copies
+
+
+def test_a_less_similar_near_match_is_only_suggested():
+    [near_match] = find_near_matches([time_card("SMITH", "JOHN")], [check_copy("SMTIH", "JOHN")])
+
+    assert NEAR_MATCH_MIN_SCORE <= near_match.score < NEAR_MATCH_AUTO_MERGE_SCORE
+    assert not near_match.confident
+
+
+def test_near_matches_are_only_looked_for_within_the_same_invoice_and_date():
+    time_cards = [time_card("PINCKLEY", "DENISE", date=DATES[0]), time_card("SMITH", "JOHN")]
+    check_copies = [
+        check_copy("PINKLEY", "DENISE", date=DATES[1]),
+        check_copy("SMYTH", "JOHN", invoice_number=INVOICES[1]),
+    ]
+
+    assert find_near_matches(time_cards, check_copies) == []
+
+
+def test_unpadded_dates_are_in_the_same_block():
+    [near_match] = find_near_matches(
+        [time_card("PINCKLEY", "DENISE", date=("03", "13", "2021"))],
+        [check_copy("PINKLEY", "DENISE", date=("3", "13", "2021"))],
+    )
+
+    assert near_match.confident
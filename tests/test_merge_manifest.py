@@ -0,0 +1,72 @@
+import os
+from datetime import date
+
+import pytest
+
+import run
+from film_payroll_pdf_processor.payroll_process import PayrollProcess, OUTBOX_MERGE_FOLDER
+from synthetic_corpus import SyntheticCorpus
+
+WEEK_1 = date(2021, 3, 13)
+WEEK_2 = date(2021, 3, 20)
+
+
+def write_week(inbox_folder_path: str, week_ending: date, invoice_number: str, cards: list, checks: list = None):
+    """ Writes a week's time card batch and a check copies package with a check for each of checks """
+    os.makedirs(inbox_folder_path, exist_ok=True)
+    corpus = SyntheticCorpus(len(cards))
+    corpus.write_time_card_batch(
+        inbox_folder_path, f"WE_{week_ending:%m%d%y}_{invoice_number}_TEAMSTERS", invoice_number, week_ending, cards
+    )
+    corpus.write_check_copies_packages(
+        inbox_folder_path,
+        week_ending,
+        [(last_name, first_name, invoice_number) for last_name, first_name in (cards if checks is None else checks)],
+    )
+
+
+def process_inbox(inbox_folder_path: str, stream: bool = False):
+    run.main(
+        use_cache=False,
+        stream=stream,
+        report_path=None,
+        inbox_folder_path=inbox_folder_path + os.sep,
+        journal_path=None,
+    )
+
+
+def final_files() -> list:
+    return sorted(os.listdir(PayrollProcess.outbox_filepath(OUTBOX_MERGE_FOLDER)))
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_an_earlier_weeks_merged_files_survive_the_next_weeks_run(production, stream):
+    write_week(str(production / "week_1"), WEEK_1, "EAA000", [("ADAMS", "JOHN"), ("BAKER", "MARY")])
+    write_week(str(production / "week_2"), WEEK_2, "EBB000", [("CLARK", "ANNE"), ("DAVIS", "PAUL")])
+
+    process_inbox(str(production / "week_1"), stream)
+    week_1_final_files = final_files()
+    assert len(week_1_final_files) == 2
+    process_inbox(str(production / "week_2"), stream)
+
+    final_files_after_week_2 = final_files()
+    assert len(final_files_after_week_2) == 4
+    assert set(week_1_final_files) <= set(final_files_after_week_2)
+
+
+def test_a_merged_file_whose_check_copy_is_gone_from_its_week_is_removed(production):
+    week_1_cards = [("ADAMS", "JOHN"), ("BAKER", "MARY")]
+    write_week(str(production / "week_1"), WEEK_1, "EAA000", week_1_cards)
+    write_week(str(production / "week_2"), WEEK_2, "EBB000", [("CLARK", "ANNE"), ("DAVIS", "PAUL")])
+    process_inbox(str(production / "week_1"))
+    process_inbox(str(production / "week_2"))
+    before_correction = final_files()
+
+    # the corrected week 1 package no longer has BAKER's check
+    write_week(str(production / "week_1"), WEEK_1, "EAA000", week_1_cards, checks=week_1_cards[:1])
+    process_inbox(str(production / "week_1"))
+
+    removed = set(before_correction) - set(final_files())
+    assert len(removed) == 1
+    assert "BAKER" in removed.pop()
+    assert len(final_files()) == 3
@@ -0,0 +1,64 @@
+import json
+import os
+
+from film_payroll_pdf_processor.matching import MatchedPair
+from film_payroll_pdf_processor.merge_manifest import MERGE_MANIFEST_FILENAME
+from film_payroll_pdf_processor.payroll_process import (
+    PayrollProcess,
+    OUTBOX_CHECK_COPY_FOLDER,
+    OUTBOX_MERGE_FOLDER,
+    OUTBOX_TIME_CARD_FOLDER,
+)
+from film_payroll_pdf_processor.pdf_pages import CheckCopyPDFPage, TimeCardPDFPage
+from synthetic_corpus import write_pdf
+
+
+def write_pair(last_name: str, first_name: str, check_copy_bytes: bytes = None) -> MatchedPair:
+    """ Writes the outbox time card and check copy of a payee and pairs them """
+    time_card = TimeCardPDFPage.from_record({
+        "first_name": first_name,
+        "last_name": last_name,
+        "pay_period_day_string": "13",
+        "pay_period_month_string": "03",
+        "pay_period_year_string": "2021",
+        "has_grand_total": True,
+        "has_end_of_batch": False,
+        "original_filepath": "WE_031321_EYM788_TEAMSTERS.pdf",
+    })
+    check_copy = CheckCopyPDFPage("03", "13", "2021", "1", last_name, first_name, "EYM788")
+    write_pdf(PayrollProcess.outbox_filepath(OUTBOX_TIME_CARD_FOLDER, time_card.output_file_name), [last_name])
+    check_copy_path = PayrollProcess.outbox_filepath(OUTBOX_CHECK_COPY_FOLDER, check_copy.output_file_name)
+    if check_copy_bytes is None:
+        write_pdf(check_copy_path, [f"CHECK {last_name}"])
+    else:
+        with open(check_copy_path, "wb") as check_copy_file:
+            check_copy_file.write(check_copy_bytes)
+    return MatchedPair(time_card, check_copy, 1)
+
+
+def test_a_failed_merge_doesnt_stop_the_rest_of_the_batch(production):
+    pairs = [
+        write_pair("PINCKLEY", "DENISE"),
+        write_pair("SMITH", "JOHN", check_copy_bytes=b"not a pdf"),
+        write_pair("DOE", "JANE"),
+    ]
+
+    failed = PayrollProcess.merge_matched_pairs(pairs)
+
+    assert failed == [pairs[1].merged_output_name]
+    final_folder_path = production / "outbox" / OUTBOX_MERGE_FOLDER
+    assert sorted(os.listdir(final_folder_path)) == sorted([pairs[0].merged_output_name, pairs[2].merged_output_name])
+    with open(production / "outbox" / MERGE_MANIFEST_FILENAME) as manifest_file:
+        merged = json.load(manifest_file)["merged"]
+    # the failed pair isn't recorded, so the next run merges it again
+    assert sorted(merged) == sorted([pairs[0].merged_output_name, pairs[2].merged_output_name])
+
+
+def test_a_failed_merge_is_merged_once_it_is_fixed(production):
+    pair = write_pair("SMITH", "JOHN", check_copy_bytes=b"not a pdf")
+    assert PayrollProcess.merge_matched_pairs([pair]) == [pair.merged_output_name]
+
+    write_pair("SMITH", "JOHN")
+
+    assert PayrollProcess.merge_matched_pairs([pair]) == []
+    assert os.path.exists(production / "outbox" / OUTBOX_MERGE_FOLDER / pair.merged_output_name)
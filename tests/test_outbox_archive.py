@@ -0,0 +1,70 @@
+import json
+import os
+import zipfile
+
+import pytest
+
+import run
+from film_payroll_pdf_processor.merge_manifest import MERGE_MANIFEST_FILENAME
+from film_payroll_pdf_processor.outbox_archive import ARCHIVE_PER_WEEK, OutboxArchive
+from film_payroll_pdf_processor.payroll_process import PayrollProcess
+from synthetic_corpus import generate_corpus
+
+
+def archive_outbox():
+    run.main(use_cache=False, report_path=None, journal_path=None, outbox_archive_mode=ARCHIVE_PER_WEEK)
+    archive_paths = [
+        os.path.join(PayrollProcess.OUTBOX_FOLDER_PATH, filename)
+        for filename in os.listdir(PayrollProcess.OUTBOX_FOLDER_PATH)
+        if filename.endswith(".zip")
+    ]
+    assert len(archive_paths) == 1
+    with zipfile.ZipFile(archive_paths[0]) as archive:
+        return sorted(name for name in archive.namelist() if name.startswith("final/"))
+
+
+def test_the_merge_manifest_is_kept_next_to_the_archive(production, capsys):
+    generate_corpus(PayrollProcess.INBOX_FOLDER_PATH, 20)
+
+    merged_entries = archive_outbox()
+
+    manifest_path = os.path.join(PayrollProcess.OUTBOX_FOLDER_PATH, MERGE_MANIFEST_FILENAME)
+    with open(manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+    assert merged_entries
+    assert sorted(f"final/{name}" for name in manifest["merged"]) == merged_entries
+    assert not [name for name in os.listdir(production / "processing") if name.startswith("outbox-staging-")]
+    # a second run carries the merged files of the first archive instead of merging them again
+    capsys.readouterr()
+    assert archive_outbox() == merged_entries
+    output = capsys.readouterr().out
+    assert "Writing merged file" not in output
+    assert f"{len(merged_entries)} merged files are unchanged" in output
+
+
+def test_an_in_memory_backend_writes_nothing_to_the_staging_folder(production, monkeypatch):
+    generate_corpus(PayrollProcess.INBOX_FOLDER_PATH, 20)
+    staged = []
+    original_add = OutboxArchive._add
+    monkeypatch.setattr(
+        OutboxArchive, "_add", lambda self, entry_name, staged_filepath: (
+            staged.append(entry_name), original_add(self, entry_name, staged_filepath)
+        )
+    )
+
+    archive_outbox()
+
+    assert staged == []
+
+
+def test_an_interrupted_archive_is_carried_into_the_resumed_run(production, monkeypatch):
+    generate_corpus(PayrollProcess.INBOX_FOLDER_PATH, 20)
+    merged_entries = archive_outbox()
+    # the next run of the week fails while merging, after writing every page again
+    with monkeypatch.context() as failing_merges:
+        failing_merges.setattr(PayrollProcess, "merge_matched_pairs", classmethod(lambda cls, pairs: 1 / 0))
+        with pytest.raises(ZeroDivisionError):
+            archive_outbox()
+
+    assert archive_outbox() == merged_entries
+    assert [name for name in os.listdir(PayrollProcess.OUTBOX_FOLDER_PATH) if ".zip" in name] == ["WE_031321.zip"]
@@ -0,0 +1,60 @@
+import os
+import time
+from datetime import date
+
+import pytest
+
+import run
+from film_payroll_pdf_processor.output_name_registry import get_output_name_registry
+from film_payroll_pdf_processor.payroll_process import PayrollProcess, OUTBOX_TIME_CARD_FOLDER
+from synthetic_corpus import SyntheticCorpus, read_pdf_page_texts, write_pdf
+
+WEEK_ENDING = date(2021, 3, 13)
+# the same batch sent twice, both have a time card for ADAMS,JOHN
+FIRST_FILENAME = "WE_031321_EYM788_TEAMSTERS (2).pdf"
+SECOND_FILENAME = "WE_031321_EYM788_TEAMSTERS.pdf"
+
+
+def write_batches():
+    corpus = SyntheticCorpus(1)
+    for filename in (FIRST_FILENAME, SECOND_FILENAME):
+        write_pdf(
+            os.path.join(PayrollProcess.INBOX_FOLDER_PATH, filename),
+            [corpus.time_card_text("ADAMS", "JOHN", WEEK_ENDING) + f"\nFROM {filename}\n"],
+        )
+
+
+def time_card_sources() -> dict:
+    """ Outbox time card name -> the inbox file its page is from """
+    time_card_folder_path = PayrollProcess.outbox_filepath(OUTBOX_TIME_CARD_FOLDER)
+    sources = {}
+    for output_file_name in os.listdir(time_card_folder_path):
+        with open(os.path.join(time_card_folder_path, output_file_name), "rb") as time_card_file:
+            page_text = read_pdf_page_texts(time_card_file.read())[0]
+        sources[output_file_name] = FIRST_FILENAME if f"FROM {FIRST_FILENAME}" in page_text else SECOND_FILENAME
+    return sources
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_the_first_inbox_file_keeps_the_name_whichever_worker_finishes_first(production, monkeypatch, jobs):
+    write_batches()
+    process_multi_page_time_card = PayrollProcess.process_multi_page_time_card
+
+    def slow_first_file(filepath, is_revision=False):
+        # forked worker processes inherit this, the second file is written first
+        if os.path.basename(filepath) == FIRST_FILENAME:
+            time.sleep(0.5)
+        return process_multi_page_time_card(filepath, is_revision)
+
+    monkeypatch.setattr(PayrollProcess, "process_multi_page_time_card", slow_first_file)
+
+    run.main(jobs=jobs, use_cache=False, report_path=None, journal_path=None)
+
+    sources = time_card_sources()
+    assert len(sources) == 2
+    duplicate_name = next(name for name in sources if "_DUPLICATE_CC" in name)
+    plain_name = next(name for name in sources if name != duplicate_name)
+    assert sources == {plain_name: FIRST_FILENAME, duplicate_name: SECOND_FILENAME}
+    registry = get_output_name_registry(PayrollProcess.PROCESSING_FOLDER_PATH)
+    plain_name_source = registry.source(PayrollProcess.OUTBOX_FOLDER_PATH, OUTBOX_TIME_CARD_FOLDER, plain_name)
+    assert plain_name_source == (FIRST_FILENAME, 1)
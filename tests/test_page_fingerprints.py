@@ -0,0 +1,112 @@
+from film_payroll_pdf_processor.extraction_cache import (
+    PDF_PAGE_TEXTS,
+    configure_extraction_cache,
+    get_extraction_cache,
+    hash_file,
+)
+from film_payroll_pdf_processor.payroll_process import PayrollProcess
+from film_payroll_pdf_processor.pdf_pages import PARSER_VERSION
+from film_payroll_pdf_processor.pypdf_wrapper import PyPDF
+
+
+def build_form_xobject_pdf(page_lines: list) -> bytes:
+    """
+    Writes a pdf whose pages only draw a form XObject, "/Fm0 Do", so every page has the same content stream
+    and the text of each page is in its form
+
+    :param page_lines: lines of text of each page
+    :return: the pdf bytes
+    """
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    }
+    page_object_numbers = []
+    page_content = b"/Fm0 Do"
+    for index, lines in enumerate(page_lines):
+        page_number, content_number, form_number = 4 + 3 * index, 5 + 3 * index, 6 + 3 * index
+        form_content = b"BT /F1 12 Tf 72 720 Td 14 TL " + b" ".join(
+            b"(" + line.encode("latin-1") + b") Tj T*" for line in lines
+        ) + b" ET"
+        objects[page_number] = (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R"
+            b" /Resources << /XObject << /Fm0 %d 0 R >> >> >>" % (content_number, form_number)
+        )
+        objects[content_number] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(page_content), page_content)
+        objects[form_number] = (
+            b"<< /Type /XObject /Subtype /Form /BBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >>"
+            b" /Length %d >>\nstream\n%s\nendstream" % (len(form_content), form_content)
+        )
+        page_object_numbers.append(page_number)
+    kids = b" ".join(b"%d 0 R" % number for number in page_object_numbers)
+    objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_object_numbers))
+
+    pdf = b"%PDF-1.4\n"
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(pdf)
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, objects[number])
+    xref_offset = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for number in sorted(objects):
+        pdf += b"%010d 00000 n \n" % offsets[number]
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    return pdf
+
+
+def time_card_lines(name: str) -> list:
+    return [name, "03/13/2021Pay Period Ending :", "Grand Total: 1,301.25"]
+
+
+def test_pages_drawing_different_forms_fingerprint_differently(tmp_path):
+    filepath = tmp_path / "forms.pdf"
+    filepath.write_bytes(build_form_xobject_pdf([time_card_lines("SMITH, JOHN"), time_card_lines("JONES, MARY")]))
+
+    fingerprints = PyPDF.get_page_fingerprints(str(filepath))
+
+    assert len(fingerprints) == 2
+    assert fingerprints[0] != fingerprints[1]
+
+
+def test_the_same_page_in_another_file_fingerprints_the_same(tmp_path):
+    first_filepath = tmp_path / "first.pdf"
+    second_filepath = tmp_path / "second.pdf"
+    first_filepath.write_bytes(build_form_xobject_pdf([time_card_lines("SMITH, JOHN")]))
+    second_filepath.write_bytes(
+        build_form_xobject_pdf([time_card_lines("JONES, MARY"), time_card_lines("SMITH, JOHN")])
+    )
+
+    assert PyPDF.get_page_fingerprints(str(first_filepath))[0] == PyPDF.get_page_fingerprints(str(second_filepath))[1]
+
+
+def test_the_page_cache_doesnt_mix_up_pages_drawn_through_forms(production):
+    configure_extraction_cache()
+    first_filepath = production / "inbox" / "WE_031321_EYM788_TEAMSTERS.pdf"
+    second_filepath = production / "inbox" / "WE_031321_EYM789_TEAMSTERS.pdf"
+    first_filepath.write_bytes(build_form_xobject_pdf([time_card_lines("SMITH, JOHN")]))
+    second_filepath.write_bytes(build_form_xobject_pdf([time_card_lines("JONES, MARY")]))
+
+    pages = [
+        page
+        for filepath in (first_filepath, second_filepath)
+        for _, page in PayrollProcess._iter_time_card_pages(str(filepath), str(filepath))
+    ]
+
+    assert [(page.last_name, page.first_name) for page in pages] == [("SMITH", "JOHN"), ("JONES", "MARY")]
+
+
+def test_cached_pages_of_an_earlier_parser_are_parsed_again(production):
+    configure_extraction_cache()
+    filepath = production / "inbox" / "WE_031321_EYM788_TEAMSTERS.pdf"
+    filepath.write_bytes(build_form_xobject_pdf([time_card_lines("SMITH, JOHN")]))
+    cache = get_extraction_cache(PayrollProcess.PROCESSING_FOLDER_PATH)
+    [(_, page)] = PayrollProcess._iter_time_card_pages(str(filepath), str(filepath))
+    # the entry an earlier parser left, without a parser version
+    [page_entry] = cache.get(PDF_PAGE_TEXTS, hash_file(str(filepath)))
+    stale_entry = {"text": page_entry["text"], "fields": dict(page.text_fields, last_name="SMITH JR")}
+    cache.put(PDF_PAGE_TEXTS, hash_file(str(filepath)), [stale_entry])
+
+    [(_, page)] = PayrollProcess._iter_time_card_pages(str(filepath), str(filepath))
+
+    assert page.last_name == "SMITH"
+    assert cache.get(PDF_PAGE_TEXTS, hash_file(str(filepath)))[0]["parser_version"] == PARSER_VERSION
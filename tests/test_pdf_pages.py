@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from film_payroll_pdf_processor.pdf_pages import TimeCardPDFPage
+
+SAMPLE_TEXT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "examples", "sample_extracted_pdf_text.txt"
+)
+SAMPLE_FILEPATH = "pdfs/inbox/WE_031321_EYY896_CONSTRUCTION.pdf"
+SIGNATURE_LINE = "By electronically approving or signing, Employee and Production Company (Producer) approvers certify"
+
+
+def parse(text: str) -> TimeCardPDFPage:
+    return TimeCardPDFPage(text, SAMPLE_FILEPATH)
+
+
+@pytest.mark.parametrize("name_line, last_name, first_name", [
+    ("LIDDIARD, JOAQUIN SSN", "LIDDIARD", "JOAQUIN"),
+    ("PINCKLEY, DENISE", "PINCKLEY", "DENISE"),
+    ("PEREZ, JOSÉ", "PEREZ", "JOSÉ"),
+    ("PEÑA, MARIA", "PEÑA", "MARIA"),
+    ("PEREZ, JOSÉ A", "PEREZ", "JOSÉ"),
+    ("ÅSTRÖM, BJÖRN", "ÅSTRÖM", "BJÖRN"),
+    ("McDONALD, RONALD", "McDONALD", "RONALD"),
+    ("MacKENZIE, ANA", "MacKENZIE", "ANA"),
+    ("DeLUCA, ROBERT", "DeLUCA", "ROBERT"),
+    ("O'BRIEN, SAM", "O'BRIEN", "SAM"),
+    ("DE LA CRUZ, PRIYA", "DE LA CRUZ", "PRIYA"),
+    ("HALE-JONES, MARY-KATE", "HALE-JONES", "MARY-KATE"),
+])
+def test_payee_names_are_parsed(name_line, last_name, first_name):
+    page = parse(f"Employee Timecard\n{name_line}\n03/13/2021Pay Period Ending :\nGrand Total: 1,301.25\n")
+
+    assert (page.last_name, page.first_name) == (last_name, first_name)
+
+
+def test_the_sample_page_is_parsed():
+    with open(SAMPLE_TEXT_PATH) as sample_file:
+        page = parse(sample_file.read())
+
+    assert (page.last_name, page.first_name) == ("LIDDIARD", "JOAQUIN")
+    assert (page.pay_period_month_string, page.pay_period_day_string, page.pay_period_year_string) == \
+        ("03", "13", "2021")
+    assert not page.is_2nd_page_time_card()
+
+
+@pytest.mark.parametrize("line", [
+    SIGNATURE_LINE,
+    "1,301.25",
+    "F1 50.8300 REG, 25.6",
+    "Hours, Rates and Totals",
+])
+def test_lines_that_arent_names_are_skipped(line):
+    page = parse(f"{line}\nPEÑA, MARIA\n")
+
+    assert (page.last_name, page.first_name) == ("PEÑA", "MARIA")
+
+
+def test_a_page_without_a_name_has_none():
+    page = parse(f"{SIGNATURE_LINE}\n03/13/2021Pay Period Ending :\n")
+
+    assert page.last_name is None and page.first_name is None
@@ -0,0 +1,118 @@
+import struct
+import sys
+import textwrap
+
+import pytest
+
+from film_payroll_pdf_processor.pdfbox_wrapper import PDFBox
+
+# Answers Echo with its arguments and exits on Crash, speaking the PDFBoxWorker protocol
+FAKE_WORKER = textwrap.dedent("""
+    import struct
+    import sys
+
+    def read_exactly(size):
+        data = sys.stdin.buffer.read(size)
+        if len(data) != size:
+            sys.exit(0)
+        return data
+
+    def read_message():
+        count, = struct.unpack(">i", read_exactly(4))
+        return [read_exactly(struct.unpack(">i", read_exactly(4))[0]).decode() for _ in range(count)]
+
+    while True:
+        fields = read_message()
+        if fields[0] == "Crash":
+            sys.exit(1)
+        response = ["OK"] + fields[1:]
+        message = [struct.pack(">i", len(response))]
+        for field in response:
+            message += [struct.pack(">i", len(field.encode())), field.encode()]
+        sys.stdout.buffer.write(b"".join(message))
+        sys.stdout.buffer.flush()
+""")
+FAILING_WORKER = "import sys; sys.exit(1)"
+
+
+@pytest.fixture
+def worker_pool(tmp_path, monkeypatch):
+    """
+    A PDFBox worker pool of fake workers, run by the returned function with the worker's code
+    """
+    (tmp_path / f"{PDFBox.WORKER_CLASS_NAME}.class").write_bytes(b"")
+    monkeypatch.setattr(PDFBox, "WORKER_CLASS_DIR", str(tmp_path))
+    monkeypatch.setattr(PDFBox, "USE_WORKER", True)
+    monkeypatch.setattr(PDFBox, "WORKER_POOL_SIZE", 2)
+    monkeypatch.setattr(PDFBox, "WORKER_RESTARTS", 1)
+    monkeypatch.setattr(PDFBox, "WORKER_STARTUP_FAILURES", 2)
+    for attribute, value in (
+        ("_workers", []),
+        ("_idle_workers", []),
+        ("_worker_pid", None),
+        ("_worker_failed", False),
+        ("_slot_failures", {}),
+        ("_startup_failures", 0),
+    ):
+        monkeypatch.setattr(PDFBox, attribute, value)
+
+    def use_worker_code(code: str):
+        monkeypatch.setattr(PDFBox, "_worker_command", classmethod(lambda cls: [sys.executable, "-c", code]))
+
+    yield use_worker_code
+    PDFBox.shutdown_worker()
+
+
+def test_a_worker_that_dies_is_replaced_without_stopping_the_others(worker_pool):
+    worker_pool(FAKE_WORKER)
+    first_worker = PDFBox._checkout_worker()
+    second_worker = PDFBox._checkout_worker()
+    PDFBox._checkin_worker(first_worker)
+    PDFBox._checkin_worker(second_worker)
+    assert PDFBox._run_in_worker("Echo", "1") == ["1"]
+
+    assert PDFBox._run_in_worker("Crash") is None
+    assert not PDFBox._worker_failed
+    assert len(PDFBox._workers) == 1
+    surviving_worker = PDFBox._workers[0]
+    assert surviving_worker.process.poll() is None
+
+    # the surviving worker is idle, a second concurrent call starts a replacement in the dead worker's slot
+    busy_worker = PDFBox._checkout_worker()
+    replacement_worker = PDFBox._checkout_worker()
+    assert busy_worker is surviving_worker
+    assert replacement_worker.slot != surviving_worker.slot
+    assert replacement_worker.request("Echo", "2") == ["2"]
+    PDFBox._checkin_worker(busy_worker)
+    PDFBox._checkin_worker(replacement_worker)
+
+
+def test_a_slot_that_used_up_its_restarts_isnt_replaced(worker_pool, monkeypatch):
+    worker_pool(FAKE_WORKER)
+    monkeypatch.setattr(PDFBox, "WORKER_POOL_SIZE", 1)
+    for _ in range(PDFBox.WORKER_RESTARTS + 1):
+        assert PDFBox._run_in_worker("Echo", "answered") == ["answered"]
+        assert PDFBox._run_in_worker("Crash") is None
+
+    assert PDFBox._run_in_worker("Echo", "1") is None
+    assert PDFBox._workers == []
+    # the pool is empty because its slot was retired, not because workers can't start
+    assert not PDFBox._worker_failed
+
+
+def test_workers_that_keep_failing_to_start_switch_to_per_call_mode(worker_pool):
+    worker_pool(FAILING_WORKER)
+    assert PDFBox._run_in_worker("Echo", "1") is None
+    assert not PDFBox._worker_failed
+
+    assert PDFBox._run_in_worker("Echo", "1") is None
+    assert PDFBox._worker_failed
+    assert PDFBox._checkout_worker() is None
+
+
+def test_an_answering_worker_resets_the_startup_failures(worker_pool):
+    worker_pool(FAILING_WORKER)
+    assert PDFBox._run_in_worker("Echo", "1") is None
+    worker_pool(FAKE_WORKER)
+    assert PDFBox._run_in_worker("Echo", "1") == ["1"]
+    assert PDFBox._startup_failures == 0
@@ -0,0 +1,33 @@
+import os
+
+from film_payroll_pdf_processor.payroll_process import PayrollProcess
+from synthetic_corpus import write_pdf
+
+ORIGINAL_FILENAME = "WE_031321_EYM788_TEAMSTERS.pdf"
+REVISION_FILENAME = "WE_031321_EYM788_TEAMSTERS REVISED.pdf"
+
+
+def write_revision(original_page_texts: list, revision_page_texts: list) -> str:
+    """ Writes a batch and its revision to the inbox and returns the revision's filepath """
+    write_pdf(os.path.join(PayrollProcess.INBOX_FOLDER_PATH, ORIGINAL_FILENAME), original_page_texts)
+    revision_filepath = os.path.join(PayrollProcess.INBOX_FOLDER_PATH, REVISION_FILENAME)
+    write_pdf(revision_filepath, revision_page_texts)
+    return revision_filepath
+
+
+def test_pages_the_same_as_in_the_original_are_unchanged(production):
+    revision_filepath = write_revision(["ADAMS", "BAKER", "CLARK"], ["ADAMS", "BAKER REVISED", "CLARK"])
+
+    assert PayrollProcess._unchanged_revision_pages(revision_filepath, revision_filepath) == {1, 3}
+
+
+def test_a_page_with_the_fingerprint_of_an_original_page_but_other_text_is_changed(production, monkeypatch):
+    revision_filepath = write_revision(["ADAMS", "BAKER", "CLARK"], ["ADAMS", "BAKER REVISED", "CLARK"])
+    # every file's pages fingerprint by page number, as if page 2 collided
+    monkeypatch.setattr(
+        PayrollProcess,
+        "_page_fingerprints",
+        classmethod(lambda cls, filepath: [f"page-{page_number}" for page_number in range(1, 4)]),
+    )
+
+    assert PayrollProcess._unchanged_revision_pages(revision_filepath, revision_filepath) == {1, 3}
@@ -0,0 +1,203 @@
+import os
+from datetime import date
+
+import pytest
+
+import run
+from film_payroll_pdf_processor.payroll_process import (
+    PayrollProcess,
+    OUTBOX_QUARANTINE_FOLDER,
+    OUTBOX_TIME_CARD_FOLDER,
+)
+from film_payroll_pdf_processor.pypdf_wrapper import PyPDF
+from film_payroll_pdf_processor.run_journal import QUARANTINED_PAGE, RunJournal
+from film_payroll_pdf_processor.run_metrics import EXTRACT_TEXT, get_run_metrics
+from synthetic_corpus import SyntheticCorpus, build_pdf, read_pdf_page_texts
+
+WEEK_ENDING = date(2021, 3, 13)
+INVOICE_NUMBER = "EAA000"
+BATCH_FILENAME = f"WE_031321_{INVOICE_NUMBER}_TEAMSTERS.pdf"
+GARBLED_PAGE_TEXT = "GARBLED SCAN\nGrand Total: 1.00\n"
+
+
+class Interrupted(Exception):
+    pass
+
+
+class TimeCardWrites:
+    """ Records the time card pages the backend writes, and interrupts the run at a write if asked """
+
+    def __init__(self):
+        self.page_numbers = []
+        self.write_count = 0
+        self.interrupt_at = None
+
+    def write_pages(self, write_pages, backend, filepath: str, page_targets: list):
+        time_card_folder = os.path.join(PayrollProcess.OUTBOX_FOLDER_PATH, OUTBOX_TIME_CARD_FOLDER)
+        time_card_pages = [page_number for page_number, target in page_targets if target.startswith(time_card_folder)]
+        if time_card_pages:
+            self.write_count += 1
+            if self.write_count == self.interrupt_at:
+                raise Interrupted()
+            self.page_numbers.extend(time_card_pages)
+        write_pages(backend, filepath, page_targets)
+
+
+@pytest.fixture
+def time_card_writes(monkeypatch):
+    writes = TimeCardWrites()
+    write_pages = PyPDF.write_pages.__func__
+    monkeypatch.setattr(PyPDF, "write_pages", classmethod(
+        lambda cls, filepath, targets: writes.write_pages(write_pages, cls, filepath, targets)
+    ))
+    monkeypatch.setattr(PayrollProcess, "PAGE_WRITE_BATCH_SIZE", 3)
+    return writes
+
+
+def write_batch(card_count: int, first_name_suffix: str = "", garbled_page_number: int = None) -> list:
+    """
+    Writes a time card batch and its check copies package, with an unparseable page if asked
+
+    :return: the page texts of the batch
+    """
+    inbox_folder_path = PayrollProcess.INBOX_FOLDER_PATH
+    cards = [
+        (last_name, first_name + first_name_suffix)
+        for last_name, first_name in map(SyntheticCorpus.payee_name, range(card_count))
+    ]
+    corpus = SyntheticCorpus(card_count)
+    corpus.write_time_card_batch(inbox_folder_path, BATCH_FILENAME[:-4], INVOICE_NUMBER, WEEK_ENDING, cards)
+    corpus.write_check_copies_packages(
+        inbox_folder_path, WEEK_ENDING, [(last_name, first_name, INVOICE_NUMBER) for last_name, first_name in cards]
+    )
+    batch_filepath = os.path.join(inbox_folder_path, BATCH_FILENAME)
+    with open(batch_filepath, "rb") as batch_file:
+        page_texts = read_pdf_page_texts(batch_file.read())
+    if garbled_page_number is not None:
+        page_texts.insert(garbled_page_number - 1, GARBLED_PAGE_TEXT)
+        with open(batch_filepath, "wb") as batch_file:
+            batch_file.write(build_pdf(page_texts))
+    return page_texts
+
+
+def outbox_files() -> list:
+    return sorted(
+        os.path.relpath(os.path.join(folder_path, filename), PayrollProcess.OUTBOX_FOLDER_PATH)
+        for folder_path, _, filenames in os.walk(PayrollProcess.OUTBOX_FOLDER_PATH)
+        for filename in filenames
+        if not filename.startswith(".")
+    )
+
+
+def clear_outbox():
+    for filename in outbox_files():
+        os.remove(os.path.join(PayrollProcess.OUTBOX_FOLDER_PATH, filename))
+
+
+def process_inbox(journal_path: str = None):
+    run.main(use_cache=False, report_path=None, journal_path=journal_path)
+    return get_run_metrics().operations[EXTRACT_TEXT]["pages"]
+
+
+def interrupted_run(journal_path: str, time_card_writes: TimeCardWrites, interrupt_at: int):
+    time_card_writes.write_count = 0
+    time_card_writes.interrupt_at = interrupt_at
+    with pytest.raises(Interrupted):
+        process_inbox(journal_path)
+    time_card_writes.interrupt_at = None
+
+
+def journaled_pages(journal_path: str) -> dict:
+    """ :return: page number -> page entry of the batch's journaled pages """
+    journal = RunJournal(journal_path)
+    [batch_pages] = [pages for (filename, _), pages in journal.pages.items() if filename == BATCH_FILENAME]
+    return batch_pages
+
+
+def test_a_run_resumed_mid_file_writes_every_page_once(production, time_card_writes):
+    write_batch(10)
+    journal_path = str(production / "processing" / "run_journal.jsonl")
+    uninterrupted_extracted_pages = process_inbox()
+    uninterrupted_outbox_files = outbox_files()
+    uninterrupted_time_card_pages = sorted(time_card_writes.page_numbers)
+    clear_outbox()
+    time_card_writes.page_numbers = []
+
+    # stopped writing the third batch of time card pages, after two were written and journaled
+    interrupted_run(journal_path, time_card_writes, interrupt_at=3)
+    pages_written_before_interruption = list(time_card_writes.page_numbers)
+    finished_pages = journaled_pages(journal_path)
+    resumed_extracted_pages = process_inbox(journal_path)
+
+    assert len(pages_written_before_interruption) == 2 * PayrollProcess.PAGE_WRITE_BATCH_SIZE
+    # journaled pages come back in page order between the new ones, none is written twice or left out
+    assert time_card_writes.page_numbers[:len(pages_written_before_interruption)] == pages_written_before_interruption
+    assert sorted(time_card_writes.page_numbers) == uninterrupted_time_card_pages
+    assert len(set(time_card_writes.page_numbers)) == len(time_card_writes.page_numbers)
+    assert outbox_files() == uninterrupted_outbox_files
+    # and aren't extracted again
+    assert resumed_extracted_pages == uninterrupted_extracted_pages - len(finished_pages)
+    assert not os.path.exists(journal_path)
+
+
+def test_a_file_that_changed_since_it_was_journaled_is_processed_again(production, time_card_writes):
+    write_batch(10)
+    journal_path = str(production / "processing" / "run_journal.jsonl")
+    interrupted_run(journal_path, time_card_writes, interrupt_at=3)
+    clear_outbox()
+    # the batch is corrected before the run is resumed
+    page_texts = write_batch(10, first_name_suffix="X")
+    time_card_writes.page_numbers = []
+
+    extracted_pages = process_inbox(journal_path)
+
+    assert extracted_pages >= len(page_texts)
+    time_card_files = [filename for filename in outbox_files() if filename.startswith(OUTBOX_TIME_CARD_FOLDER)]
+    assert len(time_card_files) == 10
+    assert all("X-03132021" in filename for filename in time_card_files)
+    assert len(set(time_card_writes.page_numbers)) == len(time_card_writes.page_numbers) == 10
+
+
+def test_an_unparseable_page_is_quarantined_and_the_run_goes_on(production, time_card_writes):
+    write_batch(5, garbled_page_number=2)
+    journal_path = str(production / "processing" / "run_journal.jsonl")
+
+    interrupted_run(journal_path, time_card_writes, interrupt_at=2)
+    quarantine_files = [filename for filename in outbox_files() if filename.startswith(OUTBOX_QUARANTINE_FOLDER)]
+    assert journaled_pages(journal_path)[2]["status"] == QUARANTINED_PAGE
+    process_inbox(journal_path)
+
+    stem = BATCH_FILENAME[:-4]
+    assert quarantine_files == [
+        os.path.join(OUTBOX_QUARANTINE_FOLDER, f"{stem}-page-2.pdf"),
+        os.path.join(OUTBOX_QUARANTINE_FOLDER, f"{stem}-page-2.txt"),
+    ]
+    with open(os.path.join(PayrollProcess.OUTBOX_FOLDER_PATH, quarantine_files[1])) as quarantine_text_file:
+        assert GARBLED_PAGE_TEXT.strip() in quarantine_text_file.read()
+    # the quarantined page isn't quarantined again on resume, and every time card is written once
+    assert get_run_metrics().failure_count("parse") == 0
+    assert len([filename for filename in outbox_files() if filename.startswith(OUTBOX_TIME_CARD_FOLDER)]) == 5
+    assert len(set(time_card_writes.page_numbers)) == len(time_card_writes.page_numbers) == 5
+
+
+@pytest.mark.parametrize("use_cache", [False, True])
+def test_a_quarantined_page_isnt_extracted_again_for_its_report(production, monkeypatch, use_cache):
+    write_batch(3, garbled_page_number=2)
+    # only time card pages are extracted, check copies are named from their lists
+    extracted_pages = []
+    get_page_texts = PyPDF.get_page_texts.__func__
+
+    def recording_get_page_texts(cls, filepath, start_page=1, end_page=None):
+        texts = get_page_texts(cls, filepath, start_page, end_page)
+        extracted_pages.extend(range(start_page, start_page + len(texts)))
+        return texts
+
+    monkeypatch.setattr(PyPDF, "get_page_texts", classmethod(recording_get_page_texts))
+    run.main(use_cache=use_cache, report_path=None, journal_path=None)
+
+    assert extracted_pages.count(2) == 1
+    quarantine_text_path = os.path.join(
+        PayrollProcess.OUTBOX_FOLDER_PATH, OUTBOX_QUARANTINE_FOLDER, f"{BATCH_FILENAME[:-4]}-page-2.txt"
+    )
+    with open(quarantine_text_path) as quarantine_text_file:
+        assert GARBLED_PAGE_TEXT.strip() in quarantine_text_file.read()
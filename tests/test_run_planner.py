@@ -0,0 +1,166 @@
+import os
+import re
+
+import pytest
+
+from film_payroll_pdf_processor.payroll_process import PayrollProcess
+from film_payroll_pdf_processor.run_metrics import WRITE_PAGES
+from film_payroll_pdf_processor.run_planner import RunPlanner
+from synthetic_corpus import build_pdf
+
+PACKAGE_FILENAME = "checks_031321_1.pdf"
+PAGE = b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] >>"
+
+
+def compressed_pdf(page_count: int, object_stream: bool) -> bytes:
+    """
+    A pdf with a cross-reference stream instead of an xref table and a page tree of intermediate /Pages
+    nodes, with every object but the streams in an object stream if asked
+    """
+    objects = {1: b"<< /Type /Catalog /Pages 2 0 R >>"}
+    page_numbers = list(range(1, page_count + 1))
+    node_pages = [page_numbers[start:start + 3] for start in range(0, page_count, 3)]
+    node_object_numbers = [3 + node for node in range(len(node_pages))]
+    object_number = 3 + len(node_pages)
+    for node_object_number, pages in zip(node_object_numbers, node_pages):
+        kids = []
+        for _ in pages:
+            objects[object_number] = PAGE % node_object_number
+            kids.append(b"%d 0 R" % object_number)
+            object_number += 1
+        objects[node_object_number] = b"<< /Type /Pages /Parent 2 0 R /Kids [%s] /Count %d >>" % (
+            b" ".join(kids), len(pages)
+        )
+    objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % number for number in node_object_numbers), page_count
+    )
+
+    pdf = bytearray(b"%PDF-1.5\n")
+    # object number -> (xref entry type, offset or object stream number, generation or index)
+    entries = {0: (0, 0, 65535)}
+    if object_stream:
+        stream_number = object_number
+        header = []
+        body = bytearray()
+        for index, number in enumerate(sorted(objects)):
+            header.append(b"%d %d" % (number, len(body)))
+            body += objects[number] + b"\n"
+            entries[number] = (2, stream_number, index)
+        header = b" ".join(header) + b"\n"
+        stream = header + body
+        entries[stream_number] = (1, len(pdf), 0)
+        pdf += b"%d 0 obj\n<< /Type /ObjStm /N %d /First %d /Length %d >>\nstream\n%s\nendstream\nendobj\n" % (
+            stream_number, len(objects), len(header), len(stream), stream
+        )
+        object_number += 1
+    else:
+        for number in sorted(objects):
+            entries[number] = (1, len(pdf), 0)
+            pdf += b"%d 0 obj\n%s\nendobj\n" % (number, objects[number])
+    xref_number = object_number
+    xref_offset = len(pdf)
+    entries[xref_number] = (1, xref_offset, 0)
+    xref = b"".join(
+        bytes([entry_type]) + field.to_bytes(4, "big") + index.to_bytes(2, "big")
+        for entry_type, field, index in (entries[number] for number in range(xref_number + 1))
+    )
+    pdf += b"%d 0 obj\n<< /Type /XRef /Size %d /W [1 4 2] /Root 1 0 R /Length %d >>\n" % (
+        xref_number, xref_number + 1, len(xref)
+    )
+    pdf += b"stream\n%s\nendstream\nendobj\n" % xref
+    pdf += b"startxref\n%d\n%%%%EOF\n" % xref_offset
+    return bytes(pdf)
+
+
+def incrementally_updated_pdf(page_count: int, removed_page_count: int) -> bytes:
+    """
+    A pdf of page_count pages updated by an appended revision that drops its last pages, the dropped page
+    objects are still in the file
+    """
+    pdf = bytearray(build_pdf([f"CHECK {page_number}" for page_number in range(1, page_count + 1)]))
+    previous_xref_offset = int(re.search(rb"startxref\n(\d+)", pdf).group(1))
+    size = int(re.search(rb"/Size (\d+)", pdf).group(1))
+    # build_pdf writes the page of each content stream right after it, from object 5 on
+    kept_pages = [5 + 2 * page for page in range(page_count - removed_page_count)]
+    pages_offset = len(pdf)
+    pdf += b"2 0 obj\n<< /Type /Pages /Kids [%s] /Count %d >>\nendobj\n" % (
+        b" ".join(b"%d 0 R" % number for number in kept_pages), len(kept_pages)
+    )
+    xref_offset = len(pdf)
+    pdf += b"xref\n0 1\n0000000000 65535 f \n2 1\n%010d 00000 n \n" % pages_offset
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R /Prev %d >>\nstartxref\n%d\n%%%%EOF\n" % (
+        size, previous_xref_offset, xref_offset
+    )
+    return bytes(pdf)
+
+
+def write_package(pdf_bytes: bytes, list_lines: list = None):
+    with open(os.path.join(PayrollProcess.INBOX_FOLDER_PATH, PACKAGE_FILENAME), "wb") as package_file:
+        package_file.write(pdf_bytes)
+    if list_lines is not None:
+        with open(os.path.join(PayrollProcess.INBOX_FOLDER_PATH, PACKAGE_FILENAME[:-4] + ".txt"), "w") as list_file:
+            list_file.write("\n".join(["Date:03/13/2021", "PAGE,LAST,FIRST,INVOICE"] + list_lines) + "\n")
+
+
+def plan_package():
+    planned_file, = RunPlanner(PayrollProcess.INBOX_FOLDER_PATH, report_path=None).plan()
+    return planned_file
+
+
+def listed_pages(page_numbers) -> list:
+    return [f"{page_number},SMITH{page_number},JOHN,EAA000" for page_number in page_numbers]
+
+
+@pytest.mark.parametrize("pdf_bytes", [
+    compressed_pdf(7, object_stream=False),
+    compressed_pdf(7, object_stream=True),
+    incrementally_updated_pdf(9, removed_page_count=2),
+], ids=["xref stream", "object stream", "incremental update"])
+def test_pages_are_counted_like_the_backend_reads_them(production, pdf_bytes):
+    write_package(pdf_bytes, listed_pages(range(1, 8)))
+    planned_file = plan_package()
+
+    assert planned_file.page_count == 7
+    assert planned_file.problems == []
+    assert planned_file.operations[WRITE_PAGES]["pages"] == 7
+
+
+def test_a_package_without_a_check_list_is_reported(production):
+    write_package(build_pdf(["CHECK"] * 3))
+    planned_file = plan_package()
+
+    assert planned_file.problems == ["no check list, need checks_031321_1.txt"]
+    assert WRITE_PAGES not in planned_file.operations
+
+
+def test_check_list_pages_that_arent_numbers_are_reported(production):
+    write_package(build_pdf(["CHECK"] * 3), listed_pages([1, "2a", 3]))
+    planned_file = plan_package()
+
+    assert planned_file.problems == ["check list page '2a' of SMITH2a isn't a number"]
+    assert planned_file.operations[WRITE_PAGES]["pages"] == 2
+
+
+def test_listed_pages_the_package_doesnt_have_are_reported(production):
+    write_package(build_pdf(["CHECK"] * 3), listed_pages([0, 1, 2, 3, 4, 5, 9]))
+    planned_file = plan_package()
+
+    assert planned_file.problems == ["listed pages not in the 3 page package: 0, 4-5, 9"]
+    assert planned_file.operations[WRITE_PAGES]["pages"] == 3
+
+
+def test_pages_listed_twice_are_reported(production):
+    write_package(build_pdf(["CHECK"] * 3), listed_pages([1, 2, 2, 3, 3]))
+    planned_file = plan_package()
+
+    assert planned_file.problems == ["pages listed more than once, the first record gets the page: 2-3"]
+    assert planned_file.operations[WRITE_PAGES]["pages"] == 3
+
+
+def test_a_package_the_backend_cant_read_is_reported(production):
+    write_package(b"%PDF-1.4\nnot a pdf\n", listed_pages([1]))
+    planned_file = plan_package()
+
+    assert planned_file.page_count is None
+    assert len(planned_file.problems) == 1
+    assert planned_file.problems[0].startswith("page count couldn't be read: ")
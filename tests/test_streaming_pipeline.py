@@ -0,0 +1,118 @@
+import os
+
+import run
+from film_payroll_pdf_processor.merge_manifest import MERGE_MANIFEST_FILENAME, MergeManifest, hash_pdf_content
+from film_payroll_pdf_processor.payroll_process import OUTBOX_MERGE_FOLDER, PayrollProcess
+from synthetic_corpus import FIRST_WEEK_ENDING, SyntheticCorpus, read_pdf_page_texts, write_pdf
+
+WEEK_ENDING = FIRST_WEEK_ENDING
+DATE = f"{WEEK_ENDING:%m%d%Y}"
+
+
+def run_into(production, capsys, outbox_name: str, stream: bool) -> tuple:
+    """
+    Processes the inbox into its own outbox
+
+    :return: the outbox's pdf content hashes by path, its merged pairs and the unmatched report
+    """
+    outbox_folder_path = str(production / outbox_name) + os.sep
+    capsys.readouterr()
+    run.main(
+        use_cache=False,
+        stream=stream,
+        report_path=None,
+        journal_path=None,
+        outbox_folder_path=outbox_folder_path,
+    )
+    output = capsys.readouterr().out
+    outbox = {}
+    for folder_path, _, filenames in os.walk(outbox_folder_path):
+        for filename in filenames:
+            if filename.endswith(".pdf"):
+                with open(os.path.join(folder_path, filename), "rb") as pdf_file:
+                    outbox[os.path.relpath(os.path.join(folder_path, filename), outbox_folder_path)] = (
+                        hash_pdf_content(pdf_file.read())
+                    )
+    merged_pairs = MergeManifest(os.path.join(outbox_folder_path, MERGE_MANIFEST_FILENAME)).merged
+    return outbox, merged_pairs, unmatched_report(output)
+
+
+def unmatched_report(output: str) -> str:
+    report = output[output.index("The following time cards were not matched"):]
+    end = report.find("\n\n", report.index("check copies were not matched"))
+    return report if end == -1 else report[:end]
+
+
+def test_streaming_writes_the_same_outbox_as_a_batch_run(production, capsys):
+    inbox_folder_path = PayrollProcess.INBOX_FOLDER_PATH
+    corpus = SyntheticCorpus(40)
+    names = [SyntheticCorpus.payee_name(payee_number) for payee_number in range(20)]
+    corpus.write_time_card_batch(inbox_folder_path, "WE_031321_EAA000_CONSTRUCTION", "EAA000", WEEK_ENDING, names[:10])
+    corpus.write_time_card_batch(inbox_folder_path, "WE_031321_EAA001_TEAMSTERS", "EAA001", WEEK_ENDING, names[10:])
+    # a revision of two time cards
+    revised_batch_path = os.path.join(inbox_folder_path, "WE_031321_EAA000_CONSTRUCTION REVISED.pdf")
+    with open(os.path.join(inbox_folder_path, "WE_031321_EAA000_CONSTRUCTION.pdf"), "rb") as batch_file:
+        page_texts = read_pdf_page_texts(batch_file.read())
+    write_pdf(revised_batch_path, [page_texts[0] + "\nREVISED\n"] + page_texts[1:3] + [page_texts[3] + "\nREVISED\n"])
+    # the last time card has no check, one check has no time card
+    checks = [(last_name, first_name, "EAA000") for last_name, first_name in names[:10]]
+    checks += [(last_name, first_name, "EAA001") for last_name, first_name in names[10:19]]
+    checks.append((*SyntheticCorpus.payee_name(50), "EAA001"))
+    corpus.write_check_copies_packages(inbox_folder_path, WEEK_ENDING, checks)
+
+    batch_outbox, batch_pairs, batch_report = run_into(production, capsys, "batch_outbox", stream=False)
+    stream_outbox, stream_pairs, stream_report = run_into(production, capsys, "stream_outbox", stream=True)
+
+    assert len([path for path in batch_outbox if path.startswith(OUTBOX_MERGE_FOLDER)]) == 19
+    assert stream_outbox == batch_outbox
+    assert stream_pairs == batch_pairs
+    assert stream_report == batch_report
+    assert "-EAA001.pdf" in batch_report.split("check copies were not matched")[0]
+
+
+def test_streaming_numbers_a_payees_checks_in_check_list_order(production, capsys):
+    """
+    Time card batches (WE_...) come before check copies packages in name order, so a streamed run pairs a
+    payee's time cards as their checks are read, in check list order, where a batch run pairs them in
+    time card order.  The pairs are the same, only which merged file gets the -02 differs.
+    """
+    inbox_folder_path = PayrollProcess.INBOX_FOLDER_PATH
+    corpus = SyntheticCorpus(4)
+    last_name, first_name = SyntheticCorpus.payee_name(0)
+    for invoice_number in ("EAA000", "EBB000"):
+        filename = f"WE_031321_{invoice_number}_TEAMSTERS"
+        corpus.write_time_card_batch(inbox_folder_path, filename, invoice_number, WEEK_ENDING, [(last_name, first_name)])
+    # the check of the second time card comes first
+    write_pdf(
+        os.path.join(inbox_folder_path, "checks_031321_1.pdf"),
+        [SyntheticCorpus.check_copy_text(last_name, first_name, WEEK_ENDING)] * 2,
+    )
+    with open(os.path.join(inbox_folder_path, "checks_031321_1.txt"), "w") as list_file:
+        list_file.write(
+            f"Date:{WEEK_ENDING:%m/%d/%Y}\nPAGE,LAST,FIRST,INVOICE\n"
+            f"1,{last_name},{first_name},EBB000\n2,{last_name},{first_name},EAA000\n"
+        )
+
+    batch_outbox, batch_pairs, batch_report = run_into(production, capsys, "batch_outbox", stream=False)
+    stream_outbox, stream_pairs, stream_report = run_into(production, capsys, "stream_outbox", stream=True)
+
+    def merged_names(outbox: dict) -> set:
+        return {os.path.basename(path) for path in outbox if path.startswith(OUTBOX_MERGE_FOLDER)}
+
+    assert merged_names(batch_outbox) == {
+        f"TEST-PR-TC-{last_name},{first_name},{DATE}-EAA000.pdf",
+        f"TEST-PR-TC-02-{last_name},{first_name},{DATE}-EBB000.pdf",
+    }
+    assert merged_names(stream_outbox) == {
+        f"TEST-PR-TC-02-{last_name},{first_name},{DATE}-EAA000.pdf",
+        f"TEST-PR-TC-{last_name},{first_name},{DATE}-EBB000.pdf",
+    }
+
+    def pairs(merged_pairs: dict) -> set:
+        return {(entry["time_card"], entry["check_copy"]) for entry in merged_pairs.values()}
+
+    assert pairs(stream_pairs) == pairs(batch_pairs)
+    assert {path: content for path, content in stream_outbox.items() if not path.startswith(OUTBOX_MERGE_FOLDER)} == {
+        path: content for path, content in batch_outbox.items() if not path.startswith(OUTBOX_MERGE_FOLDER)
+    }
+    assert stream_report == batch_report